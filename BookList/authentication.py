@@ -0,0 +1,250 @@
+"""
+Authentication of tokens and json web tokens without querying the database for every request.
+
+TokenAuthentication of rest_framework queries the token and its user for every request, which is the only
+query of requests that are served from cached responses. CachedTokenAuthentication keeps a snapshot of the
+token and of the fields of its user in the cache (AUTH_TOKEN_CACHE_ALIAS) for AUTH_TOKEN_CACHE_TIMEOUT seconds,
+so the cache should be shared by all processes (like the catalog version) for invalidations to reach them:
+    - tokens which are deleted (e.g. by logout of djoser, or with their user) are removed from the cache.
+    - tokens of users which are saved (e.g. deactivated or renamed) are removed from the cache.
+changes which do not send signals (e.g. `User.objects.update(is_active=False)`) are seen after the timeout.
+tokens are not cached if AUTH_TOKEN_CACHE_ALIAS is a local memory cache, which invalidations of other processes
+do not reach, they are authenticated from the database like TokenAuthentication.
+
+password of cached users is a deferred field, it is loaded from the database if it is needed and saving a
+cached user does not overwrite it.
+
+StatelessJWTAuthentication authenticates json web tokens without the database. the user is built from claims
+of the token (other fields are deferred) and jtis of the token and of the refresh token which issued it are
+looked up in a bloom filter of blacklisted tokens (TokenBlacklistFilter). the filter is refreshed with new rows
+of BlacklistedToken every AUTH_JWT_BLACKLIST_REFRESH_INTERVAL seconds (rows of the last
+AUTH_JWT_BLACKLIST_REFRESH_OVERLAP seconds before a refresh are read again, as their transactions may commit late)
+and built again every AUTH_JWT_BLACKLIST_REBUILD_INTERVAL seconds, only jtis which may be in it are confirmed by
+the database.
+so a refresh token which is blacklisted by another process stops its access tokens within the refresh interval,
+and a user which is deactivated keeps access until their access token expires (ACCESS_TOKEN_LIFETIME).
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import *
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from BookList.bloom import BloomFilter
+
+TOKEN_CACHE_KEY = 'auth-token:{digest}'
+
+# fields of cached users, the password hash is not kept in the cache.
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+# claims of json web tokens for the username of user and for the jti of the refresh token of access tokens.
+USERNAME_CLAIM = 'username'
+REFRESH_JTI_CLAIM = 'refresh_jti'
+
+
+def get_token_cache() -> Optional[BaseCache]:
+    """ :return: cache of tokens, None if it is a local memory cache, as it is not shared by processes."""
+    cache = caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def get_token_cache_key(key: str) -> str:
+    # keys of tokens are credentials, so they are not put in cache keys as they are.
+    return TOKEN_CACHE_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def make_snapshot(token: Token) -> dict:
+    return {'created': token.created, 'user': [getattr(token.user, attname) for attname in USER_FIELDS]}
+
+
+def load_snapshot(key: str, snapshot: dict) -> Tuple[User, Token]:
+    """ :return: user and token of snapshot as if they are fetched from the database."""
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, snapshot['user'])
+    token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id', 'created'], [key, user.pk, snapshot['created']])
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ TokenAuthentication which authenticates tokens from their snapshots in the cache."""
+
+    def authenticate_credentials(self, key: str):
+        if (cache := get_token_cache()) is None:
+            return super().authenticate_credentials(key)
+
+        cache_key = get_token_cache_key(key)
+        snapshot = cache.get(cache_key)
+        if snapshot is not None:
+            return load_snapshot(key, snapshot)
+
+        # tokens which are invalid or of inactive users are not cached.
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, make_snapshot(token), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return user, token
+
+
+def invalidate_tokens(keys: Iterable[str]):
+    if (cache := get_token_cache()) is not None:
+        cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance: Token, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_tokens_of_saved_user(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    """ removes cached tokens of users whose fields are changed, e.g. users which are deactivated."""
+    if created or (update_fields is not None and not set(update_fields).intersection(USER_FIELDS)):
+        return
+    invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+class RefreshToken(tokens.RefreshToken):
+    """ refresh token with the username of user, whose access tokens are blacklisted with it."""
+
+    @classmethod
+    def for_user(cls, user: User) -> 'RefreshToken':
+        token = super().for_user(user)
+        token[USERNAME_CLAIM] = user.get_username()
+        return token
+
+    @property
+    def access_token(self) -> tokens.AccessToken:
+        access = super().access_token
+        access[REFRESH_JTI_CLAIM] = self[jwt_settings.JTI_CLAIM]
+        return access
+
+
+class TokenBlacklistFilter:
+    """ bloom filter of jtis of blacklisted tokens which are not expired, see StatelessJWTAuthentication."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.bloom_filter: Optional[BloomFilter] = None
+        # time of the database which the last refresh read rows since, and ids of rows which it read.
+        self.refreshed_since: Optional[datetime] = None
+        self.recent_ids: Set[int] = set()
+        self.refreshed_at = self.built_at = 0.0
+
+    def is_stale(self) -> bool:
+        return (self.bloom_filter is None
+                or time.monotonic() - self.refreshed_at >= settings.AUTH_JWT_BLACKLIST_REFRESH_INTERVAL)
+
+    def refresh(self):
+        """ adds tokens which are blacklisted since the last refresh, or builds the filter again."""
+        with self.lock:
+            if not self.is_stale():
+                return
+            now = time.monotonic()
+            if (self.bloom_filter is None or self.bloom_filter.is_full
+                    or now - self.built_at >= settings.AUTH_JWT_BLACKLIST_REBUILD_INTERVAL):
+                self.build()
+                self.built_at = now
+            else:
+                self.add_recent_rows()
+            self.refreshed_at = now
+
+    def get_overlap_start(self, since: datetime) -> datetime:
+        return since - timedelta(seconds=settings.AUTH_JWT_BLACKLIST_REFRESH_OVERLAP)
+
+    def add_recent_rows(self):
+        """
+        adds rows which are blacklisted since the last refresh. rows are read once their transaction commits,
+        which may be after rows with later ids and times are read, so rows of the last
+        AUTH_JWT_BLACKLIST_REFRESH_OVERLAP seconds before the last refresh are read again, without adding them twice.
+        """
+        since = timezone.now()
+        rows = (BlacklistedToken.objects.filter(blacklisted_at__gte=self.get_overlap_start(self.refreshed_since))
+                .values_list('id', 'token__jti'))
+        recent_ids = set()
+        for blacklisted_id, jti in rows:
+            if blacklisted_id not in self.recent_ids:
+                self.bloom_filter.add(jti)
+            recent_ids.add(blacklisted_id)
+        self.refreshed_since, self.recent_ids = since, recent_ids
+
+    def build(self):
+        since = timezone.now()
+        rows = list(BlacklistedToken.objects.filter(token__expires_at__gt=since)
+                    .values_list('id', 'token__jti', 'blacklisted_at'))
+        # capacity leaves room for tokens which are blacklisted until the next build.
+        bloom_filter = BloomFilter(max(settings.AUTH_JWT_BLACKLIST_FILTER_CAPACITY, 2 * len(rows)),
+                                   settings.AUTH_JWT_BLACKLIST_ERROR_RATE)
+        bloom_filter.update(jti for _, jti, _ in rows)
+        overlap_start = self.get_overlap_start(since)
+        self.bloom_filter, self.refreshed_since = bloom_filter, since
+        self.recent_ids = {blacklisted_id for blacklisted_id, _, blacklisted_at in rows
+                           if blacklisted_at >= overlap_start}
+
+    def add(self, jti: str):
+        with self.lock:
+            if self.bloom_filter is not None:
+                self.bloom_filter.add(jti)
+
+    def get_possible_jtis(self, jtis: Iterable[str]) -> List[str]:
+        """ :return: jtis which may be blacklisted, the filter should be refreshed if it is stale."""
+        return [jti for jti in jtis if jti in self.bloom_filter]
+
+
+blacklist_filter = TokenBlacklistFilter()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """ JWTAuthentication which does not query the database for users and blacklisted tokens."""
+
+    def get_user(self, validated_token: tokens.Token) -> User:
+        if blacklist_filter.is_stale():
+            blacklist_filter.refresh()
+        possible_jtis = blacklist_filter.get_possible_jtis(self.get_jtis(validated_token))
+        if possible_jtis and BlacklistedToken.objects.filter(token__jti__in=possible_jtis).exists():
+            raise exceptions.AuthenticationFailed(_('Token is blacklisted'), code='token_not_valid')
+        return self.get_stateless_user(validated_token)
+
+    @staticmethod
+    def get_jtis(validated_token: tokens.Token) -> List[str]:
+        """ :return: jtis of token and of the refresh token which issued it."""
+        return [jti for jti in (validated_token.get(jwt_settings.JTI_CLAIM), validated_token.get(REFRESH_JTI_CLAIM))
+                if jti]
+
+    def get_stateless_user(self, validated_token: tokens.Token) -> User:
+        """ :return: active user with id (and username) of token, other fields are loaded when they are read."""
+        try:
+            values = {jwt_settings.USER_ID_FIELD: validated_token[jwt_settings.USER_ID_CLAIM], 'is_active': True}
+        except KeyError:
+            raise exceptions.AuthenticationFailed(_('Token contained no recognizable user identification'),
+                                                  code='token_not_valid')
+        if USERNAME_CLAIM in validated_token:
+            values[User.USERNAME_FIELD] = validated_token[USERNAME_CLAIM]
+
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        return User.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_blacklisted_token_to_filter(sender, instance: BlacklistedToken, created: bool, **kwargs):
+    """ tokens which are blacklisted by this process are rejected right away, others after the next refresh."""
+    if created:
+        blacklist_filter.add(instance.token.jti)
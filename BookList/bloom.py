@@ -0,0 +1,55 @@
+"""
+Bloom filter: a set of strings in a fixed bit array which answers membership without false negatives.
+
+an item which was added is always found, an item which was not added is found with probability error_rate
+(for up to `capacity` items), so a lookup which finds an item should be confirmed by the source of the set
+(e.g. the database), and a lookup which does not find it needs no confirmation:
+
+    blacklisted = BloomFilter(capacity=100_000, error_rate=0.001)
+    blacklisted.add(jti)
+    if jti in blacklisted and BlacklistedToken.objects.filter(token__jti=jti).exists(): ...
+
+items can not be removed, the filter is built again to drop them.
+"""
+import hashlib
+import math
+from typing import *
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        # optimal number of bits and hash functions for capacity and error_rate.
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def get_positions(self, item: str) -> Iterator[int]:
+        # positions of hash functions by double hashing of two 64-bit halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.size for index in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self.get_positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(item))
+
+    def __len__(self) -> int:
+        """ :return: number of added items, including items which are added more than once."""
+        return self.count
+
+    @property
+    def is_full(self) -> bool:
+        """ :return: True if more than capacity items are added, so error rate is higher than error_rate."""
+        return self.count > self.capacity
@@ -0,0 +1,195 @@
+"""
+Compiled read-only variants of model serializers for hot list and retrieve endpoints.
+
+FastReadSerializer reproduces the output of its `serializer_class` (a DRF serializer) while skipping the
+field-by-field machinery of DRF. readable fields of the serializer are resolved once per class into a plan,
+and each request binds the plan to getters which read model attributes directly:
+    - concrete model fields whose DRF field is CharField, IntegerField, FloatField, BooleanField or
+      ReadOnlyField are converted with builtins, other model fields (decimals, dates, files) are converted
+      by to_representation() of their DRF field.
+    - PrimaryKeyRelatedField reads the `<field>_id` attribute, SlugRelatedField reads the slug of the
+      related object and nested serializers (e.g. of `depth`) are compiled recursively.
+    - SerializerMethodField calls the method of the subclass if it overrides it, otherwise of the serializer.
+    - other fields fall back to get_attribute() and to_representation() of DRF.
+so the rendered json is identical to the one of the serializer. fields of the plan are taken from a
+serializer without context, so serializers which change their fields by context should not be compiled.
+
+viewsets turn them on for safe requests of list and retrieve actions with FastReadSerializerMixin:
+
+    class OrderViewSet(FastReadSerializerMixin, GenericViewSet):
+        serializer_class = OrderSerializer
+        fast_read_serializer_class = FastOrderSerializer
+"""
+from operator import attrgetter
+from typing import *
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.functional import cached_property
+from rest_framework import fields, relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+ATTRIBUTE, RELATED_PK, SLUG, NESTED, METHOD, FIELD = range(6)
+
+CONVERTERS: Dict[type, Optional[Callable]] = {
+    fields.CharField: str,
+    fields.IntegerField: int,
+    fields.FloatField: float,
+    fields.BooleanField: bool,
+    fields.ReadOnlyField: None,
+}
+
+_SKIP = object()
+
+
+def compile_serializer(serializer: serializers.Serializer) -> List[Tuple[str, int, Any]]:
+    """ :return: plan of (field name, kind, argument of kind) for readable fields of serializer."""
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    plan = []
+    for field in serializer._readable_fields:
+        name = field.field_name
+        if isinstance(field, serializers.SerializerMethodField):
+            plan.append((name, METHOD, field.method_name))
+            continue
+
+        model_field = None
+        if model is not None and field.source != '*' and len(field.source_attrs) == 1:
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                pass
+
+        if model_field is None:
+            plan.append((name, FIELD, None))
+        elif (model_field.many_to_one or model_field.one_to_one) and model_field.concrete:
+            if type(field) is relations.PrimaryKeyRelatedField and field.pk_field is None:
+                plan.append((name, RELATED_PK, model_field.attname))
+            elif type(field) is relations.SlugRelatedField:
+                plan.append((name, SLUG, (field.source, attrgetter(field.slug_field.replace('__', '.')))))
+            elif isinstance(field, serializers.Serializer):
+                plan.append((name, NESTED, (field.source, compile_serializer(field))))
+            else:
+                plan.append((name, FIELD, None))
+        elif model_field.concrete and not model_field.is_relation:
+            converter = CONVERTERS.get(type(field), _SKIP)
+            plan.append((name, ATTRIBUTE, (model_field.attname, converter)))
+        else:
+            plan.append((name, FIELD, None))
+    return plan
+
+
+def _attribute_getter(attname: str, converter: Optional[Callable], field: fields.Field) -> Callable:
+    if converter is _SKIP:
+        converter = field.to_representation
+
+    if converter is None:
+        return attrgetter(attname)
+
+    def get(instance):
+        value = getattr(instance, attname)
+        return None if value is None else converter(value)
+    return get
+
+
+def _slug_getter(source: str, get_slug: Callable) -> Callable:
+    def get(instance):
+        related = getattr(instance, source)
+        return None if related is None else get_slug(related)
+    return get
+
+
+def _nested_getter(source: str, getters: List[Tuple[str, Callable]]) -> Callable:
+    def get(instance):
+        related = getattr(instance, source)
+        return None if related is None else _represent(getters, related)
+    return get
+
+
+def _field_getter(field: fields.Field) -> Callable:
+    """ :return: getter with the semantics of Serializer.to_representation() for one field."""
+    def get(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+    return get
+
+
+def _represent(getters: List[Tuple[str, Callable]], instance) -> dict:
+    data = {}
+    for name, get in getters:
+        value = get(instance)
+        if value is not _SKIP:
+            data[name] = value
+    return data
+
+
+class FastReadSerializer(serializers.BaseSerializer):
+    """ read-only serializer which produces the same data as `serializer_class` from a compiled plan."""
+
+    serializer_class: Type[serializers.Serializer] = None
+
+    @classmethod
+    def get_plan(cls) -> List[Tuple[str, int, Any]]:
+        # plans are not inherited, as subclasses may reproduce another serializer.
+        if '_plan' not in cls.__dict__:
+            cls._plan = compile_serializer(cls.serializer_class())
+        return cls._plan
+
+    @cached_property
+    def serializer(self) -> serializers.Serializer:
+        """ the reproduced serializer with context of this one, for methods and fields which are not compiled."""
+        return self.serializer_class(context=self.context)
+
+    @cached_property
+    def getters(self) -> List[Tuple[str, Callable]]:
+        return self.bind_plan(self.get_plan(), self.serializer, overrides=self)
+
+    def bind_plan(self, plan: List[Tuple[str, int, Any]], serializer: serializers.Serializer,
+                  overrides=None) -> List[Tuple[str, Callable]]:
+        """ :return: (field name, getter) of plan, getters of methods are looked up in overrides first."""
+        getters = []
+        for name, kind, argument in plan:
+            if kind == ATTRIBUTE:
+                attname, converter = argument
+                getter = _attribute_getter(attname, converter, serializer.fields[name])
+            elif kind == RELATED_PK:
+                getter = attrgetter(argument)
+            elif kind == SLUG:
+                getter = _slug_getter(*argument)
+            elif kind == NESTED:
+                source, nested_plan = argument
+                getter = _nested_getter(source, self.bind_plan(nested_plan, serializer.fields[name]))
+            elif kind == METHOD and overrides is not None and self.is_overridden(argument):
+                getter = getattr(overrides, argument)
+            elif kind == METHOD:
+                getter = getattr(serializer, argument)
+            else:
+                getter = _field_getter(serializer.fields[name])
+            getters.append((name, getter))
+        return getters
+
+    @classmethod
+    def is_overridden(cls, method_name: str) -> bool:
+        return hasattr(cls, method_name) and not hasattr(FastReadSerializer, method_name)
+
+    def to_representation(self, instance) -> dict:
+        return _represent(self.getters, instance)
+
+
+class FastReadSerializerMixin:
+    """
+    uses `fast_read_serializer_class` instead of `serializer_class` for safe requests of `fast_read_actions`.
+    it is turned off by setting `fast_read_serializer_class` to None.
+    """
+    fast_read_serializer_class: Optional[Type[FastReadSerializer]] = None
+    fast_read_actions = ('list', 'retrieve')
+
+    def get_serializer_class(self):
+        if (self.fast_read_serializer_class is not None
+                and self.action in self.fast_read_actions
+                and self.request.method in ('GET', 'HEAD')):
+            return self.fast_read_serializer_class
+        return super().get_serializer_class()
@@ -0,0 +1,65 @@
+"""
+Multi-process HTTP load generator of the benchmark command.
+
+It only depends on the standard library, so worker processes are spawned without setting up Django
+and do not share the database connections or threads of the process which serves the requests.
+"""
+import http.client
+import multiprocessing
+import time
+from typing import *
+from urllib.parse import urlsplit
+
+
+class HTTPRequest(NamedTuple):
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: Optional[bytes] = None
+
+
+def send_requests(base_url: str, requests: Sequence[HTTPRequest]) -> List[Tuple[float, int]]:
+    """
+    sends requests one after another, each over a new connection. keep-alive connections of django's
+    development server are delayed by Nagle's algorithm, which would be measured as ~40ms of every request.
+    :return: (latency in seconds, status code) of each request, status code is 0 if the request failed.
+    """
+    url = urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    results = []
+    for request in requests:
+        start = time.perf_counter()
+        try:
+            connection.request(request.method, request.path, body=request.body,
+                               headers={**request.headers, 'Connection': 'close'})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = 0
+        finally:
+            connection.close()
+        results.append((time.perf_counter() - start, status))
+    return results
+
+
+def _ready(_) -> bool:
+    return True
+
+
+def run_load(base_url: str, requests: Sequence[HTTPRequest], concurrency: int) -> Tuple[List[Tuple[float, int]], float]:
+    """
+    splits requests between `concurrency` worker processes which send them at the same time.
+    :return: results of all requests and the wall time of sending them in seconds.
+    """
+    concurrency = max(1, min(concurrency, len(requests)))
+    chunks = [requests[worker::concurrency] for worker in range(concurrency)]
+
+    with multiprocessing.get_context('spawn').Pool(concurrency) as pool:
+        # workers are started before the clock, so the time of spawning them is not measured.
+        pool.map(_ready, range(concurrency))
+        start = time.perf_counter()
+        results = pool.starmap(send_requests, [(base_url, chunk) for chunk in chunks], chunksize=1)
+        elapsed = time.perf_counter() - start
+
+    return [result for chunk in results for result in chunk], elapsed
@@ -0,0 +1,301 @@
+"""
+Lightweight per-request performance instrumentation.
+
+MetricsMiddleware measures total time, database time and query count, serializer time and render time
+of each request, and exports them:
+    - as `Server-Timing` header of the response, which is shown by browser developer tools.
+    - as a structured (json) log line of `BookList.metrics` logger at INFO level.
+    - as Prometheus histograms per url name (e.g. `restaurant:orders-list`) served by `metrics_view`,
+      which is only accessible from METRICS_ALLOWED_IPS (no addresses by default).
+
+The middleware supports both sync and async requests, so async views are not run in a thread for it.
+Phases overlap, e.g. queries of lazy querysets which are evaluated by serializers are counted in both
+database and serializer time. metrics are kept in memory of each process, so every process of a
+multi-process server exports its own metrics.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import *
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'db_time', 'query_count', 'serializer_time', 'render_time', 'render_start',
+                 'in_serializer')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.query_count = 0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.render_start = None
+        self.in_serializer = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """ execute wrapper of database connections."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+
+
+_current_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+def _timed_serializer_data(get_data: Callable) -> property:
+    """ :return: `data` property of serializers which adds the time of outermost serializers to request metrics."""
+
+    def data(serializer):
+        metrics = _current_metrics.get()
+        if metrics is None or metrics.in_serializer:
+            return get_data(serializer)
+
+        metrics.in_serializer = True
+        start = time.perf_counter()
+        try:
+            return get_data(serializer)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.in_serializer = False
+
+    data._timed = True
+    return property(data)
+
+
+def instrument_serializers():
+    """ measures `data` of serializers, which is where DRF serializes instances, once per process."""
+    if not getattr(BaseSerializer.data.fget, '_timed', False):
+        BaseSerializer.data = _timed_serializer_data(BaseSerializer.data.fget)
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')) for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [counts of buckets (not cumulative) and +Inf, sum]
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, label_values: tuple, value: float):
+        counts_and_sum = self.values.get(label_values)
+        if counts_and_sum is None:
+            counts_and_sum = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts_and_sum[0][bisect_left(self.buckets, value)] += 1
+        counts_and_sum[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in sorted(self.values.items()):
+            labels = tuple(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels((*labels, ("le", bound)))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values: Dict[tuple, int] = {}
+
+    def inc(self, label_values: tuple):
+        self.values[label_values] = self.values.get(label_values, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(zip(self.label_names, label_values))} {value}')
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter('http_requests_total', 'Requests by url name, method and status code.',
+                                ('view', 'method', 'status'))
+        self.histograms = {
+            'total': Histogram('http_request_duration_seconds', 'Total time of requests.', ('view', )),
+            'db': Histogram('http_request_db_seconds', 'Time of database queries of requests.', ('view', )),
+            'queries': Histogram('http_request_queries', 'Number of database queries of requests.', ('view', ),
+                                 QUERY_COUNT_BUCKETS),
+            'serializer': Histogram('http_request_serializer_seconds', 'Time of serializing responses.', ('view', )),
+            'render': Histogram('http_request_render_seconds', 'Time of rendering responses.', ('view', )),
+        }
+
+    def observe(self, view_name: str, method: str, status: int, values: Dict[str, float]):
+        with self.lock:
+            self.requests.inc((view_name, method, str(status)))
+            for phase, value in values.items():
+                self.histograms[phase].observe((view_name, ), value)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = self.requests.render()
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            for metric in (self.requests, *self.histograms.values()):
+                metric.values.clear()
+
+
+registry = MetricsRegistry()
+
+
+def get_view_name(request) -> str:
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.view_name if resolver_match is not None else '<unresolved>'
+
+
+def _record_query(execute, sql, params, many, context):
+    """ execute wrapper of all database connections which adds queries to metrics of current request."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    """
+    adds _record_query() to execute wrappers of connection, once. connections are per thread, so this is
+    done for each new connection (connection_created signal) instead of each request, and queries of async views
+    which are executed in other threads are added to metrics of their request by the context variable.
+    """
+    if _record_query not in connection.execute_wrappers:
+        # wrappers of execute_wrapper() are removed from the end of the list.
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+class MetricsMiddleware:
+    """ measures phases of requests, it should be the first middleware so its total time covers the others."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        instrument_serializers()
+        connection_created.connect(instrument_connection)
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(connection)
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    def process_metrics(self, request, response, metrics: RequestMetrics):
+        """ exports metrics of request, and adds them to Server-Timing header of response."""
+        total_time = time.perf_counter() - metrics.start
+
+        view_name = get_view_name(request)
+        if view_name == 'metrics':
+            return response
+
+        values = {
+            'total': total_time,
+            'db': metrics.db_time,
+            'queries': metrics.query_count,
+            'serializer': metrics.serializer_time,
+            'render': metrics.render_time,
+        }
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={total_time * 1000:.2f}',
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.query_count} queries"',
+            f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+            f'render;dur={metrics.render_time * 1000:.2f}',
+        ))
+        registry.observe(view_name, request.method, response.status_code, values)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': view_name,
+                'status': response.status_code,
+                'total_ms': round(total_time * 1000, 3),
+                'db_ms': round(metrics.db_time * 1000, 3),
+                'queries': metrics.query_count,
+                'serializer_ms': round(metrics.serializer_time * 1000, 3),
+                'render_ms': round(metrics.render_time * 1000, 3),
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # responses of DRF are rendered by the handler right after this hook, as this is the first middleware.
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics.render_start = time.perf_counter()
+            response.add_post_render_callback(self.stop_render_timer)
+        return response
+
+    @staticmethod
+    def stop_render_timer(response):
+        metrics = _current_metrics.get()
+        if metrics is not None and metrics.render_start is not None:
+            metrics.render_time += time.perf_counter() - metrics.render_start
+
+
+def metrics_view(request):
+    """ metrics of this process in Prometheus text format, only for METRICS_ALLOWED_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
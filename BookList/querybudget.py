@@ -0,0 +1,155 @@
+"""
+Query budgets of views and detection of N+1 query patterns.
+
+Views declare the maximum number of queries which a request may issue with `query_budget` attribute,
+either a number for all actions or a dict of action names (or lowercase http methods of non-viewset views)
+to numbers:
+
+    class OrderViewSet(GenericViewSet):
+        query_budget = {'list': 4, 'retrieve': 3}
+
+QueryBudgetMiddleware records SQL of every request and logs a warning, or raises QueryBudgetExceeded if
+QUERY_BUDGET_RAISE setting is True, when a request goes over the budget of its view or repeats a statement
+(with different parameters) QUERY_BUDGET_N_PLUS_ONE_THRESHOLD times or more, which is an N+1 pattern.
+QueryBudgetTestMixin raises in tests and adds assertQueryBudget() for blocks of code.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import *
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import override_settings
+
+logger = logging.getLogger(__name__)
+
+# savepoints of nested atomic blocks have unique names, they are not repeated statements.
+_IGNORED_STATEMENTS = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LISTS = re.compile(r'\((?:\s*(?:%s|\?|NULL)\s*,)+\s*(?:%s|\?|NULL)\s*\)', re.IGNORECASE)
+_WHITESPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql: str) -> str:
+    """ :return: sql without literal values, so statements which differ only in their parameters are equal."""
+    sql = _STRING_LITERALS.sub('%s', sql)
+    sql = _NUMBERS.sub('%s', sql)
+    sql = _VALUE_LISTS.sub('(...)', sql)
+    return _WHITESPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """ records statements which are executed on all database connections of current thread."""
+
+    def __init__(self):
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration': time.perf_counter() - start,
+            })
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def get_repeated_statements(self, threshold: int) -> List[Tuple[str, int]]:
+        """ :return: normalized statements which are executed at least threshold times, and their counts."""
+        counts = Counter(
+            normalize_sql(query['sql']) for query in self.queries if not _IGNORED_STATEMENTS.match(query['sql'])
+        )
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+def get_n_plus_one_threshold() -> int:
+    return getattr(settings, 'QUERY_BUDGET_N_PLUS_ONE_THRESHOLD', 3)
+
+
+def get_problems(recorder: QueryRecorder, budget: Optional[int], threshold: Optional[int] = None) -> List[str]:
+    """ :return: descriptions of exceeding budget and N+1 patterns of recorded queries."""
+    problems = []
+    if budget is not None and len(recorder) > budget:
+        problems.append(f'{len(recorder)} queries are executed, budget is {budget}.')
+    for sql, count in recorder.get_repeated_statements(threshold or get_n_plus_one_threshold()):
+        problems.append(f'N+1 pattern, executed {count} times: {sql}')
+    return problems
+
+
+def get_view_query_budget(view_func, method: str) -> Optional[int]:
+    """ :return: query_budget of class of view (DRF views and viewsets) for the action of http method."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if not isinstance(budget, dict):
+        return budget
+
+    method = method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method)
+    return budget.get(action, budget.get(method))
+
+
+class QueryBudgetMiddleware:
+    """ checks queries of each request against query budget of its view and reports N+1 patterns."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        if problems := get_problems(recorder, request.query_budget):
+            message = f'{request.method} {request.path}: ' + ' '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_view_query_budget(view_func, request.method)
+
+
+class QueryBudgetTestMixin:
+    """
+    makes QueryBudgetMiddleware fail the requests of test client which go over budget or have N+1 patterns,
+    and checks blocks of code with assertQueryBudget().
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(QUERY_BUDGET_RAISE=True))
+
+    @contextmanager
+    def assertQueryBudget(self, budget: Optional[int] = None, threshold: Optional[int] = None):
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+
+        if problems := get_problems(recorder, budget, threshold):
+            queries = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(recorder.queries, start=1))
+            self.fail('\n'.join(problems) + f'\nQueries:\n{queries}')
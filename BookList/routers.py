@@ -0,0 +1,126 @@
+"""
+Routing of read-only requests to read replicas of the default (primary) database.
+
+Views declare which of their actions only read with `replica_actions` attribute, a sequence of action names
+(or lowercase http methods of non-viewset views), and get ReplicaReadMixin:
+
+    class MenuItemViewSet(ReplicaReadMixin, ModelViewSet):
+        replica_actions = ('list', 'retrieve')
+
+GET and HEAD requests of these actions read from one of the aliases of DATABASE_REPLICAS setting, chosen at
+random, after the user is authenticated and permissions are checked. PrimaryReplicaRouter sends every other
+read and all writes to the primary, so nothing is routed to replicas if DATABASE_REPLICAS is empty.
+
+replicas lag behind the primary, so users read their own writes from the primary: StickyPrimaryMiddleware marks
+users whose unsafe requests (POST, PUT, PATCH, DELETE) succeed, e.g. OrderViewSet.create or CartViewSet.add,
+in the cache for DATABASE_STICKY_PRIMARY_SECONDS, and reads of marked users are not routed to replicas.
+the cache should be shared by all processes, like the catalog version, for marks to reach all of them.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import *
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+
+STICKY_PRIMARY_CACHE_KEY = 'db-sticky-primary:{user_id}'
+
+# alias of database which reads of current request (thread or task) are routed to, None for the primary.
+_read_database: ContextVar[Optional[str]] = ContextVar('read_database', default=None)
+
+
+def get_current_read_database() -> Optional[str]:
+    """ :return: alias of replica which reads are routed to, None if they go to the primary."""
+    return _read_database.get()
+
+
+@contextmanager
+def reads_from(alias: Optional[str]):
+    """ routes reads of the block to database alias, or to the primary if alias is None."""
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints) -> str:
+        return _read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints) -> str:
+        # objects which are read from replicas are saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def get_sticky_primary_cache_key(user) -> str:
+    return STICKY_PRIMARY_CACHE_KEY.format(user_id=user.pk)
+
+
+def can_read_from_replica(view, request: Request) -> bool:
+    """ :return: True if request is a GET or HEAD request of one of `replica_actions` of view."""
+    if not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD'):
+        return False
+    action = getattr(view, 'action', None) or request.method.lower()
+    return action in getattr(view, 'replica_actions', ())
+
+
+def get_read_database(view, request: Request) -> Optional[str]:
+    """ :return: replica alias which reads of request are routed to, None to read from the primary."""
+    if not can_read_from_replica(view, request):
+        return None
+    if request.user.is_authenticated and cache.get(get_sticky_primary_cache_key(request.user)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+async def aget_read_database(view, request: Request) -> Optional[str]:
+    """ async version of get_read_database() for async views."""
+    if not can_read_from_replica(view, request):
+        return None
+    if request.user.is_authenticated and await cache.aget(get_sticky_primary_cache_key(request.user)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaReadMixin:
+    """ routes reads of `replica_actions` of views to replicas, after authentication and permission checks."""
+    replica_actions: Sequence[str] = ()
+
+    def initial(self, request: Request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._read_database_token = _read_database.set(get_read_database(self, request))
+
+    def finalize_response(self, request: Request, response, *args, **kwargs):
+        if (token := getattr(self, '_read_database_token', None)) is not None:
+            _read_database.reset(token)
+            self._read_database_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class StickyPrimaryMiddleware:
+    """ marks users whose writes succeed, so their reads stay on the primary while replicas catch up."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # request.user is set by authentication of rest_framework views as well.
+        user = getattr(request, 'user', None)
+        if (settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            cache.set(get_sticky_primary_cache_key(user), True, settings.DATABASE_STICKY_PRIMARY_SECONDS)
+        return response
@@ -0,0 +1,275 @@
+"""
+Pluggable full-text search of models.
+
+Models are registered with the fields that are indexed (related fields can be given like `category__name`),
+then `get_search_backend(queryset.db).search(queryset, term)` filters and ranks a queryset of them.
+every word of the search term is matched as a prefix of words of indexed fields.
+
+Backend is chosen by the vendor of database, or by SEARCH_BACKEND setting (dotted path of a backend class):
+    - sqlite: an FTS5 virtual table per model which is kept in sync by model signals.
+    - postgresql: tsvector of indexed fields which is computed and ranked by the database.
+    - others: icontains lookups of indexed fields (the behavior of rest_framework SearchFilter).
+"""
+import re
+from functools import lru_cache
+from typing import *
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+
+class SearchIndex:
+    """ definition of full-text index of a model."""
+
+    def __init__(self, model: Type[models.Model], fields: Sequence[str]):
+        self.model = model
+        self.fields = tuple(fields)
+        self.table_name = f'{model._meta.db_table}_fts'
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        return tuple(field.replace('__', '_') for field in self.fields)
+
+    def get_related_lookups(self) -> Dict[Type[models.Model], str]:
+        """ :return: related models whose fields are indexed, mapped to the lookup of this model to them."""
+        related_lookups = {}
+        for field_path in self.fields:
+            if '__' in field_path:
+                lookup = field_path.split('__', 1)[0]
+                related_lookups[self.model._meta.get_field(lookup).related_model] = lookup
+        return related_lookups
+
+
+_indexes: Dict[Type[models.Model], SearchIndex] = {}
+
+
+def register(model: Type[models.Model], fields: Sequence[str]) -> SearchIndex:
+    """
+    registers full-text index of model and connects signals which keep the index in sync.
+    it should be called in ready() of app config of the model.
+    """
+    index = SearchIndex(model, fields)
+    _indexes[model] = index
+
+    post_save.connect(_update_index_on_save, sender=model, dispatch_uid=f'search-index-save-{index.table_name}')
+    post_delete.connect(_update_index_on_delete, sender=model, dispatch_uid=f'search-index-delete-{index.table_name}')
+    for related_model in index.get_related_lookups():
+        post_save.connect(_update_index_on_related_save, sender=related_model,
+                          dispatch_uid=f'search-index-related-save-{related_model._meta.label_lower}')
+    return index
+
+
+def get_index(model: Type[models.Model]) -> SearchIndex:
+    return _indexes[model]
+
+
+def get_indexes() -> List[SearchIndex]:
+    return list(_indexes.values())
+
+
+def get_search_terms(term: str) -> List[str]:
+    """ :return: words of search term, without any syntax of search query languages."""
+    return re.findall(r'\w+', term)
+
+
+class BaseSearchBackend:
+
+    def __init__(self, using: str = 'default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def create_index(self, index: SearchIndex):
+        """ creates storage of index in database, if backend needs it."""
+        pass
+
+    def update(self, index: SearchIndex, queryset: models.QuerySet):
+        """ adds or replaces given objects in the index."""
+        pass
+
+    def remove(self, index: SearchIndex, pks: Iterable[Any]):
+        """ removes objects with given primary keys from the index."""
+        pass
+
+    def rebuild(self, index: SearchIndex, batch_size: int = 2000):
+        """ (re)creates the index and fills it with all objects of its model."""
+        self.create_index(index)
+        queryset = index.model._default_manager.using(self.using).order_by('pk')
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            self.update(index, queryset.filter(pk__in=pks))
+            last_pk = pks[-1]
+
+    def search(self, queryset: models.QuerySet, term: str) -> models.QuerySet:
+        """
+        :return: objects of queryset which match all words of term as prefixes,
+                annotated with `search_rank` (higher is better) and ordered by it if backend ranks results.
+        """
+        raise NotImplementedError
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """ fallback backend which scans indexed fields with icontains lookups and does not rank results."""
+
+    def search(self, queryset: models.QuerySet, term: str) -> models.QuerySet:
+        index = get_index(queryset.model)
+        for search_term in get_search_terms(term):
+            conditions = models.Q()
+            for field in index.fields:
+                conditions |= models.Q(**{f'{field}__icontains': search_term})
+            queryset = queryset.filter(conditions)
+        return queryset.distinct() if any('__' in field for field in index.fields) else queryset
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """
+    keeps indexed fields in an FTS5 virtual table whose rowid is primary key of the object,
+    and ranks matches with bm25.
+    """
+
+    def create_index(self, index: SearchIndex):
+        quote_name = self.connection.ops.quote_name
+        columns = ', '.join(quote_name(column) for column in index.column_names)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {quote_name(index.table_name)} '
+                f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def update(self, index: SearchIndex, queryset: models.QuerySet):
+        quote_name = self.connection.ops.quote_name
+        columns = ', '.join(quote_name(column) for column in index.column_names)
+        placeholders = ', '.join(['%s'] * (len(index.fields) + 1))
+        rows = [
+            (pk, *('' if value is None else str(value) for value in values))
+            for pk, *values in queryset.values_list('pk', *index.fields)
+        ]
+        if rows:
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {quote_name(index.table_name)} (rowid, {columns}) VALUES ({placeholders})',
+                    rows
+                )
+
+    def remove(self, index: SearchIndex, pks: Iterable[Any]):
+        pks = list(pks)
+        if pks:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.connection.ops.quote_name(index.table_name)} '
+                    f'WHERE rowid IN ({", ".join(["%s"] * len(pks))})',
+                    pks
+                )
+
+    def search(self, queryset: models.QuerySet, term: str) -> models.QuerySet:
+        search_terms = get_search_terms(term)
+        if not search_terms:
+            return queryset
+
+        index = get_index(queryset.model)
+        quote_name = self.connection.ops.quote_name
+        table = quote_name(index.table_name)
+        model_table = quote_name(index.model._meta.db_table)
+        pk_column = quote_name(index.model._meta.pk.column)
+        match_query = ' '.join(f'"{search_term}"*' for search_term in search_terms)
+
+        return (queryset
+                .filter(pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (match_query, )))
+                .annotate(search_rank=RawSQL(
+                    f'SELECT -bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {model_table}.{pk_column}',
+                    (match_query, ),
+                    output_field=models.FloatField()))
+                .order_by('-search_rank'))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """ ranks tsvector of indexed fields, which is computed by the database, against a prefix tsquery."""
+
+    def search(self, queryset: models.QuerySet, term: str) -> models.QuerySet:
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        search_terms = get_search_terms(term)
+        if not search_terms:
+            return queryset
+
+        index = get_index(queryset.model)
+        vector = SearchVector(*index.fields)
+        query = SearchQuery(' & '.join(f'{search_term}:*' for search_term in search_terms), search_type='raw')
+        return (queryset
+                .annotate(search_vector=vector)
+                .filter(search_vector=query)
+                .annotate(search_rank=SearchRank(vector, query))
+                .order_by('-search_rank'))
+
+
+@lru_cache(maxsize=None)
+def sqlite_supports_fts5(using: str) -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def get_search_backend(using: str = 'default') -> BaseSearchBackend:
+    """ :return: search backend of SEARCH_BACKEND setting or the appropriate one for database vendor."""
+    if backend_path := getattr(settings, 'SEARCH_BACKEND', None):
+        return import_string(backend_path)(using)
+
+    vendor = connections[using].vendor
+    if vendor == 'sqlite' and sqlite_supports_fts5(using):
+        return SQLiteFTS5SearchBackend(using)
+    elif vendor == 'postgresql':
+        return PostgresSearchBackend(using)
+    else:
+        return IContainsSearchBackend(using)
+
+
+def search(queryset: models.QuerySet, term: str) -> models.QuerySet:
+    """ full-text searches term in queryset of a registered model."""
+    return get_search_backend(queryset.db).search(queryset, term)
+
+
+def _update_index_on_save(sender, instance, using, **kwargs):
+    get_search_backend(using).update(get_index(sender), sender._default_manager.using(using).filter(pk=instance.pk))
+
+
+def _update_index_on_delete(sender, instance, using, **kwargs):
+    get_search_backend(using).remove(get_index(sender), [instance.pk])
+
+
+def _update_index_on_related_save(sender, instance, using, created, **kwargs):
+    if created:
+        return
+    for index in get_indexes():
+        if lookup := index.get_related_lookups().get(sender):
+            dependents = index.model._default_manager.using(using).filter(**{lookup: instance})
+            get_search_backend(using).update(index, dependents)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter which uses full-text search backend of the model of view queryset.
+    search query param can be changed by `search_query_param` attribute of the view.
+    """
+
+    def get_search_param(self, view) -> str:
+        return getattr(view, 'search_query_param', self.search_param)
+
+    def get_search_term(self, request, view) -> str:
+        """ :return: search term of request, an empty string if request does not search."""
+        return request.query_params.get(self.get_search_param(view), '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request, view)
+        if not term:
+            return queryset
+        return search(queryset, term)
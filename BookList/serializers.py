@@ -1,4 +1,7 @@
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
+from rest_framework_simplejwt import serializers as jwt_serializers
+
+from BookList.authentication import RefreshToken
 # from django.contrib.auth.models import User
 
 
@@ -10,3 +13,12 @@ class UserCreateSerializer(BaseUserCreateSerializer):
             # making email field required for creating a user.
             'email': {'required': True},
         }
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    # access tokens carry the jti of their refresh token, see StatelessJWTAuthentication.
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -45,17 +45,21 @@ INSTALLED_APPS = [
     'djoser',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
+    'jobs.apps.JobsConfig',
     "restaurant.apps.RestaurantConfig",
     'BookListAPI.apps.BooklistapiConfig',
 
 ]
 
 MIDDLEWARE = [
+    'BookList.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'BookList.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'BookList.routers.StickyPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -91,12 +95,99 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # transactions take the write lock when they begin, so a transaction which reads and then writes does not
+        # fail with "database is locked" when another connection writes in between (e.g. concurrent checkouts).
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # read replica of default database, which is a copy of db.sqlite3 made by
+    # `python manage.py copy_sqlite_replicas` to try replicas locally.
+    # in tests it is a separate database, so tests can tell which database is read.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+    },
+}
+
+# aliases of DATABASES which are read replicas of default database. GET requests of `replica_actions` of views
+# (BookList/routers.py) read from one of them, other reads and all writes go to default database.
+# replicas are not used if it is empty, add 'replica' to try them.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['BookList.routers.PrimaryReplicaRouter']
+# seconds that reads of a user go to default database after their writes, so they read their own writes
+# while replicas catch up. it should be longer than the replication lag.
+DATABASE_STICKY_PRIMARY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# the cache is shared by all processes of the project, as catalog versions and cached responses, throttle
+# counters, cached tokens and their invalidations must reach every worker. the file based cache is shared by
+# the processes of one host, Redis should be used when the project is served by more than one host, which also
+# makes increments of throttle counters atomic:
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     },
+# a local memory cache (LocMemCache) is per process, it must not be used with more than one process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     },
-    'TEST': {
-        'NAME': BASE_DIR / 'test_db.sqlite3',
-    }
 }
 
+# cache of request counters of throttles (BookListAPI/throttles.py), it should be shared by all processes.
+THROTTLE_CACHE_ALIAS = 'default'
+
+# tokens and snapshots of their users are kept in this cache for AUTH_TOKEN_CACHE_TIMEOUT seconds by
+# BookList.authentication.CachedTokenAuthentication, it should be shared by all processes so logouts and
+# deactivated users are invalidated for all of them. tokens are not cached in a local memory cache.
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 15
+
+# seconds that group names of a user are kept in the cache.
+RESTAURANT_GROUP_NAMES_CACHE_TIMEOUT = 60 * 15
+
+# orders are assigned to the least loaded delivery crew members by a background job after checkout
+# (restaurant/assignment.py), delivery crew members with this many undelivered orders are not assigned more.
+RESTAURANT_AUTO_ASSIGN_ORDERS = True
+RESTAURANT_DELIVERY_CREW_MAX_LOAD = 10
+
+# carts are deleted with single statements, pre_delete and post_delete signals of carts are not sent if this is
+# False (rows are never fetched to send them), only if no receivers of the signals depend on deleted carts.
+RESTAURANT_CART_DELETE_SIGNALS = True
+# carts which are not changed for this many days are deleted by `python manage.py clear_stale_carts`,
+# which is meant to run daily (e.g. by cron).
+RESTAURANT_STALE_CART_DAYS = 30
+
+# read-heavy and long-poll routes of restaurant are served by async views (restaurant/async_views.py) if this is
+# True, which only helps under an ASGI server. they run authentication and pagination of rest_framework in threads.
+# the change feed of orders is meant to be served by them: sync views answer long-polls right away and close
+# streams after the available changes, whose clients reconnect every 30 seconds.
+RESTAURANT_ASYNC_VIEWS = False
+
+# seconds that responses of menu items and categories are kept in the cache.
+# cached responses are invalidated sooner whenever a menu item or category changes.
+RESTAURANT_CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+# Query budgets
+# views declare the maximum number of queries of a request with `query_budget` attribute (BookList/querybudget.py).
+# requests over budget, or repeating a statement this many times (N+1 pattern), are logged as warnings
+# or raise QueryBudgetExceeded if QUERY_BUDGET_RAISE is True.
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_N_PLUS_ONE_THRESHOLD = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -144,6 +235,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 INTERNAL_IPS = ['127.0.0.1']
 
+# Background jobs
+# deferred work of requests is stored in the job table and run by `python manage.py run_jobs` workers (jobs app).
+# failed jobs are retried after JOBS_RETRY_DELAY seconds, doubled after each attempt, up to JOBS_MAX_ATTEMPTS times.
+# running jobs are claimed again by other workers after JOBS_LEASE seconds.
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_LEASE = 60 * 5
+
+
+# Metrics
+# phases of requests are measured by BookList.metrics.MetricsMiddleware and exported as Server-Timing headers,
+# json logs of `BookList.metrics` logger and Prometheus histograms at /metrics for METRICS_ALLOWED_IPS.
+# /metrics is not served to any address by default. addresses should be those of the scrapers as they reach
+# the server (REMOTE_ADDR), behind a reverse proxy on the same host every client has the address of the proxy,
+# so 127.0.0.1 must not be allowed then.
+METRICS_ENABLED = True
+METRICS_ALLOWED_IPS = []
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -153,9 +262,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'BookList.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        # 'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'BookList.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_THROTTLE_RATES': {
         'user': '5/minute',
@@ -176,10 +285,27 @@ DJOSER = {
 }
 
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5)
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'TOKEN_OBTAIN_SERIALIZER': 'BookList.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'BookList.serializers.TokenRefreshSerializer',
 }
 
+# json web tokens are authenticated without the database by BookList.authentication.StatelessJWTAuthentication,
+# blacklisted tokens are looked up in a bloom filter which has room for AUTH_JWT_BLACKLIST_FILTER_CAPACITY tokens
+# with AUTH_JWT_BLACKLIST_ERROR_RATE false positives (which are confirmed by the database). the filter reads
+# new blacklisted tokens every AUTH_JWT_BLACKLIST_REFRESH_INTERVAL seconds and is built again from
+# unexpired blacklisted tokens every AUTH_JWT_BLACKLIST_REBUILD_INTERVAL seconds. tokens which are blacklisted
+# within AUTH_JWT_BLACKLIST_REFRESH_OVERLAP seconds before a refresh are read again by the next one, it should be
+# longer than transactions which blacklist tokens and the clock difference of servers.
+AUTH_JWT_BLACKLIST_FILTER_CAPACITY = 100_000
+AUTH_JWT_BLACKLIST_ERROR_RATE = 0.001
+AUTH_JWT_BLACKLIST_REFRESH_INTERVAL = 5
+AUTH_JWT_BLACKLIST_REFRESH_OVERLAP = 60
+AUTH_JWT_BLACKLIST_REBUILD_INTERVAL = 60 * 60
+
 
 # email configuration
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# emails are queued as background jobs by jobs.mail.EmailBackend and sent by JOBS_EMAIL_BACKEND in workers.
+EMAIL_BACKEND = 'jobs.mail.EmailBackend'
+JOBS_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 SITE_NAME = " MY SITE "
@@ -20,6 +20,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
 
+from BookList.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -32,6 +34,7 @@ urlpatterns = [
     path('auth/jwt-token/obtain', TokenObtainPairView.as_view(), name='token_jwt_obtain'),
     path('auth/jwt-token/refresh', TokenRefreshView.as_view(), name='token_jwt_refresh'),
     path('auth/jwt-token/blacklist', TokenBlacklistView.as_view(), name='token_jwt_blacklist'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 
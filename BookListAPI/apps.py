@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BooklistapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'BookListAPI'
+
+    def ready(self):
+        # connect signal receivers of BookListAPI app.
+        from BookListAPI import signals  # noqa: F401
+
+        from BookList import search
+        search.register(self.get_model('Book'), fields=['title', 'author', 'category__name'])
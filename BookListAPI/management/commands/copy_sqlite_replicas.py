@@ -0,0 +1,31 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copies the default SQLite database to SQLite databases of replica aliases, to try replicas locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help='aliases of replicas, all SQLite databases other than default by default')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or [
+            alias for alias in connections if alias != DEFAULT_DB_ALIAS and connections[alias].vendor == 'sqlite'
+        ]
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('default database is not a SQLite database.')
+
+        primary.ensure_connection()
+        for alias in aliases:
+            if alias not in connections or connections[alias].vendor != 'sqlite' or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f'{alias} is not a SQLite database other than default.')
+            connections[alias].close()
+            # backup api copies a consistent snapshot of the primary, also while it is written.
+            with sqlite3.connect(connections[alias].settings_dict['NAME']) as replica:
+                primary.connection.backup(replica)
+            replica.close()
+            self.stdout.write(self.style.SUCCESS(f'default database is copied to {alias}.'))
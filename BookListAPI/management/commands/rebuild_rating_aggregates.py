@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from BookListAPI.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recomputes rating_count, rating_sum and avg_rating of books from their ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='number of books (by id range) which are updated by each query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Book.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+        updated = 0
+        for start in range(0, max_id, batch_size):
+            updated += Book.objects.filter(pk__gt=start, pk__lte=start + batch_size).rebuild_rating_aggregates()
+
+        self.stdout.write(self.style.SUCCESS(f'Rating aggregates of {updated} books are rebuilt.'))
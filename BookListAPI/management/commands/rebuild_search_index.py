@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from BookList import search
+
+
+class Command(BaseCommand):
+    help = "Recreates full-text search indexes of all registered models (books, menu items) and fills them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='alias of database to rebuild its indexes')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = search.get_search_backend(options['database'])
+        for index in search.get_indexes():
+            backend.rebuild(index, batch_size=options['batch_size'])
+            self.stdout.write(f'{index.model._meta.label} is indexed by {backend.__class__.__name__}.')
+
+        self.stdout.write(self.style.SUCCESS('Search indexes are rebuilt.'))
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Book = apps.get_model('BookListAPI', 'Book')
+    Rating = apps.get_model('BookListAPI', 'Rating')
+    ratings = Rating.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    Book.objects.using(schema_editor.connection.alias).update(
+        rating_count=Coalesce(Subquery(ratings.annotate(count=Count('pk')).values('count')), 0),
+        rating_sum=Coalesce(Subquery(ratings.annotate(sum=Sum('rating')).values('sum')), 0),
+        avg_rating=Subquery(ratings.annotate(avg=Avg('rating')).values('avg')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookListAPI', '0007_alter_rating_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='avg_rating',
+            field=models.FloatField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='book_ratings', to='BookListAPI.book'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_ratings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def create_book_search_index(apps, schema_editor):
+    # index of the historical Book model with the fields which are indexed as of this migration.
+    from BookList import search
+
+    index = search.SearchIndex(apps.get_model('BookListAPI', 'Book'), ['title', 'author', 'category__name'])
+    search.get_search_backend(schema_editor.connection.alias).rebuild(index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookListAPI', '0008_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_book_search_index, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Count, Sum, Avg, OuterRef, Subquery, FloatField
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth.models import User
 # Create your models here.
 
@@ -10,15 +12,65 @@ class Category(models.Model):
         return f' topic: {self.name}'
 
 
+class BookQuerySet(models.QuerySet):
+
+    def add_ratings(self, count: int, total: int) -> int:
+        """
+        updates rating aggregates of books incrementally in a single query.
+        :param count: number of added ratings, negative for removed ratings.
+        :param total: sum of added ratings, negative for removed ratings.
+        :return: number of updated books.
+        """
+        rating_count = F('rating_count') + count
+        rating_sum = F('rating_sum') + total
+        return self.update(rating_count=rating_count,
+                           rating_sum=rating_sum,
+                           avg_rating=Cast(rating_sum, FloatField()) / NullIf(rating_count, 0))
+
+    def rebuild_rating_aggregates(self) -> int:
+        """
+        recomputes rating aggregates of books from their ratings in a single query.
+        :return: number of updated books.
+        """
+        ratings = Rating.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        return self.update(
+            rating_count=Coalesce(Subquery(ratings.annotate(count=Count('pk')).values('count')), 0),
+            rating_sum=Coalesce(Subquery(ratings.annotate(sum=Sum('rating')).values('sum')), 0),
+            avg_rating=Subquery(ratings.annotate(avg=Avg('rating')).values('avg')),
+        )
+
+
 class Book(models.Model):
     title = models.CharField(max_length=100)
     author = models.CharField(max_length=100)
     category = models.ForeignKey(to=Category, on_delete=models.PROTECT, related_name='books')
     price = models.DecimalField(max_digits=10, decimal_places=2, default=20)
 
+    # rating aggregates which are maintained by signals of Rating model.
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    avg_rating = models.FloatField(null=True, db_index=True)
+
+    objects = BookQuerySet.as_manager()
+
+    # aggregates are only written by queries of BookQuerySet, which add to their current values.
+    rating_aggregate_fields = ('rating_count', 'rating_sum', 'avg_rating')
+
     def __str__(self):
         return self.title + " - " + self.author + " - " + self.category.name
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        # saving an existing book does not write back rating aggregates which were loaded before the ratings
+        # changed (e.g. updates of BookSerializer), unless they are passed in update_fields.
+        if update_fields is None and not force_insert and not self._state.adding:
+            deferred_fields = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.rating_aggregate_fields
+                and field.attname not in deferred_fields
+            ]
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
 
 class Rating(models.Model):
     rating = models.SmallIntegerField(null=False, )
@@ -31,3 +83,10 @@ class Rating(models.Model):
     class Meta:
         unique_together = ['user', 'book']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # values stored in database are kept to update rating aggregates of books on change.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
@@ -12,6 +12,8 @@ from rest_framework.validators import UniqueTogetherValidator
 
 from io import BytesIO
 
+from BookList.fastserializers import FastReadSerializer
+
 
 class CategorySerializer(serializers.ModelSerializer):
     books = serializers.StringRelatedField(many=True, read_only=True)
@@ -70,7 +72,7 @@ class BookSerializer(serializers.ModelSerializer):
 
     def get_ratings(self, book: Book):
 
-        # avg_rating should be annotated in queryset
+        # avg_rating is maintained by signals of Rating model.
         return book.avg_rating
 
     def validate(self, attrs):
@@ -80,6 +82,10 @@ class BookSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
 
+class FastBookSerializer(FastReadSerializer):
+    serializer_class = BookSerializer
+
+
 class BookCustomSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=100)
     author = serializers.CharField(max_length=100, read_only=True)
@@ -105,7 +111,7 @@ class RatingSerializer(serializers.ModelSerializer):
         validators = (
             UniqueTogetherValidator(
                 queryset=Rating.objects.all(),
-                fields=['user_id', 'book_id']
+                fields=['user', 'book']
             ),
         )
         extra_kwargs = {
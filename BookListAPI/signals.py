@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from BookListAPI.models import Book, Rating
+from BookListAPI.tasks import rebuild_rating_aggregates
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_aggregates_on_save(sender, instance: Rating, created: bool, **kwargs):
+    """ applies created or changed rating to rating aggregates of its book."""
+    loaded_values = getattr(instance, '_loaded_values', None)
+
+    if created:
+        Book.objects.filter(pk=instance.book_id).add_ratings(1, instance.rating)
+
+    elif loaded_values is None or 'rating' not in loaded_values or 'book_id' not in loaded_values:
+        # previous values of rating are unknown, aggregates of the book are recomputed by a background job.
+        rebuild_rating_aggregates.enqueue(book_ids=[instance.book_id], using=kwargs.get('using'))
+
+    elif loaded_values['book_id'] != instance.book_id:
+        Book.objects.filter(pk=loaded_values['book_id']).add_ratings(-1, -loaded_values['rating'])
+        Book.objects.filter(pk=instance.book_id).add_ratings(1, instance.rating)
+
+    elif loaded_values['rating'] != instance.rating:
+        Book.objects.filter(pk=instance.book_id).add_ratings(0, instance.rating - loaded_values['rating'])
+
+    instance._loaded_values = {'book_id': instance.book_id, 'rating': instance.rating}
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates_on_delete(sender, instance: Rating, **kwargs):
+    """ removes deleted rating from rating aggregates of its book."""
+    loaded_values = getattr(instance, '_loaded_values', {})
+    book_id = loaded_values.get('book_id', instance.book_id)
+    rating = loaded_values.get('rating', instance.rating)
+    Book.objects.filter(pk=book_id).add_ratings(-1, -rating)
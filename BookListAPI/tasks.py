@@ -0,0 +1,10 @@
+from typing import *
+
+from jobs.queue import task
+from BookListAPI.models import Book
+
+
+@task
+def rebuild_rating_aggregates(book_ids: List[int]):
+    """ recomputes rating aggregates of books whose changes of ratings could not be applied incrementally."""
+    Book.objects.filter(pk__in=book_ids).rebuild_rating_aggregates()
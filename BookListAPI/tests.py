@@ -1,8 +1,34 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.http import HttpRequest, HttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from BookList import metrics
+from BookList.authentication import RefreshToken, StatelessJWTAuthentication, blacklist_filter
+from BookList.bloom import BloomFilter
+from BookList.querybudget import QueryBudgetTestMixin
+from BookList.routers import get_sticky_primary_cache_key
+from BookListAPI.models import Book, Category, Rating
+from BookListAPI.serializers import BookSerializer, FastBookSerializer
+from BookListAPI.throttles import TenUserRateThrottle
+from jobs.models import Job
+from jobs.worker import Worker
 
 # Create your tests here.
 sample_users = {
@@ -61,4 +87,424 @@ class SecretTest(APITestCase):
 
     def test_ensure_json_is_default_content_type(self):
         response = self.client.get(self.login_url)
-        self.assertEqual(response.headers['Content-Type'], 'application/json')
\ No newline at end of file
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+
+
+class ExportBooksTest(APITestCase):
+
+    def setUp(self):
+        technology = Category.objects.create(name='technology')
+        music = Category.objects.create(name='music')
+        self.clean_code = Book.objects.create(title='Clean Code', author='Uncle Bob', category=technology)
+        self.classic_music = Book.objects.create(title='Classic Music', author='John J Martin', category=music)
+        user = User.objects.create_user(**sample_users['ali'])
+        Rating.objects.create(user=user, book=self.clean_code, rating=4)
+
+    def get_export(self, export_format: str, **query_params) -> str:
+        response = self.client.get(reverse_lazy('book-list-api:export-books', args=[export_format]), query_params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.get_export('csv', ordering='-title'))))
+        self.assertEqual(rows[0], ['user_name', 'title', 'author', 'full_author_name',
+                                   'category.id', 'category.name', 'price', 'ratings'])
+        self.assertEqual(rows[1], [str(self.clean_code.pk), 'Clean Code', 'Uncle Bob', 'mr or ms Uncle Bob',
+                                   str(self.clean_code.category_id), 'technology', '20.00', '4.0'])
+        self.assertEqual(len(rows), 3)
+
+    def test_ndjson_export_keeps_filters(self):
+        lines = self.get_export('ndjson', category='music').splitlines()
+        self.assertEqual(len(lines), 1)
+        book = json.loads(lines[0])
+        self.assertEqual(book['title'], 'Classic Music')
+        self.assertEqual(book['category'], {'id': self.classic_music.category_id, 'name': 'music'})
+        self.assertIsNone(book['ratings'])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse_lazy('book-list-api:export-books', args=['xlsx']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RatingAggregatesTest(QueryBudgetTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        # ratings are throttled.
+        cache.clear()
+        category = Category.objects.create(name='technology')
+        self.book = Book.objects.create(title='Clean Code', author='Uncle Bob', category=category)
+        self.other_book = Book.objects.create(title='Clean Architecture', author='Uncle Bob', category=category)
+        self.pooya = User.objects.create_user(**sample_users['pooya'])
+        self.ali = User.objects.create_user(**sample_users['ali'])
+
+    def assertAggregates(self, book: Book, rating_count: int, rating_sum: int, avg_rating):
+        book.refresh_from_db()
+        self.assertEqual((book.rating_count, book.rating_sum, book.avg_rating), (rating_count, rating_sum, avg_rating))
+
+    def test_aggregates_follow_ratings(self):
+        rating = Rating.objects.create(user=self.pooya, book=self.book, rating=4)
+        Rating.objects.create(user=self.ali, book=self.book, rating=1)
+        self.assertAggregates(self.book, 2, 5, 2.5)
+
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.rating = 5
+        rating.save()
+        self.assertAggregates(self.book, 2, 6, 3.0)
+
+        rating.book = self.other_book
+        rating.save()
+        self.assertAggregates(self.book, 1, 1, 1.0)
+        self.assertAggregates(self.other_book, 1, 5, 5.0)
+
+        Rating.objects.filter(book=self.book).delete()
+        self.assertAggregates(self.book, 0, 0, None)
+
+    def test_saving_books_does_not_overwrite_aggregates(self):
+        book = Book.objects.get(pk=self.book.pk)
+        # ratings are added after the book is loaded.
+        Rating.objects.create(user=self.pooya, book=self.book, rating=4)
+
+        book.title = 'Clean Code 2'
+        book.save()
+        self.assertAggregates(book, 1, 4, 4.0)
+        self.assertEqual(book.title, 'Clean Code 2')
+
+    def test_rating_view_updates_aggregates(self):
+        self.client.force_authenticate(self.pooya)
+        response = self.client.post(reverse_lazy('book-list-api:ratings'), {'book': self.book.pk, 'rating': 3})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertAggregates(self.book, 1, 3, 3.0)
+
+    def test_rating_list_does_not_query_users_and_books_per_rating(self):
+        for i in range(6):
+            user = User.objects.create_user(username=f'user {i}', password='pass')
+            Rating.objects.create(user=user, book=self.book if i % 2 else self.other_book, rating=i % 5)
+
+        # QueryBudgetMiddleware raises if the view goes over its budget or repeats a query per rating.
+        response = self.client.get(reverse_lazy('book-list-api:ratings'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_unknown_previous_ratings_are_rebuilt_by_job(self):
+        rating = Rating.objects.create(user=self.pooya, book=self.book, rating=4)
+        # previous values of rating are not loaded.
+        Rating(pk=rating.pk, user=self.pooya, book=self.book, rating=2).save()
+        self.assertEqual(Job.objects.get().kwargs, {'book_ids': [self.book.pk]})
+
+        Worker(processes=0).run(once=True)
+        self.assertAggregates(self.book, 1, 2, 2.0)
+
+    def test_rebuild_command(self):
+        Rating.objects.create(user=self.pooya, book=self.book, rating=4)
+        Book.objects.update(rating_count=0, rating_sum=0, avg_rating=None)
+
+        call_command('rebuild_rating_aggregates', batch_size=1, stdout=io.StringIO())
+        self.assertAggregates(self.book, 1, 4, 4.0)
+        self.assertAggregates(self.other_book, 0, 0, None)
+
+
+class FullTextSearchTest(APITestCase):
+
+    def setUp(self):
+        # list of books is throttled.
+        cache.clear()
+        self.technology = Category.objects.create(name='technology')
+        music = Category.objects.create(name='music')
+        self.clean_code = Book.objects.create(title='Clean Code', author='Uncle Bob', category=self.technology)
+        Book.objects.create(title='Classic Music', author='John J Martin', category=music)
+        Book.objects.create(title='The Pragmatic Programmer', author='Andy Hunt', category=self.technology)
+
+    def find_titles(self, **query_params):
+        response = self.client.get(reverse_lazy('book-list-api:book-list'), query_params,
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {book['title'] for book in response.json()['results']}
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.find_titles(find='cle'), {'Clean Code'})
+        self.assertEqual(self.find_titles(find='cla mus'), {'Classic Music'})
+        self.assertEqual(self.find_titles(find='"Bob'), {'Clean Code'})
+
+    def test_index_follows_changes(self):
+        self.clean_code.title = 'Refactoring'
+        self.clean_code.save()
+        self.assertEqual(self.find_titles(find='refact'), {'Refactoring'})
+        self.assertEqual(self.find_titles(find='clean'), set())
+
+        self.technology.name = 'software'
+        self.technology.save()
+        self.assertEqual(self.find_titles(find='softw'), {'Refactoring', 'The Pragmatic Programmer'})
+
+        self.clean_code.delete()
+        self.assertEqual(self.find_titles(find='softw'), {'The Pragmatic Programmer'})
+
+    def test_search_of_book_list_view(self):
+        response = self.client.get(reverse_lazy('book-list-api:list-books'), {'search': 'pragm', 'format': 'json'})
+        self.assertEqual([book['title'] for book in response.json()], ['The Pragmatic Programmer'])
+
+
+class BloomFilterTest(APITestCase):
+
+    def test_added_items_are_always_found(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        bloom_filter.update(f'added {i}' for i in range(1000))
+
+        self.assertTrue(all(f'added {i}' in bloom_filter for i in range(1000)))
+        false_positives = sum(f'other {i}' in bloom_filter for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertFalse(bloom_filter.is_full)
+        bloom_filter.add('one more')
+        self.assertTrue(bloom_filter.is_full)
+
+
+class StatelessJWTAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        blacklist_filter.clear()
+        self.manager_group = Group.objects.create(name='manager')
+        self.pooya = User.objects.create_user(**sample_users['pooya'])
+        self.pooya.groups.add(self.manager_group)
+        self.secret_url = reverse_lazy('book-list-api:secret')
+
+    def obtain_tokens(self) -> dict:
+        response = self.client.post(reverse_lazy('token_jwt_obtain'),
+                                    {'username': 'pooya', 'password': sample_users['pooya']['password']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def get_secret(self, access: str) -> HttpResponse:
+        return self.client.get(self.secret_url, headers={'Authorization': f'Bearer {access}'}, format='json')
+
+    def test_users_are_not_queried(self):
+        tokens = self.obtain_tokens()
+        self.get_secret(tokens['access'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_secret(tokens['access'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # only the group query of the view, users and blacklisted tokens are not queried.
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('token_blacklist', queries[0]['sql'])
+
+        user, _ = StatelessJWTAuthentication().authenticate(SimpleNamespace(META={
+            'HTTP_AUTHORIZATION': f'Bearer {tokens["access"]}'
+        }))
+        self.assertEqual((user.pk, user.username), (self.pooya.pk, 'pooya'))
+        self.assertEqual(user.get_deferred_fields(), {field.attname for field in User._meta.concrete_fields}
+                         - {'id', 'username', 'is_active'})
+
+    def test_access_tokens_of_blacklisted_refresh_tokens_are_rejected(self):
+        tokens = self.obtain_tokens()
+        self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse_lazy('token_jwt_blacklist'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_filter_is_refreshed_with_tokens_of_other_processes(self):
+        tokens = self.obtain_tokens()
+        self.get_secret(tokens['access'])
+        # blacklisted by another process, which does not add it to the filter of this process.
+        with mock.patch.object(blacklist_filter, 'add'):
+            self.client.post(reverse_lazy('token_jwt_blacklist'), {'refresh': tokens['refresh']})
+        self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_200_OK)
+
+        with self.settings(AUTH_JWT_BLACKLIST_REFRESH_INTERVAL=0):
+            self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @staticmethod
+    def get_jti(refresh: str) -> str:
+        return RefreshToken(refresh, verify=False)[jwt_settings.JTI_CLAIM]
+
+    def blacklist(self, refresh: str, **kwargs) -> BlacklistedToken:
+        token = OutstandingToken.objects.get(jti=self.get_jti(refresh))
+        # blacklisted by another process, which does not add it to the filter of this process.
+        with mock.patch.object(blacklist_filter, 'add'):
+            return BlacklistedToken.objects.create(token=token, **kwargs)
+
+    def test_filter_is_refreshed_with_tokens_which_are_committed_out_of_order(self):
+        tokens, other_tokens = self.obtain_tokens(), self.obtain_tokens()
+        self.get_secret(tokens['access'])
+        self.blacklist(other_tokens['refresh'], id=10)
+        with self.settings(AUTH_JWT_BLACKLIST_REFRESH_INTERVAL=0):
+            self.assertEqual(self.get_secret(other_tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # its transaction started before the last refresh and committed after it.
+        blacklisted = self.blacklist(tokens['refresh'], id=5)
+        BlacklistedToken.objects.filter(pk=blacklisted.pk).update(
+            blacklisted_at=blacklist_filter.refreshed_since - timedelta(seconds=1))
+        self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_200_OK)
+
+        with self.settings(AUTH_JWT_BLACKLIST_REFRESH_INTERVAL=0), \
+                mock.patch.object(blacklist_filter.bloom_filter, 'add', wraps=blacklist_filter.bloom_filter.add) as add:
+            self.assertEqual(self.get_secret(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+        # the token which is read again is not added twice.
+        add.assert_called_once_with(self.get_jti(tokens['refresh']))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(**sample_users['pooya'])
+        # replica is a separate database in tests, it has a different book with the same id.
+        self.book = Book.objects.create(title='primary book', author='pooya',
+                                        category=Category.objects.create(name='primary'))
+        Book.objects.using('replica').create(pk=self.book.pk, title='replica book', author='pooya',
+                                             category=Category.objects.using('replica').create(name='replica'))
+
+    def get_rating_users(self, user=None) -> list:
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse_lazy('book-list-api:ratings'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [rating['username'] for rating in response.json()['results']]
+
+    def test_reads_of_replica_actions_go_to_replicas(self):
+        response = self.client.get(reverse_lazy('book-list-api:book-list'), {'format': 'json'})
+        self.assertEqual([book['title'] for book in response.json()['results']], ['replica book'])
+        self.client.force_authenticate(self.user)
+        response = self.client.get(f'/api/v1/books-set/{self.book.pk}', {'format': 'json'})
+        self.assertEqual(response.json()['title'], 'replica book')
+
+        # writes and reads of other actions go to the primary.
+        response = self.client.post(reverse_lazy('book-list-api:ratings'), {'book': self.book.pk, 'rating': 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['book_title'], 'primary book')
+        self.assertEqual(Rating.objects.using('replica').count(), 0)
+
+    def test_reads_stick_to_primary_after_writes(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse_lazy('book-list-api:ratings'), {'book': self.book.pk, 'rating': 4})
+
+        self.assertEqual(self.get_rating_users(self.user), ['pooya'])
+        self.assertEqual(self.get_rating_users(), [])
+
+        # reads go to replicas again when the window is over.
+        cache.delete(get_sticky_primary_cache_key(self.user))
+        self.assertEqual(self.get_rating_users(self.user), [])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'primary book')
+        response = self.client.get(reverse_lazy('book-list-api:book-list'), {'format': 'json'})
+        self.assertEqual([book['title'] for book in response.json()['results']], ['primary book'])
+
+
+class MetricsMiddlewareTest(APITestCase):
+
+    def setUp(self):
+        # list of books is throttled.
+        cache.clear()
+        metrics.registry.clear()
+        category = Category.objects.create(name='technology')
+        Book.objects.create(title='Clean Code', author='Uncle Bob', category=category)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse_lazy('book-list-api:book-list'), HTTP_ACCEPT='application/json')
+
+        phases = dict(phase.split(';', 1) for phase in response['Server-Timing'].split(', '))
+        self.assertEqual(set(phases), {'total', 'db', 'serializer', 'render'})
+        # count and page of books.
+        self.assertIn('desc="2 queries"', phases['db'])
+        self.assertGreater(float(phases['serializer'].removeprefix('dur=')), 0)
+        self.assertGreater(float(phases['render'].removeprefix('dur=')), 0)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint(self):
+        self.client.get(reverse_lazy('book-list-api:book-list'), HTTP_ACCEPT='application/json')
+        self.client.get(reverse_lazy('book-list-api:book-list'), HTTP_ACCEPT='application/json')
+
+        response = self.client.get(reverse_lazy('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content.decode()
+        self.assertIn('http_requests_total{view="book-list-api:book-list",method="GET",status="200"} 2', content)
+        self.assertIn('http_request_duration_seconds_count{view="book-list-api:book-list"} 2', content)
+        self.assertIn('http_request_queries_bucket{view="book-list-api:book-list",le="2"} 2', content)
+        self.assertNotIn('view="metrics"', content)
+
+        response = self.client.get(reverse_lazy('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_metrics_endpoint_is_not_served_to_internal_ips(self):
+        response = self.client.get(reverse_lazy('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SlidingWindowThrottleTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.request = SimpleNamespace(user=User.objects.create_user(**sample_users['pooya']))
+
+    def allow_request(self, now: float) -> TenUserRateThrottle:
+        throttle = TenUserRateThrottle()
+        throttle.timer = lambda: now
+        throttle.allowed = throttle.allow_request(self.request, None)
+        return throttle
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        # 10 requests per minute, windows start at multiples of 60 seconds.
+        self.assertTrue(all(self.allow_request(600 + i).allowed for i in range(10)))
+        self.assertFalse(self.allow_request(610).allowed)
+        self.assertEqual(cache.get(f'throttle_ten_{self.request.user.pk}:10'), 10)
+
+        # half of the previous window is in the sliding window at 690, so 5 of its requests are counted.
+        self.assertTrue(all(self.allow_request(690).allowed for _ in range(5)))
+        throttle = self.allow_request(690)
+        self.assertFalse(throttle.allowed)
+        self.assertEqual(throttle.wait(), 6)
+
+        self.assertTrue(self.allow_request(696).allowed)
+        self.assertTrue(self.allow_request(720).allowed)
+
+    def test_rejected_request_of_expired_counter(self):
+        self.assertTrue(all(self.allow_request(600 + i).allowed for i in range(10)))
+
+        increment = TenUserRateThrottle.increment
+
+        def increment_and_expire(throttle, cache, key):
+            count = increment(throttle, cache, key)
+            cache.delete(key)
+            return count
+
+        with mock.patch.object(TenUserRateThrottle, 'increment', increment_and_expire):
+            self.assertFalse(self.allow_request(610).allowed)
+
+    def test_counters_keep_their_timeout(self):
+        # the file based cache of tests has no atomic incr(), which would set counters with its default timeout.
+        throttle_cache = TenUserRateThrottle().get_cache()
+        self.assertFalse(TenUserRateThrottle.has_atomic_incr(throttle_cache))
+        cache_class = type(throttle_cache)
+        with mock.patch.object(cache_class, 'set', autospec=True, side_effect=cache_class.set) as cache_set:
+            self.assertTrue(all(self.allow_request(600).allowed for _ in range(10)))
+            self.assertFalse(self.allow_request(600).allowed)
+        self.assertEqual({call.args[3] for call in cache_set.call_args_list}, {120})
+        self.assertEqual(cache.get(f'throttle_ten_{self.request.user.pk}:10'), 10)
+
+    def test_throttled_response(self):
+        url = reverse_lazy('book-list-api:throttle-check')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertLessEqual(int(response['Retry-After']), 60)
+
+
+class FastBookSerializerTest(APITestCase):
+
+    def test_books_are_serialized_the_same(self):
+        category = Category.objects.create(name='technology')
+        book = Book.objects.create(title='Clean Code', author='Uncle Bob', category=category, price='25.50')
+        Book.objects.create(title='Refactoring', author='Martin Fowler', category=category)
+        Rating.objects.create(user=User.objects.create_user(**sample_users['pooya']), book=book, rating=4)
+
+        books = list(Book.objects.select_related('category').order_by('pk'))
+        self.assertEqual(JSONRenderer().render(FastBookSerializer(books, many=True).data),
+                         JSONRenderer().render(BookSerializer(books, many=True).data))
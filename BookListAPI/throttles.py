@@ -1,4 +1,112 @@
-from rest_framework.throttling import UserRateThrottle
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from rest_framework import throttling
+
+
+class SlidingWindowRateThrottle:
+    """
+    Rate throttle with a sliding window counter, mixed into throttles of rest_framework
+    which provide scope, rate and cache key of requests.
+
+    requests of each key are counted in fixed windows of `duration` seconds, and the number of requests
+    in the last `duration` seconds is estimated by weighting the count of previous window by the part of it
+    which is still in the sliding window. so each key costs two integers in the cache, instead of the growing
+    list of timestamps of SimpleRateThrottle.
+
+    counters are kept in THROTTLE_CACHE_ALIAS cache, which should be shared by all processes of the server
+    (e.g. Redis or Memcached) and support atomic incr(), the local memory cache limits each process separately.
+    incr() of other caches (e.g. file based and database caches) is a get() and set() with their default timeout,
+    so counters are set again with their timeout there, and concurrent requests may be counted once.
+    """
+
+    def get_cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def allow_request(self, request, view) -> bool:
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cache = self.get_cache()
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        current_key, previous_key = f'{self.key}:{int(window)}', f'{self.key}:{int(window) - 1}'
+
+        self.previous_count = cache.get(previous_key, 0)
+        self.current_count = self.increment(cache, current_key)
+        if self.get_estimated_count() > self.num_requests:
+            # rejected requests are not counted.
+            self.decrement(cache, current_key)
+            self.current_count -= 1
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def get_timeout(self) -> int:
+        # counters of previous window are needed for a whole window after it.
+        return int(self.duration * 2)
+
+    @staticmethod
+    def has_atomic_incr(cache) -> bool:
+        return type(cache).incr is not BaseCache.incr
+
+    def increment(self, cache, key: str) -> int:
+        """ :return: count of key after adding this request to it."""
+        timeout = self.get_timeout()
+        if cache.add(key, 1, timeout):
+            return 1
+        if not self.has_atomic_incr(cache):
+            count = cache.get(key, 0) + 1
+            cache.set(key, count, timeout)
+            return count
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # counter is expired after add().
+            cache.set(key, 1, timeout)
+            return 1
+
+    def decrement(self, cache, key: str):
+        if not self.has_atomic_incr(cache):
+            count = cache.get(key)
+            if count:
+                cache.set(key, count - 1, self.get_timeout())
+            return
+        try:
+            cache.decr(key)
+        except ValueError:
+            # counter is expired after increment(), there is nothing to take this request out of.
+            pass
+
+    def get_estimated_count(self, elapsed: float = None) -> float:
+        """ :return: number of requests in the sliding window which ends `elapsed` seconds after start of window."""
+        elapsed = self.elapsed if elapsed is None else elapsed
+        return self.previous_count * (1 - elapsed / self.duration) + self.current_count
+
+    def throttle_success(self) -> bool:
+        return True
+
+    def wait(self) -> float:
+        """ :return: seconds until the next request is allowed."""
+        remaining = self.duration - self.elapsed
+        if self.current_count + 1 > self.num_requests or not self.previous_count:
+            # the next request is allowed when current window becomes the previous one.
+            return remaining
+
+        # requests of previous window leave the sliding window with a constant rate.
+        excess = self.get_estimated_count() + 1 - self.num_requests
+        return min(remaining, excess * self.duration / self.previous_count)
+
+
+class UserRateThrottle(SlidingWindowRateThrottle, throttling.UserRateThrottle):
+    pass
+
+
+class AnonRateThrottle(SlidingWindowRateThrottle, throttling.AnonRateThrottle):
+    pass
 
 
 class TenUserRateThrottle(UserRateThrottle):
@@ -9,6 +9,7 @@ urlpatterns = [
     path('book', BookCreatView.as_view(), name='book-create'),
     path('books', BookListView.list_books, name='list-books'),
     path('books/<int:pk>', book_detail, name='book-detail'),
+    path('books/export/<str:export_format>', BookExportView.as_view(), name='export-books'),
     # path('categories', CategoryView.list_categories, name='list_categories'),
     # path('categories/create', CategoryView.category_create, name='category_create'),
     # path('categories/<int:pk>', CategoryView.category_details, name='categories-retrieve'),
@@ -1,4 +1,4 @@
-from django.db.models import QuerySet, Avg
+from django.db.models import QuerySet
 from django.shortcuts import render
 from rest_framework.response import Response
 from rest_framework.request import HttpRequest
@@ -12,16 +12,22 @@ from BookListAPI import serializers
 from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer, TemplateHTMLRenderer
 from rest_framework_csv.renderers import CSVRenderer
 from rest_framework.request import Request
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 
 from django.core.paginator import Paginator, EmptyPage, Page
 from django.contrib.auth.models import Group, User
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, HttpRequest
+from django.http import HttpResponse, HttpRequest, StreamingHttpResponse, Http404
+
+import csv
+import json
 
 from .serializers import BookSerializer
 from .models import *
-from .throttles import TenUserRateThrottle
+from .throttles import TenUserRateThrottle, UserRateThrottle, AnonRateThrottle
+from .negotiation import IgnoreClientContentNegotiation
+from BookList import search as full_text_search
+from BookList.fastserializers import FastReadSerializerMixin
+from BookList.routers import ReplicaReadMixin
 # Create your views here.
 
 
@@ -61,7 +67,8 @@ class BookListView:
 
     @staticmethod
     def get_queryset(request: Request) -> QuerySet:
-        items = Book.objects.select_related('category').all().annotate(avg_rating=Avg('book_ratings__rating')).order_by('-avg_rating')
+        # avg_rating is maintained on Book by signals of Rating and sorted using its index.
+        items = Book.objects.select_related('category').all().order_by('-avg_rating')
 
         query_params = request.query_params.dict()
 
@@ -69,7 +76,8 @@ class BookListView:
             items = items.filter(category__name=target_category)
 
         if search := query_params.get('search'):
-            items = items.filter(title__icontains=search)
+            # full-text search orders books by rank, unless ordering is provided.
+            items = full_text_search.search(items, search)
 
         if ordering_fields := query_params.get('ordering'):
             ordering_fields = ordering_fields.split(',')
@@ -92,6 +100,64 @@ class BookListView:
             return []
 
 
+class _Echo:
+    """ file-like object which returns what is written to it, used to stream rows of csv.writer ."""
+
+    def write(self, value):
+        return value
+
+
+class BookExportView(APIView):
+    """
+        Streams the whole catalog of books as csv or ndjson (one json object per line)
+        with constant memory, instead of rendering paginated lists of BookListView.
+        filters of BookListView (category, search and ordering) are applied to exported books.
+    """
+    content_negotiation_class = IgnoreClientContentNegotiation
+    chunk_size = 2000
+    csv_header = ('user_name', 'title', 'author', 'full_author_name', 'category.id', 'category.name', 'price',
+                  'ratings')
+    content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request: Request, export_format: str):
+        if export_format not in self.content_types:
+            raise Http404(f'export format should be one of {", ".join(self.content_types)}')
+
+        books = BookListView.get_queryset(request)
+        rows = self.get_csv_rows(books) if export_format == 'csv' else self.get_ndjson_lines(books)
+        response = StreamingHttpResponse(rows, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        return response
+
+    def get_books(self, queryset: QuerySet):
+        """ :return: generator of book values which are fetched from database in chunks."""
+        values = queryset.values_list('id', 'title', 'author', 'category_id', 'category__name', 'price', 'avg_rating')
+        return values.iterator(chunk_size=self.chunk_size)
+
+    def get_csv_rows(self, queryset: QuerySet):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.csv_header)
+        for book_id, title, author, category_id, category_name, price, avg_rating in self.get_books(queryset):
+            yield writer.writerow((book_id, title, author, f'mr or ms {author}',
+                                   category_id, category_name, price, avg_rating))
+
+    def get_ndjson_lines(self, queryset: QuerySet):
+        for book_id, title, author, category_id, category_name, price, avg_rating in self.get_books(queryset):
+            book = {
+                'user_name': book_id,
+                'title': title,
+                'author': author,
+                'full_author_name': f'mr or ms {author}',
+                'category': {'id': category_id, 'name': category_name},
+                'price': str(price),
+                'ratings': avg_rating,
+            }
+            yield json.dumps(book) + '\n'
+
+
 @api_view(['GET', 'PATCH'])
 @permission_classes((IsAuthenticatedOrReadOnly,))
 def book_detail(request, pk):
@@ -148,11 +214,14 @@ class CategoryView(APIView):
         return Response(new_category.errors, status.HTTP_402_PAYMENT_REQUIRED)
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.select_related('category').all().annotate(avg_rating=Avg('book_ratings__rating'))
+class BookViewSet(ReplicaReadMixin, FastReadSerializerMixin, ModelViewSet):
+    queryset = Book.objects.select_related('category').all()
     renderer_classes = [BrowsableAPIRenderer, JSONRenderer, TemplateHTMLRenderer]
     serializer_class = BookSerializer
+    fast_read_serializer_class = serializers.FastBookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    query_budget = {'list': 3, 'retrieve': 2}
+    replica_actions = ('list', 'retrieve')
 
     def get_template_names(self):
         if self.action == 'list':
@@ -168,9 +237,9 @@ class BookViewSet(ModelViewSet):
 
         return response
 
-    filter_backends = (filters.SearchFilter, filters.OrderingFilter)
+    filter_backends = (full_text_search.FullTextSearchFilter, filters.OrderingFilter)
     ordering_fields = ['title', 'author', 'category__name']
-    search_fields = ['title', 'author', 'category__name']  # will be searched in all fields ignore case
+    search_fields = ['title', 'author', 'category__name']  # full-text index of Book contains these fields
     search_query_param = 'find'
 
     # permission_classes = (IsAuthenticatedOrReadOnly, )
@@ -235,13 +304,15 @@ def add_group(request: Request):
         return Response({'message': 'username and group_name is required'}, status.HTTP_400_BAD_REQUEST)
 
 
-class RatingView(ListCreateAPIView):
+class RatingView(ReplicaReadMixin, ListCreateAPIView):
     """
 
     """
 
-    queryset = Rating.objects.all()
+    queryset = Rating.objects.select_related('user', 'book').all()
     serializer_class = serializers.RatingSerializer
+    query_budget = {'get': 3, 'post': 5}
+    replica_actions = ('get', )
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+# Register your models here.
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key', )
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+
+    def ready(self):
+        # register tasks which are declared in `tasks` modules of installed apps,
+        # so workers can find the task of each job by its name.
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
@@ -0,0 +1,72 @@
+"""
+Email backend which sends emails from workers instead of requests, e.g. password reset emails of djoser.
+
+messages are queued as jobs of jobs.tasks.send_email and sent by the JOBS_EMAIL_BACKEND backend:
+
+    EMAIL_BACKEND = 'jobs.mail.EmailBackend'
+    JOBS_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+subject, body, addresses, headers, alternatives (html parts) and file attachments are kept, messages with
+attachments of MIME objects can not be stored as json and are sent by JOBS_EMAIL_BACKEND right away.
+tasks which send emails themselves should use get_worker_connection(), so their emails are not queued again.
+"""
+import base64
+from email.mime.base import MIMEBase
+from typing import *
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+def get_worker_connection(**kwargs) -> BaseEmailBackend:
+    """ :return: connection of JOBS_EMAIL_BACKEND, which sends emails right away."""
+    return get_connection(settings.JOBS_EMAIL_BACKEND, **kwargs)
+
+
+def serialize_message(message: EmailMessage) -> dict:
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'attachments': [
+            [filename, base64.b64encode(content.encode() if isinstance(content, str) else content).decode(), mimetype]
+            for filename, content, mimetype in message.attachments
+        ],
+        'content_subtype': message.content_subtype,
+    }
+
+
+def deserialize_message(data: dict) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'], to=data['to'],
+        cc=data['cc'], bcc=data['bcc'], reply_to=data['reply_to'], headers=data['headers'],
+        alternatives=[tuple(alternative) for alternative in data['alternatives']],
+    )
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    message.content_subtype = data['content_subtype']
+    return message
+
+
+class EmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages: Sequence[EmailMessage]) -> int:
+        from jobs.tasks import send_email
+
+        unserializable = []
+        for message in email_messages:
+            if any(isinstance(attachment, MIMEBase) for attachment in message.attachments):
+                unserializable.append(message)
+            else:
+                send_email.enqueue(message=serialize_message(message))
+
+        if unserializable:
+            get_worker_connection(fail_silently=self.fail_silently).send_messages(unserializable)
+        return len(email_messages)
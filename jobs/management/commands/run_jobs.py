@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs (e.g. emails and order confirmations) in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='number of processes which run jobs, 0 runs them in this process')
+        parser.add_argument('--lease', type=int, default=None,
+                            help='seconds before a running job is claimed again, JOBS_LEASE by default')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='seconds between looking for due jobs when there are none')
+        parser.add_argument('--once', action='store_true', help='exits when there are no due jobs')
+
+    def handle(self, *args, **options):
+        worker = Worker(processes=options['processes'], lease=options['lease'],
+                        poll_interval=options['poll_interval'])
+        try:
+            counts = worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            return
+
+        summary = ', '.join(f'{count} {job_status}' for job_status, count in sorted(counts.items())) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(f'Jobs are run: {summary}.'))
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from uuid import uuid4
+from typing import *
+
+from django.db import models
+from django.utils import timezone
+
+# Create your models here.
+
+
+class JobQuerySet(models.QuerySet):
+
+    def due(self) -> 'JobQuerySet':
+        """ :return: pending jobs whose run_at is passed and running jobs whose lease is expired."""
+        now = timezone.now()
+        return self.filter(models.Q(status=Job.PENDING, run_at__lte=now)
+                           | models.Q(status=Job.RUNNING, locked_until__lt=now))
+
+    def claim(self, limit: int, lease: int) -> List['Job']:
+        """
+        marks up to limit due jobs as running for lease seconds with a new claim token, in a single update.
+        jobs are claimed by one worker only, as the update checks again that they are due.
+        :return: claimed jobs.
+        """
+        claim_token = uuid4().hex
+        due_ids = self.due().order_by('run_at').values('pk')[:limit]
+        claimed = self.due().filter(pk__in=models.Subquery(due_ids)).update(
+            status=Job.RUNNING,
+            claim_token=claim_token,
+            locked_until=timezone.now() + timedelta(seconds=lease),
+            attempts=models.F('attempts') + 1,
+        )
+        if not claimed:
+            return []
+        return list(self.filter(claim_token=claim_token).order_by('run_at'))
+
+
+class Job(models.Model):
+    """
+    a call of a registered task (jobs.queue.Task) which is run by `run_jobs` workers.
+    a job is retried with exponential backoff until it succeeds or fails max_attempts times.
+    """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'pending'), (RUNNING, 'running'), (DONE, 'done'), (FAILED, 'failed')]
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    # jobs with the same key are enqueued once, e.g. one confirmation per order.
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_at = models.DateTimeField(default=timezone.now)
+    # token of the claim of running job and the end of its lease, the job is claimed again after the lease.
+    claim_token = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['claim_token'], name='job_claim_token_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,89 @@
+"""
+Deferring work of requests to background workers with a job table in the database.
+
+functions are registered as tasks with the `task` decorator in `tasks` modules of apps, and requests
+enqueue calls of them instead of running them, so the response does not wait for the work:
+
+    @task(max_attempts=3)
+    def send_order_confirmation(order_id: int):
+        ...
+
+    send_order_confirmation.enqueue(order_id=order.pk, idempotency_key=f'order-confirmation:{order.pk}')
+
+enqueue() inserts a Job row with a single query in the transaction of the caller, so the job is only
+visible to workers (`python manage.py run_jobs`) if the transaction commits. keyword arguments are stored
+as json. a job whose idempotency key is already used is not enqueued again, and tasks are run in a
+transaction with marking their job as done, so they should only repeat work which is outside the database
+(e.g. emails) when a worker dies before its commit.
+
+idempotency keys of jobs of coalesced tasks (`@task(coalesce=True)`) are released when a worker starts running
+them, so calls which are enqueued with the same key until then are run once, and later calls run again.
+"""
+from datetime import datetime, timedelta
+from typing import *
+
+from django.conf import settings
+from django.utils import timezone
+
+from jobs.models import Job
+
+TASKS: Dict[str, 'Task'] = {}
+
+
+class Task:
+    """ a function which can be run by workers, calling it runs the function in the current process."""
+
+    def __init__(self, func: Callable, name: str, max_attempts: int, retry_delay: float, coalesce: bool = False):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.coalesce = coalesce
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def get_retry_delay(self, attempts: int) -> timedelta:
+        """ :return: delay of the next attempt, which is doubled after each failed attempt."""
+        return timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+
+    def enqueue(self, *, idempotency_key: Optional[str] = None, run_at: Optional[datetime] = None,
+                using: Optional[str] = None, **kwargs) -> Job:
+        """
+        :return: job of a call of the task with kwargs, which is created unless a job with idempotency_key exists.
+                pk of the job is not set if the database can not return it from an insert which ignores conflicts.
+        """
+        job = Job(name=self.name, kwargs=kwargs, idempotency_key=idempotency_key,
+                  max_attempts=self.max_attempts, run_at=run_at or timezone.now())
+        Job.objects.using(using).bulk_create([job], ignore_conflicts=idempotency_key is not None)
+        return job
+
+
+def task(func: Optional[Callable] = None, *, name: Optional[str] = None, max_attempts: Optional[int] = None,
+         retry_delay: Optional[float] = None, coalesce: bool = False):
+    """
+    registers func as a task with name, which is `<module>.<function name>` by default.
+    :param max_attempts: number of times a job of the task is run before it is failed, JOBS_MAX_ATTEMPTS by default.
+    :param retry_delay: seconds between first and second attempts, JOBS_RETRY_DELAY by default.
+    :param coalesce: if True, idempotency keys of jobs are released when they start running.
+    """
+    def register(func: Callable) -> Task:
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        if task_name in TASKS and TASKS[task_name].func is not func:
+            raise ValueError(f'task {task_name!r} is already registered.')
+
+        TASKS[task_name] = Task(func, task_name,
+                                max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+                                retry_delay=settings.JOBS_RETRY_DELAY if retry_delay is None else retry_delay,
+                                coalesce=coalesce)
+        return TASKS[task_name]
+
+    return register if func is None else register(func)
+
+
+def get_task(name: str) -> Task:
+    """ :raises KeyError: if no task is registered with name."""
+    return TASKS[name]
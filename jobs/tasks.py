@@ -0,0 +1,8 @@
+from jobs.mail import deserialize_message, get_worker_connection
+from jobs.queue import task
+
+
+@task
+def send_email(message: dict):
+    """ sends a message which is queued by jobs.mail.EmailBackend."""
+    get_worker_connection().send_messages([deserialize_message(message)])
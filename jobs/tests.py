@@ -0,0 +1,133 @@
+import io
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import task
+from jobs.worker import Worker, run_job
+
+# Create your tests here.
+calls = []
+
+
+@task(max_attempts=2, retry_delay=0)
+def record_call(value: int, fail: bool = False):
+    calls.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+@task(coalesce=True)
+def record_coalesced_call(value: int):
+    calls.append(value)
+    # a call which is enqueued while the job runs.
+    record_coalesced_call.enqueue(value=value + 1, idempotency_key='coalesced')
+
+
+@task()
+def record_call_after_lease_expired(value: int):
+    record_call.enqueue(value=value)
+    # another worker claims the job while it runs.
+    Job.objects.filter(name=record_call_after_lease_expired.name).update(
+        locked_until=timezone.now() - timedelta(seconds=1))
+    Job.objects.claim(limit=1, lease=60)
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_are_run_by_worker(self):
+        record_call.enqueue(value=1)
+        record_call.enqueue(value=2, run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(calls, [])
+
+        counts = Worker(processes=0).run(once=True)
+        self.assertEqual(counts, {Job.DONE: 1})
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(kwargs__value=1).status, Job.DONE)
+        self.assertEqual(Job.objects.get(kwargs__value=2).status, Job.PENDING)
+
+    def test_idempotency_key(self):
+        with self.assertNumQueries(1):
+            record_call.enqueue(value=1, idempotency_key='call-1')
+        record_call.enqueue(value=1, idempotency_key='call-1')
+        record_call.enqueue(value=2, idempotency_key='call-2')
+
+        self.assertEqual(Job.objects.count(), 2)
+        call_command('run_jobs', processes=0, once=True, stdout=io.StringIO())
+        self.assertEqual(sorted(calls), [1, 2])
+
+    def test_keys_of_coalesced_tasks_are_released_when_they_run(self):
+        record_coalesced_call.enqueue(value=1, idempotency_key='coalesced')
+        record_coalesced_call.enqueue(value=10, idempotency_key='coalesced')
+        self.assertEqual(Job.objects.count(), 1)
+
+        job, = Job.objects.claim(limit=1, lease=60)
+        self.assertEqual(run_job(job.pk, job.claim_token), Job.DONE)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(pk=job.pk).idempotency_key, None)
+        self.assertEqual(Job.objects.get(idempotency_key='coalesced').kwargs, {'value': 2})
+
+    def test_failed_jobs_are_retried(self):
+        record_call.enqueue(value=1, fail=True)
+
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            counts = Worker(processes=0).run(once=True)
+        self.assertEqual(counts, {Job.PENDING: 1, Job.FAILED: 1})
+        self.assertEqual(calls, [1, 1])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('ValueError: 1', job.last_error)
+        self.assertEqual(record_call.get_retry_delay(3), timedelta(0))
+
+    def test_expired_leases_are_claimed_again(self):
+        record_call.enqueue(value=1)
+        first_claim, = Job.objects.claim(limit=10, lease=60)
+        self.assertEqual(Job.objects.claim(limit=10, lease=60), [])
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        second_claim, = Job.objects.claim(limit=10, lease=60)
+        self.assertNotEqual(first_claim.claim_token, second_claim.claim_token)
+
+        # the worker which lost its claim does not run the job.
+        self.assertEqual(run_job(first_claim.pk, first_claim.claim_token), Job.RUNNING)
+        self.assertEqual(run_job(second_claim.pk, second_claim.claim_token), Job.DONE)
+        self.assertEqual(calls, [1])
+
+    def test_writes_of_taken_over_claims_are_rolled_back(self):
+        record_call_after_lease_expired.enqueue(value=1)
+        job, = Job.objects.claim(limit=1, lease=60)
+
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            self.assertEqual(run_job(job.pk, job.claim_token), Job.RUNNING)
+        self.assertFalse(Job.objects.filter(name=record_call.name).exists())
+        # the claim of the other worker is made in the same connection here, so it is rolled back as well.
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+    def test_unknown_tasks_fail(self):
+        Job.objects.create(name='jobs.tests.missing', max_attempts=3)
+        self.assertEqual(Worker(processes=0).run(once=True), {Job.FAILED: 1})
+
+    @override_settings(EMAIL_BACKEND='jobs.mail.EmailBackend',
+                       JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_emails_are_sent_by_workers(self):
+        message = EmailMultiAlternatives('subject', 'body', 'from@example.com', ['to@example.com'],
+                                         headers={'X-Tag': 'reset'})
+        message.attach_alternative('<p>body</p>', 'text/html')
+        message.attach('note.txt', 'note', 'text/plain')
+        message.send()
+        self.assertEqual(mail.outbox, [])
+
+        Worker(processes=0).run(once=True)
+        sent, = mail.outbox
+        self.assertEqual((sent.subject, sent.body, sent.to), ('subject', 'body', ['to@example.com']))
+        self.assertEqual(sent.extra_headers, {'X-Tag': 'reset'})
+        self.assertEqual(sent.alternatives, [('<p>body</p>', 'text/html')])
+        self.assertEqual(sent.attachments, [('note.txt', 'note', 'text/plain')])
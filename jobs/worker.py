@@ -0,0 +1,141 @@
+"""
+Running jobs of the job table (jobs.queue) in a pool of processes.
+
+the worker process claims due jobs with a lease (JobQuerySet.claim()) as long as there are idle processes
+in the pool and passes their ids to the processes, which run the tasks in their own database connections.
+jobs of workers which die are claimed again by other workers when their lease expires. writes of a task
+whose claim has been taken over while it runs are rolled back, so that they are made by the new claim only.
+"""
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import *
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import get_task
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job_id: int, claim_token: str) -> str:
+    """
+    runs the task of a claimed job, in a transaction with marking the job as done.
+    failed jobs are scheduled for another attempt, or marked as failed after their last attempt.
+    :return: status of the job.
+    """
+    claim = Job.objects.filter(pk=job_id, claim_token=claim_token, status=Job.RUNNING)
+    job = claim.first()
+    if job is None:
+        # the lease is expired and the job is claimed by another worker.
+        return Job.RUNNING
+
+    try:
+        task = get_task(job.name)
+    except KeyError:
+        claim.update(status=Job.FAILED, last_error=f'task {job.name!r} is not registered.',
+                     finished_at=timezone.now())
+        return Job.FAILED
+
+    if job.attempts > job.max_attempts:
+        # the job is claimed again after workers died running it.
+        claim.update(status=Job.FAILED, last_error=job.last_error or 'lease of the last attempt expired.',
+                     finished_at=timezone.now())
+        return Job.FAILED
+
+    if task.coalesce and job.idempotency_key is not None:
+        # calls which are enqueued from now on may miss changes which are read by this run, so they get a new job.
+        claim.update(idempotency_key=None)
+
+    try:
+        with transaction.atomic():
+            task(**job.kwargs)
+            if not claim.update(status=Job.DONE, finished_at=timezone.now()):
+                # the lease expired while the task ran and the job is claimed by another worker.
+                transaction.set_rollback(True)
+                logger.warning('claim of job %s of task %s was taken over while it ran.', job.pk, job.name)
+                return Job.RUNNING
+    except Exception:
+        logger.exception('job %s of task %s failed in attempt %s.', job.pk, job.name, job.attempts)
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            claim.update(status=Job.PENDING, last_error=error,
+                         run_at=timezone.now() + task.get_retry_delay(job.attempts))
+            return Job.PENDING
+        claim.update(status=Job.FAILED, last_error=error, finished_at=timezone.now())
+        return Job.FAILED
+    return Job.DONE
+
+
+def run_job_in_process(job_id: int, claim_token: str) -> str:
+    try:
+        return run_job(job_id, claim_token)
+    finally:
+        connections.close_all()
+
+
+class Worker:
+    """
+    runs due jobs with `processes` processes, or in the current process if it is 0.
+    :param lease: seconds that a claimed job is reserved for this worker.
+    :param poll_interval: seconds between looking for due jobs when there are none.
+    """
+
+    def __init__(self, processes: int = 1, lease: Optional[int] = None, poll_interval: float = 1.0):
+        self.processes = processes
+        self.lease = settings.JOBS_LEASE if lease is None else lease
+        self.poll_interval = poll_interval
+
+    def run(self, once: bool = False) -> Dict[str, int]:
+        """
+        runs jobs until it is interrupted, or until there are no due jobs if once is True.
+        :return: number of jobs by their status after running them.
+        """
+        if self.processes == 0:
+            return self.run_in_process(once)
+
+        counts = {}
+        # forked processes would share the database connections of the worker, spawned processes set up django
+        # before they import this module (and models) to run jobs.
+        context = multiprocessing.get_context('spawn')
+        futures: Set[Future] = set()
+        with ProcessPoolExecutor(self.processes, mp_context=context, initializer=django.setup) as executor:
+            while True:
+                idle = self.processes - len(futures)
+                jobs = Job.objects.claim(idle, self.lease) if idle else []
+                futures.update(executor.submit(run_job_in_process, job.pk, job.claim_token) for job in jobs)
+
+                if not futures:
+                    if once:
+                        return counts
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, futures = wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        job_status = future.result()
+                    except Exception:
+                        # the job is run again when its lease expires.
+                        logger.exception('process of the worker failed to run a job.')
+                        job_status = Job.RUNNING
+                    counts[job_status] = counts.get(job_status, 0) + 1
+
+    def run_in_process(self, once: bool) -> Dict[str, int]:
+        counts = {}
+        while True:
+            jobs = Job.objects.claim(1, self.lease)
+            if not jobs:
+                if once:
+                    return counts
+                time.sleep(self.poll_interval)
+                continue
+
+            job_status = run_job(jobs[0].pk, jobs[0].claim_token)
+            counts[job_status] = counts.get(job_status, 0) + 1
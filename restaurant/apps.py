@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RestaurantConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurant'
+
+    def ready(self):
+        # connect signal receivers of restaurant app.
+        from restaurant import signals  # noqa: F401
+        # connect receivers which remove deleted tokens and tokens of changed users from the cache.
+        from BookList import authentication  # noqa: F401
+
+        from BookList import search
+        search.register(self.get_model('MenuItem'), fields=['title', 'category__title'])
@@ -0,0 +1,80 @@
+"""
+Batch assignment of open orders to delivery crew.
+
+the load of each active delivery crew member (number of undelivered orders assigned to them) is read with
+one grouped query into a heap, then unassigned orders are given, oldest first, to the least loaded member,
+ties going to the member with the lowest id. assignments are saved with one bulk_update and recorded as
+order changes, so queries do not depend on the number of orders or delivery crew members:
+
+    assigned_orders = assign_orders(limit=100)
+"""
+import heapq
+from typing import *
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models, transaction
+
+from restaurant.models import Order, OrderChange
+
+
+class CrewLoadIndex:
+    """ heap of (number of open orders, user id) of delivery crew members."""
+
+    def __init__(self, loads: Dict[int, int], max_load: Optional[int] = None):
+        self.max_load = max_load
+        self.heap = [(load, crew_id) for crew_id, load in loads.items()]
+        heapq.heapify(self.heap)
+
+    @classmethod
+    def from_database(cls, max_load: Optional[int] = None) -> 'CrewLoadIndex':
+        crew = User.objects.filter(groups__name='delivery_crew', is_active=True).annotate(
+            load=models.Count('assigned_orders', filter=models.Q(assigned_orders__status=False))
+        )
+        return cls(dict(crew.values_list('pk', 'load')), max_load=max_load)
+
+    def assign(self) -> Optional[int]:
+        """
+        :return: id of the least loaded delivery crew member, whose load is incremented,
+                or None if there are no members or all of them have max_load orders.
+        """
+        if not self.heap or (self.max_load is not None and self.heap[0][0] >= self.max_load):
+            return None
+        load, crew_id = self.heap[0]
+        heapq.heapreplace(self.heap, (load + 1, crew_id))
+        return crew_id
+
+    @property
+    def loads(self) -> Dict[int, int]:
+        return {crew_id: load for load, crew_id in self.heap}
+
+
+def assign_orders(limit: Optional[int] = None, max_load: Optional[int] = None) -> List[Order]:
+    """
+    assigns undelivered orders without delivery crew to the least loaded delivery crew members.
+    :param limit: maximum number of assigned orders.
+    :param max_load: maximum number of open orders of a member, RESTAURANT_DELIVERY_CREW_MAX_LOAD by default.
+    :return: assigned orders.
+    """
+    if max_load is None:
+        max_load = settings.RESTAURANT_DELIVERY_CREW_MAX_LOAD
+
+    with transaction.atomic():
+        orders = Order.objects.filter(status=False, delivery_crew__isnull=True).order_by('date_time', 'id')
+        orders = list(orders.select_for_update()[:limit])
+        if not orders:
+            return []
+
+        index = CrewLoadIndex.from_database(max_load)
+        assigned_orders = []
+        for order in orders:
+            crew_id = index.assign()
+            if crew_id is None:
+                break
+            order.delivery_crew_id = crew_id
+            assigned_orders.append(order)
+
+        if assigned_orders:
+            Order.objects.bulk_update(assigned_orders, ['delivery_crew'])
+            OrderChange.objects.record((order, order.status, None) for order in assigned_orders)
+    return assigned_orders
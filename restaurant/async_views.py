@@ -0,0 +1,254 @@
+"""
+Async views of read-heavy restaurant endpoints, so an ASGI server serves many concurrent (and slow) clients
+without a thread per request.
+
+Each view serves GET requests of one action of a viewset with the async ORM, and reuses the viewset for
+everything which does not wait for the database: querysets, filters, serializers, permissions,
+catalog cache keys and content negotiation, so responses are the same as the responses of the viewset.
+authentication classes and the paginator of the viewset are run in a thread with their public methods
+(Request.user and paginate_queryset()) instead of copies of their internals, group names of users are read by
+aget_user_group_names() and reads of `replica_actions` of the viewset go to replicas (BookList/routers.py).
+other requests (other http methods, renderers other than json and viewsets with throttles) are delegated to
+the viewset.
+
+routes of these views are selected by ASYNC_ROUTES of restaurant/urls.py if RESTAURANT_ASYNC_VIEWS is True.
+"""
+import asyncio
+import time
+from functools import partial
+from typing import *
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpRequest, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+
+from BookList.routers import aget_read_database, reads_from
+from restaurant.caches import aget_order_changes_version, aget_user_group_names
+from restaurant.renderers import EventStreamRenderer
+from restaurant.views import CategoryViewSet, MenuItemViewSet, OrderViewSet
+
+
+async def authenticate(request: Request):
+    """ authenticates request with its authenticators in a thread, as Request.user of rest_framework does."""
+    await sync_to_async(getattr)(request, 'user')
+
+
+class AsyncViewSetView(View):
+    """
+    serves GET requests of `actions['get']` of `viewset_class` asynchronously, and delegates other requests
+    to the view of viewset_class for `actions`, which is the view of the same route in the router.
+    """
+    viewset_class: Type[GenericViewSet] = None
+    actions: Dict[str, str] = None
+    basename: str = None
+    detail: bool = False
+    sync_view: Callable = None
+    # requests which are negotiated to other renderers are delegated.
+    renderer_class = JSONRenderer
+    chunk_size = 1000
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        sync_view = cls.viewset_class.as_view(cls.actions, **cls.get_viewset_initkwargs())
+        view = csrf_exempt(super().as_view(sync_view=sync_view, **initkwargs))
+        # query budgets of the viewset are applied to this view.
+        view.cls, view.actions = cls.viewset_class, cls.actions
+        return view
+
+    @classmethod
+    def get_viewset_initkwargs(cls) -> dict:
+        """ :return: initkwargs of the viewset as they are passed by the router, with arguments of extra actions."""
+        handler = getattr(cls.viewset_class, cls.actions['get'])
+        return {'basename': cls.basename, 'detail': cls.detail, **getattr(handler, 'kwargs', {})}
+
+    def dispatch(self, request: HttpRequest, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return self.delegate(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def delegate(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        view = self.get_viewset(request, *args, **kwargs)
+        if view.get_throttles():
+            return await self.delegate(request, *args, **kwargs)
+
+        # same steps as APIView.initial(), content is negotiated first to delegate requests of other renderers.
+        try:
+            view.format_kwarg = view.get_format_suffix(**kwargs)
+            view.request.accepted_renderer, view.request.accepted_media_type = view.perform_content_negotiation(
+                view.request)
+        except exceptions.NotAcceptable:
+            return await self.delegate(request, *args, **kwargs)
+        if not isinstance(view.request.accepted_renderer, self.renderer_class):
+            return await self.delegate(request, *args, **kwargs)
+
+        try:
+            view.request.version, view.request.versioning_scheme = view.determine_version(
+                view.request, *args, **kwargs)
+            await authenticate(view.request)
+            view.request.user.group_names = await aget_user_group_names(view.request.user)
+            view.check_permissions(view.request)
+
+            handler = partial(getattr(self, view.action), view)
+            with reads_from(await aget_read_database(view, view.request)):
+                if hasattr(view, 'aget_cached_response'):
+                    response = await view.aget_cached_response(handler, view.request)
+                else:
+                    response = await handler(view.request)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+
+        return self.render(view.finalize_response(view.request, response, *args, **kwargs))
+
+    def get_viewset(self, request: HttpRequest, *args, **kwargs) -> GenericViewSet:
+        """ :return: viewset instance as it is set up by the view of ViewSetMixin.as_view() and APIView.dispatch()."""
+        view = self.viewset_class(**self.get_viewset_initkwargs())
+        view.action_map = self.actions
+        view.action = self.actions['get']
+        # handlers of methods are bound for `Allow` header.
+        for method, action in {'head': self.actions['get'], **self.actions}.items():
+            setattr(view, method, getattr(view, action))
+        view.request = Request(request, authenticators=view.get_authenticators())
+        view.args, view.kwargs = args, kwargs
+        view.headers = view.default_response_headers
+        return view
+
+    @staticmethod
+    async def afilter_queryset(view: GenericViewSet):
+        """ :return: filtered queryset of view, filters are run in a thread as they may query (e.g. search backends)."""
+        return await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+    async def list(self, view: GenericViewSet, request: Request) -> Response:
+        queryset = await self.afilter_queryset(view)
+        if view.paginator is None:
+            items = [item async for item in queryset.aiterator(chunk_size=self.chunk_size)]
+            return Response(view.get_serializer(items, many=True).data)
+
+        page = await sync_to_async(view.paginator.paginate_queryset)(queryset, request, view=view)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+    async def retrieve(self, view: GenericViewSet, request: Request) -> Response:
+        return Response(view.get_serializer(await self.aget_object(view)).data)
+
+    @staticmethod
+    async def aget_object(view: GenericViewSet):
+        """ async version of GenericAPIView.get_object()."""
+        queryset = await AsyncViewSetView.afilter_queryset(view)
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        filter_kwargs = {view.lookup_field: view.kwargs[lookup_url_kwarg]}
+        try:
+            instance = await queryset.aget(**filter_kwargs)
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+
+        view.check_object_permissions(view.request, instance)
+        return instance
+
+    @staticmethod
+    def render(response: HttpResponse) -> HttpResponse:
+        """ renders responses of rest_framework here, otherwise the handler renders them in a thread."""
+        if not isinstance(response, Response):
+            return response
+
+        response.render()
+        rendered_response = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered_response[header] = value
+        return rendered_response
+
+
+class MenuItemListView(AsyncViewSetView):
+    viewset_class = MenuItemViewSet
+    actions = {'get': 'list', 'post': 'create'}
+    basename = 'menu-items'
+
+
+class MenuItemDetailView(AsyncViewSetView):
+    viewset_class = MenuItemViewSet
+    actions = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+    basename = 'menu-items'
+    detail = True
+
+
+class CategoryListView(AsyncViewSetView):
+    viewset_class = CategoryViewSet
+    actions = {'get': 'list', 'post': 'create'}
+    basename = 'categories'
+
+
+class OrderListView(AsyncViewSetView):
+    viewset_class = OrderViewSet
+    actions = {'get': 'list', 'post': 'create'}
+    basename = 'orders'
+
+
+class OrderChangesView(AsyncViewSetView):
+    """ long-poll requests of the change feed of orders wait without a thread."""
+    viewset_class = OrderViewSet
+    actions = {'get': 'changes'}
+    basename = 'orders'
+
+    async def changes(self, view: OrderViewSet, request: Request) -> Response:
+        since, wait = view.get_changes_params(request)
+        if since is None:
+            return Response(view.get_changes_data(await view.aget_latest_cursor(), []))
+
+        deadline = time.monotonic() + wait
+        version, queried_at = await aget_order_changes_version(), time.monotonic()
+        changes = [change async for change in view.get_changes_queryset(since)]
+        while not changes and time.monotonic() < deadline:
+            await asyncio.sleep(view.changes_poll_interval)
+            new_version = await aget_order_changes_version()
+            if view.should_query_changes(version, new_version, queried_at):
+                version, queried_at = new_version, time.monotonic()
+                changes = [change async for change in view.get_changes_queryset(since)]
+        return Response(view.get_changes_data(since, changes))
+
+
+class OrderChangeStreamView(AsyncViewSetView):
+    viewset_class = OrderViewSet
+    actions = {'get': 'stream'}
+    basename = 'orders'
+    renderer_class = EventStreamRenderer
+
+    async def stream(self, view: OrderViewSet, request: Request):
+        since = view.get_stream_cursor(request)
+        if since is None:
+            since = await view.aget_latest_cursor()
+        return view.get_stream_response(self.get_events(view, since))
+
+    @staticmethod
+    async def get_events(view: OrderViewSet, since: int) -> AsyncIterator[str]:
+        """ events of changes after since, which are waited for until stream_timeout with heartbeats."""
+        deadline = time.monotonic() + view.stream_timeout
+        heartbeat = time.monotonic() + view.stream_heartbeat_interval
+        yield f'retry: {view.stream_retry}\n\n'
+        version, queried_at = None, 0.0
+        while True:
+            new_version, changes = await aget_order_changes_version(), []
+            if view.should_query_changes(version, new_version, queried_at):
+                version, queried_at = new_version, time.monotonic()
+                changes = [change async for change in view.get_changes_queryset(since)]
+            if changes:
+                since = changes[-1].id
+                heartbeat = time.monotonic() + view.stream_heartbeat_interval
+                for event in view.get_change_events(changes):
+                    yield event
+            elif time.monotonic() >= heartbeat:
+                heartbeat = time.monotonic() + view.stream_heartbeat_interval
+                yield ': keep-alive\n\n'
+
+            if time.monotonic() >= deadline:
+                return
+            await asyncio.sleep(view.changes_poll_interval)
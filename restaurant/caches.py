@@ -0,0 +1,150 @@
+"""
+Cache helpers of restaurant app which are built on top of Django's cache framework.
+"""
+import hashlib
+import time
+from typing import *
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+
+
+GROUP_NAMES_CACHE_KEY = 'restaurant:user-group-names:{user_id}'
+GROUP_NAMES_CACHE_TIMEOUT = getattr(settings, 'RESTAURANT_GROUP_NAMES_CACHE_TIMEOUT', 60 * 15)
+
+
+def get_user_group_names(user: User) -> List[str]:
+    """
+    Group names are looked up on the user object of current request first, then in the cache
+    and at last in the database. anonymous users are not member of any group.
+    :returns: List of names of all groups of given user object.
+    """
+    if not user.is_authenticated:
+        return []
+
+    # request-scoped value which is attached to the user object of current request.
+    group_names = getattr(user, 'group_names', None)
+    if group_names is not None:
+        return group_names
+
+    cache_key = GROUP_NAMES_CACHE_KEY.format(user_id=user.pk)
+    group_names = cache.get(cache_key)
+    if group_names is None:
+        group_names = list(user.groups.values_list('name', flat=True))
+        cache.set(cache_key, group_names, GROUP_NAMES_CACHE_TIMEOUT)
+
+    user.group_names = group_names
+    return group_names
+
+
+async def aget_user_group_names(user: User) -> List[str]:
+    """ async version of get_user_group_names() which reads the database with the async ORM."""
+    if not user.is_authenticated:
+        return []
+
+    group_names = getattr(user, 'group_names', None)
+    if group_names is not None:
+        return group_names
+
+    cache_key = GROUP_NAMES_CACHE_KEY.format(user_id=user.pk)
+    group_names = await cache.aget(cache_key)
+    if group_names is None:
+        group_names = [name async for name in user.groups.values_list('name', flat=True)]
+        await cache.aset(cache_key, group_names, GROUP_NAMES_CACHE_TIMEOUT)
+
+    user.group_names = group_names
+    return group_names
+
+
+def invalidate_user_group_names(user_ids: Iterable[int]):
+    """ removes cached group names of users with given ids."""
+    cache.delete_many([GROUP_NAMES_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+CATALOG_VERSION_CACHE_KEY = 'restaurant:catalog-version'
+CATALOG_LAST_MODIFIED_CACHE_KEY = 'restaurant:catalog-last-modified'
+CATALOG_RESPONSE_CACHE_KEY = 'restaurant:catalog-response:{digest}'
+CATALOG_RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESTAURANT_CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_catalog_version() -> Tuple[int, int]:
+    """
+    version of catalog (menu items and categories) is bumped whenever catalog changes,
+    so cached responses of an old version are never read again.
+    :returns: tuple of (version, last modified timestamp) of the catalog.
+    """
+    values = cache.get_many([CATALOG_VERSION_CACHE_KEY, CATALOG_LAST_MODIFIED_CACHE_KEY])
+    if len(values) == 2:
+        return values[CATALOG_VERSION_CACHE_KEY], values[CATALOG_LAST_MODIFIED_CACHE_KEY]
+
+    # version starts from current time, so it does not collide with
+    # versions which were used before the version key was evicted.
+    now = int(time.time())
+    cache.add(CATALOG_VERSION_CACHE_KEY, now * 1000, None)
+    cache.add(CATALOG_LAST_MODIFIED_CACHE_KEY, now, None)
+    return cache.get(CATALOG_VERSION_CACHE_KEY, now * 1000), cache.get(CATALOG_LAST_MODIFIED_CACHE_KEY, now)
+
+
+async def aget_catalog_version() -> Tuple[int, int]:
+    """ async version of get_catalog_version()."""
+    values = await cache.aget_many([CATALOG_VERSION_CACHE_KEY, CATALOG_LAST_MODIFIED_CACHE_KEY])
+    if len(values) == 2:
+        return values[CATALOG_VERSION_CACHE_KEY], values[CATALOG_LAST_MODIFIED_CACHE_KEY]
+
+    now = int(time.time())
+    await cache.aadd(CATALOG_VERSION_CACHE_KEY, now * 1000, None)
+    await cache.aadd(CATALOG_LAST_MODIFIED_CACHE_KEY, now, None)
+    return (await cache.aget(CATALOG_VERSION_CACHE_KEY, now * 1000),
+            await cache.aget(CATALOG_LAST_MODIFIED_CACHE_KEY, now))
+
+
+def bump_catalog_version():
+    """ invalidates all cached responses of catalog by increasing its version."""
+    try:
+        cache.incr(CATALOG_VERSION_CACHE_KEY)
+    except ValueError:
+        # version key does not exist.
+        get_catalog_version()
+    cache.set(CATALOG_LAST_MODIFIED_CACHE_KEY, int(time.time()), None)
+
+
+def get_catalog_response_cache_key(version: int, *key_parts: Any) -> str:
+    """ :returns: cache key of a catalog response for given version and request specific key parts."""
+    digest = hashlib.sha1(repr((version, key_parts)).encode()).hexdigest()
+    return CATALOG_RESPONSE_CACHE_KEY.format(digest=digest)
+
+
+ORDER_CHANGES_VERSION_CACHE_KEY = 'restaurant:order-changes-version'
+
+
+def get_order_changes_version() -> int:
+    """
+    version of changes of orders is bumped whenever changes are recorded, so requests which wait for
+    changes (long-poll and streams) query the database only when the version changes.
+    """
+    version = cache.get(ORDER_CHANGES_VERSION_CACHE_KEY)
+    if version is not None:
+        return version
+
+    # version starts from current time, so it differs from the version before the key was evicted.
+    cache.add(ORDER_CHANGES_VERSION_CACHE_KEY, int(time.time() * 1000), None)
+    return cache.get(ORDER_CHANGES_VERSION_CACHE_KEY, 0)
+
+
+async def aget_order_changes_version() -> int:
+    """ async version of get_order_changes_version()."""
+    version = await cache.aget(ORDER_CHANGES_VERSION_CACHE_KEY)
+    if version is not None:
+        return version
+
+    await cache.aadd(ORDER_CHANGES_VERSION_CACHE_KEY, int(time.time() * 1000), None)
+    return await cache.aget(ORDER_CHANGES_VERSION_CACHE_KEY, 0)
+
+
+def bump_order_changes_version():
+    try:
+        cache.incr(ORDER_CHANGES_VERSION_CACHE_KEY)
+    except ValueError:
+        # version key does not exist.
+        get_order_changes_version()
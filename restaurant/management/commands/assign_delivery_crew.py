@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from restaurant.assignment import assign_orders
+
+
+class Command(BaseCommand):
+    help = "Assigns undelivered orders without delivery crew to the least loaded delivery crew members"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='maximum number of assigned orders')
+        parser.add_argument('--max-load', type=int, default=None,
+                            help='maximum number of open orders of a delivery crew member, '
+                                 'RESTAURANT_DELIVERY_CREW_MAX_LOAD by default')
+
+    def handle(self, *args, **options):
+        orders = assign_orders(limit=options['limit'], max_load=options['max_load'])
+        self.stdout.write(self.style.SUCCESS(f'{len(orders)} orders are assigned to delivery crew.'))
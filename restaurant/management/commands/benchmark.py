@@ -0,0 +1,400 @@
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from typing import *
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.db import connection, connections
+from django.test import Client
+from django.test.testcases import LiveServerThread
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from BookList import search
+from BookList.loadgen import HTTPRequest, run_load
+from BookListAPI.models import Book, Category as BookCategory, Rating
+from restaurant.models import Cart, MenuItem
+
+
+class Scenario:
+    """
+    A benchmarked endpoint.
+
+    `get_request(i)` builds the i-th request and `prepare(indexes)` puts the database in the state which
+    requests of given indexes expect (e.g. fills carts before checkout), it is not measured.
+    requests of different indexes must not depend on each other as they are sent concurrently in http mode,
+    so `max_requests` limits the number of them if the scenario has a limited number of distinct requests.
+    """
+
+    def __init__(self, name: str, get_request: Callable[[int], HTTPRequest], expected_status: int = 200,
+                 prepare: Optional[Callable[[Iterable[int]], None]] = None, max_requests: Optional[int] = None):
+        self.name = name
+        self.get_request = get_request
+        self.expected_status = expected_status
+        self.prepare = prepare
+        self.max_requests = max_requests
+
+
+class Command(BaseCommand):
+    help = ("Seeds a throwaway test database and measures latency percentiles, throughput and "
+            "query counts of the main API endpoints, in-process or over HTTP with multiple processes")
+
+    authors = ('Jane Austen', 'Leo Tolstoy', 'Mark Twain', 'Virginia Woolf', 'Franz Kafka', 'Toni Morrison')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('in-process', 'http'), default='in-process',
+                            help='drive the app with django test client, or with a local multi-process '
+                                 'load generator against a live server')
+        parser.add_argument('--scenarios', nargs='+', metavar='NAME',
+                            help='names of scenarios to run, all of them by default')
+        parser.add_argument('--iterations', type=int, default=200, help='measured requests of each scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='requests of each scenario which are not measured')
+        parser.add_argument('--concurrency', type=int, default=4, help='worker processes of http mode')
+        parser.add_argument('--users', type=int, default=350)
+        parser.add_argument('--items', type=int, default=500, help='number of menu items')
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--books', type=int, default=500)
+        parser.add_argument('--ratings', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='seed of random generators for reproducible data')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='seed and benchmark the configured database instead of a throwaway test database')
+        parser.add_argument('--output', help='path of json file which results are written to')
+        parser.add_argument('--compare', metavar='PATH', help='json results of a previous run to compare with')
+        parser.add_argument('--max-regression', type=float, metavar='PERCENT',
+                            help='fail if p95 latency or query count of a scenario grows more than this percent '
+                                 'compared to --compare results')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations should be at least 1.')
+        previous_results = self.load_results(options['compare']) if options['compare'] else None
+
+        old_config, temp_dir = None, None
+        # like the test runner, DEBUG is turned off so the measurements are close to production.
+        test_settings = override_settings(DEBUG=False,
+                                          ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver', 'localhost'])
+        test_settings.enable()
+        try:
+            if not options['use_current_db']:
+                old_config, temp_dir = self.create_test_databases()
+            self.seed(options)
+            scenarios = self.get_scenarios(options['scenarios'])
+
+            # throttle rates of settings are for users, not for load tests.
+            with mock.patch.object(APIView, 'check_throttles'):
+                if options['mode'] == 'http':
+                    results = self.run_over_http(scenarios, options)
+                else:
+                    results = {scenario.name: self.run_in_process(scenario, options) for scenario in scenarios}
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            test_settings.disable()
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'mode': options['mode'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cpu_count': os.cpu_count(),
+            },
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'concurrency', 'users', 'items',
+                                                      'orders', 'books', 'ratings', 'seed')},
+            'scenarios': results,
+        }
+        self.print_results(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f'Results are written to {options["output"]}')
+
+        if previous_results is not None:
+            regressions = self.compare(previous_results, report, options['max_regression'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+
+    @staticmethod
+    def create_test_databases() -> Tuple[list, Optional[str]]:
+        """
+        creates test databases of all connections like the test runner, sqlite databases are created in temporary
+        files instead of memory so they can be shared with threads of the live server.
+        :return: configuration of the original databases (for teardown_databases) and the temporary directory.
+        """
+        temp_dir = None
+        for alias in connections:
+            test_settings = connections[alias].settings_dict['TEST']
+            if connections[alias].vendor == 'sqlite' and not test_settings.get('NAME'):
+                temp_dir = temp_dir or tempfile.mkdtemp(prefix='benchmark-')
+                test_settings['NAME'] = os.path.join(temp_dir, f'benchmark-{alias}.sqlite3')
+
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=())
+        return old_config, temp_dir
+
+    def seed(self, options: dict):
+        """ fills the restaurant with populate_db command, and creates books, ratings and tokens of users."""
+        started = time.perf_counter()
+        verbose = options['verbosity'] > 1
+        call_command('populate_db', users=options['users'], items=options['items'], orders=options['orders'],
+                     seed=options['seed'], stdout=self.stdout if verbose else io.StringIO())
+
+        rng = random.Random(options['seed'])
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        category_ids = [
+            category.pk for category in
+            BookCategory.objects.bulk_create(BookCategory(name=f'Category {i}') for i in range(10))
+        ]
+        books = Book.objects.bulk_create(
+            (Book(title=f'Book {i}', author=rng.choice(self.authors), category_id=rng.choice(category_ids),
+                  price=Decimal(rng.randint(5, 60)))
+             for i in range(options['books'])),
+            batch_size=2000
+        )
+
+        ratings_per_book = min(len(user_ids), options['ratings'] // max(len(books), 1))
+        Rating.objects.bulk_create(
+            (Rating(book_id=book.pk, user_id=user_id, rating=rng.randint(0, 5))
+             for book in books for user_id in rng.sample(user_ids, ratings_per_book)),
+            batch_size=2000
+        )
+        # bulk inserts do not send signals which keep aggregates and search index up to date.
+        Book.objects.rebuild_rating_aggregates()
+        search.get_search_backend().rebuild(search.get_index(Book))
+
+        Token.objects.bulk_create(
+            (Token(user_id=user_id, key=Token.generate_key()) for user_id in user_ids),
+            batch_size=2000, ignore_conflicts=True
+        )
+        self.stdout.write(f'Database is seeded in {time.perf_counter() - started:.1f}s.')
+
+    def get_scenarios(self, names: Optional[List[str]] = None) -> List[Scenario]:
+        tokens = dict(Token.objects.values_list('user_id', 'key'))
+        customer_ids = list(User.objects.filter(groups=None).order_by('pk').values_list('pk', flat=True))
+        manager_id = User.objects.filter(groups__name='manager').values_list('pk', flat=True).first()
+        menu_item_ids = list(MenuItem.objects.order_by('pk').values_list('pk', flat=True))
+        book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        if not customer_ids or not menu_item_ids or not book_ids or manager_id is None:
+            raise CommandError('Seeded data should have customers, a manager, menu items and books.')
+
+        def headers(user_id: int) -> Dict[str, str]:
+            return {'Authorization': f'Token {tokens[user_id]}', 'Accept': 'application/json',
+                    'Content-Type': 'application/json'}
+
+        def customer(i: int) -> int:
+            return customer_ids[i % len(customer_ids)]
+
+        def customer_and(values: List[int], i: int) -> Tuple[int, int]:
+            """ :return: i-th distinct pair of a customer and one of values."""
+            return customer(i), values[(i // len(customer_ids)) % len(values)]
+
+        def get(name: str, path: Callable[[int], str], user: Callable[[int], int]) -> Scenario:
+            return Scenario(name, lambda i: HTTPRequest('GET', path(i), headers(user(i))))
+
+        def post(user_id: int, path: str, data: dict) -> HTTPRequest:
+            return HTTPRequest('POST', path, headers(user_id), json.dumps(data).encode())
+
+        def group_by_customer(indexes: Iterable[int], values: List[int]) -> Dict[int, List[int]]:
+            values_of_customers = {}
+            for i in indexes:
+                user_id, value = customer_and(values, i)
+                values_of_customers.setdefault(user_id, []).append(value)
+            return values_of_customers
+
+        def prepare_cart_add(indexes: Iterable[int]):
+            for user_id, values in group_by_customer(indexes, menu_item_ids).items():
+                Cart.objects.filter(user_id=user_id, menu_item_id__in=values).delete()
+
+        def prepare_checkout(indexes: Iterable[int]):
+            user_ids = {customer(i) for i in indexes}
+            Cart.objects.filter(user_id__in=user_ids).delete()
+            Cart.objects.bulk_create(
+                Cart(user_id=user_id, menu_item_id=menu_item_id, quantity=2)
+                for user_id in user_ids for menu_item_id in menu_item_ids[:3]
+            )
+
+        def prepare_rating(indexes: Iterable[int]):
+            for user_id, values in group_by_customer(indexes, book_ids).items():
+                Rating.objects.filter(user_id=user_id, book_id__in=values).delete()
+
+        cart_url = reverse('restaurant:cart-items')
+        orders_url = reverse('restaurant:orders-list')
+        ratings_url = reverse('book-list-api:ratings')
+        scenarios = [
+            get('menu-items-list', lambda i: reverse('restaurant:menu-items-list') + '?page_size=20', customer),
+            get('menu-item-detail',
+                lambda i: reverse('restaurant:menu-items-detail', args=[menu_item_ids[i % len(menu_item_ids)]]),
+                customer),
+            get('categories-list', lambda i: reverse('restaurant:categories-list'), customer),
+            Scenario('cart-add',
+                     lambda i: post(customer(i), cart_url, {'menu_item': customer_and(menu_item_ids, i)[1],
+                                                            'quantity': 2}),
+                     expected_status=201, prepare=prepare_cart_add,
+                     max_requests=len(customer_ids) * len(menu_item_ids)),
+            get('cart-list', lambda i: cart_url, customer),
+            Scenario('order-checkout', lambda i: post(customer(i), orders_url, {}),
+                     expected_status=201, prepare=prepare_checkout, max_requests=len(customer_ids)),
+            get('orders-list', lambda i: orders_url + '?page_size=20', customer),
+            get('orders-list-manager', lambda i: orders_url + '?page_size=20', lambda i: manager_id),
+            get('books-set-list', lambda i: reverse('book-list-api:book-list'), customer),
+            get('ratings-list', lambda i: ratings_url, customer),
+            Scenario('ratings-create',
+                     lambda i: post(customer(i), ratings_url, {'book': customer_and(book_ids, i)[1], 'rating': 4}),
+                     expected_status=201, prepare=prepare_rating, max_requests=len(customer_ids) * len(book_ids)),
+        ]
+
+        if names:
+            unknown_names = set(names) - {scenario.name for scenario in scenarios}
+            if unknown_names:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown_names))}')
+            scenarios = [scenario for scenario in scenarios if scenario.name in names]
+        return scenarios
+
+    def run_in_process(self, scenario: Scenario, options: dict) -> dict:
+        """ sends requests of scenario one after another with django test client, and counts their queries."""
+        client = Client()
+        latencies, statuses, query_counts = [], [], []
+        for i in range(options['warmup'] + options['iterations']):
+            if scenario.prepare is not None:
+                scenario.prepare([i])
+            request = scenario.get_request(i)
+
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.generic(request.method, request.path, request.body or b'',
+                                          content_type=request.headers['Content-Type'], headers=request.headers)
+                latency = time.perf_counter() - start
+
+            if i >= options['warmup']:
+                latencies.append(latency)
+                statuses.append(response.status_code)
+                query_counts.append(len(queries))
+
+        return self.summarize(scenario, latencies, statuses, sum(latencies), query_counts)
+
+    def run_over_http(self, scenarios: List[Scenario], options: dict) -> dict:
+        """ serves the app with a live server thread and sends requests of scenarios from worker processes."""
+        server = LiveServerThread('localhost', StaticFilesHandler)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise server.error
+
+        base_url = f'http://{server.host}:{server.port}'
+        results = {}
+        try:
+            for scenario in scenarios:
+                count = options['warmup'] + options['iterations']
+                if scenario.max_requests is not None:
+                    count = min(count, scenario.max_requests)
+                if scenario.prepare is not None:
+                    scenario.prepare(range(count))
+                requests = [scenario.get_request(i) for i in range(count)]
+
+                warmup = min(options['warmup'], count - 1)
+                if warmup:
+                    run_load(base_url, requests[:warmup], options['concurrency'])
+                measured, elapsed = run_load(base_url, requests[warmup:], options['concurrency'])
+                results[scenario.name] = self.summarize(
+                    scenario, [latency for latency, _ in measured], [status for _, status in measured], elapsed
+                )
+        finally:
+            server.terminate()
+        return results
+
+    @staticmethod
+    def summarize(scenario: Scenario, latencies: List[float], statuses: List[int], elapsed: float,
+                  query_counts: Optional[List[int]] = None) -> dict:
+        """ :return: latency percentiles in milliseconds, throughput and query counts of requests."""
+        milliseconds = sorted(latency * 1000 for latency in latencies)
+        if len(milliseconds) > 1:
+            percentiles = statistics.quantiles(milliseconds, n=100, method='inclusive')
+        else:
+            percentiles = milliseconds * 99
+
+        summary = {
+            'requests': len(milliseconds),
+            'errors': sum(status != scenario.expected_status for status in statuses),
+            'status_codes': {str(status): count for status, count in sorted(Counter(statuses).items())},
+            'mean_ms': round(statistics.fmean(milliseconds), 3),
+            'min_ms': round(milliseconds[0], 3),
+            'p50_ms': round(percentiles[49], 3),
+            'p90_ms': round(percentiles[89], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'max_ms': round(milliseconds[-1], 3),
+            'throughput_rps': round(len(milliseconds) / elapsed, 2) if elapsed else None,
+        }
+        if query_counts is not None:
+            summary['queries_mean'] = round(statistics.fmean(query_counts), 2)
+            summary['queries_max'] = max(query_counts)
+        return summary
+
+    def print_results(self, results: dict):
+        self.stdout.write(f'{"scenario":<22}{"requests":>9}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}'
+                          f'{"p99 ms":>10}{"req/s":>10}{"queries":>9}')
+        for name, summary in results.items():
+            line = (f'{name:<22}{summary["requests"]:>9}{summary["errors"]:>8}{summary["p50_ms"]:>10.2f}'
+                    f'{summary["p95_ms"]:>10.2f}{summary["p99_ms"]:>10.2f}{summary["throughput_rps"] or 0:>10.1f}'
+                    f'{summary.get("queries_mean", ""):>9}')
+            self.stdout.write(self.style.ERROR(line) if summary['errors'] else line)
+
+    @staticmethod
+    def load_results(path: str) -> dict:
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Results of previous run can not be loaded: {error}')
+
+    def compare(self, previous: dict, current: dict, max_regression: Optional[float]) -> List[str]:
+        """
+        prints changes of scenarios which exist in both results.
+        :return: descriptions of changes which are more than max_regression percent worse.
+        """
+        if previous.get('mode') != current['mode']:
+            self.stdout.write(self.style.WARNING(
+                f'Previous results are measured in {previous.get("mode")} mode, not {current["mode"]} mode.'))
+
+        regressions = []
+        self.stdout.write(f'{"scenario":<22}{"p95 ms":>20}{"req/s":>20}{"queries":>16}')
+        for name, summary in current['scenarios'].items():
+            if (previous_summary := previous.get('scenarios', {}).get(name)) is None:
+                continue
+
+            changes = {}
+            for metric in ('p95_ms', 'throughput_rps', 'queries_mean'):
+                old, new = previous_summary.get(metric), summary.get(metric)
+                changes[metric] = (old, new, (new - old) / old * 100 if old and new is not None else None)
+
+            self.stdout.write(f'{name:<22}' + ''.join(
+                f'{f"{old} -> {new}":>{width}}' for (old, new, _), width in zip(changes.values(), (20, 20, 16))))
+
+            if max_regression is None:
+                continue
+            for metric in ('p95_ms', 'queries_mean'):
+                old, new, percent = changes[metric]
+                if percent is not None and percent > max_regression:
+                    regressions.append(f'{name}: {metric} {old} -> {new} ({percent:+.1f}%)')
+        return regressions
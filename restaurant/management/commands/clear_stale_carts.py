@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from restaurant.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Deletes carts which are not changed for a number of days, in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='age of stale carts in days, RESTAURANT_STALE_CART_DAYS by default')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='number of carts which are deleted by each transaction')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='seconds between batches, so requests can write between them')
+        parser.add_argument('--no-signals', action='store_true',
+                            help='does not send delete signals of carts, RESTAURANT_CART_DELETE_SIGNALS by default')
+
+    def handle(self, *args, **options):
+        days = settings.RESTAURANT_STALE_CART_DAYS if options['days'] is None else options['days']
+        stale_carts = Cart.objects.filter(last_modified__lt=timezone.now() - timedelta(days=days))
+        batch_size = options['batch_size']
+
+        deleted = 0
+        while True:
+            # each batch is a short transaction which deletes carts by their ids, so the database is not
+            # locked for the whole cleanup.
+            with transaction.atomic():
+                batch_ids = list(stale_carts.order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if batch_ids:
+                    # signals are sent as RESTAURANT_CART_DELETE_SIGNALS sets, unless they are turned off here.
+                    send_signals = False if options['no_signals'] else None
+                    deleted += Cart.objects.filter(pk__in=batch_ids).delete_carts(send_signals)
+            if len(batch_ids) < batch_size:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} stale carts are deleted.'))
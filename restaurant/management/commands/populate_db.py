@@ -1,97 +1,159 @@
+from itertools import islice
+from typing import *
+
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils.text import slugify
 from faker import Faker
 from django.contrib.auth.models import User, Group
+from restaurant.caches import bump_catalog_version
 from restaurant.models import Category, MenuItem, Cart, Order, OrderItem
+from BookList import search
 import random
 from decimal import Decimal
 
 
 class Command(BaseCommand):
-    help = "Populates the database with fake data for testing"
+    help = "Populates the database with fake data for testing, in batches of bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=35,
+                            help='number of users, 1/7 of them are managers and 2/7 are delivery crew')
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--items', type=int, default=50, help='number of menu items')
+        parser.add_argument('--orders', type=int, default=40)
+        parser.add_argument('--max-carts-per-customer', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=2000, help='number of rows of each bulk insert')
+        parser.add_argument('--seed', type=int, default=0, help='seed of random generators for reproducible data')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.fake = Faker()
+        self.fake.seed_instance(options['seed'])
+
+        with transaction.atomic():
+            manager_ids, delivery_crew_ids, customer_ids = self.create_users(options['users'])
+            category_ids = self.create_categories(options['categories'])
+            menu_items = self.create_menu_items(options['items'], category_ids)
+            self.create_carts(customer_ids, menu_items, options['max_carts_per_customer'])
+            self.create_orders(options['orders'], customer_ids, delivery_crew_ids, menu_items)
+
+        # signals are not sent by bulk inserts.
+        search.get_search_backend().rebuild(search.get_index(MenuItem), batch_size=self.batch_size)
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS('Database populated with fake data successfully!'))
+
+    def bulk_create(self, model, objects: Iterable) -> List:
+        """ inserts objects in batches.
+        :return: primary keys of created objects.
+        """
+        objects = iter(objects)
+        pks = []
+        while batch := list(islice(objects, self.batch_size)):
+            pks.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        self.stdout.write(f'{len(pks)} {model._meta.verbose_name_plural} created.')
+        return pks
+
+    def create_users(self, count: int) -> Tuple[List[int], List[int], List[int]]:
+        """ :return: ids of managers, delivery crew and customers."""
+        # hashing password is slow by design, so it is hashed once for all users.
+        password = make_password('password123')
+        # numbers of usernames start after existing users, so seeded usernames of another run do not collide.
+        first = (User.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+        users = (
+            User(username=f'{self.fake.user_name()}{i}', email=f'user{i}@{self.fake.domain_name()}', password=password)
+            for i in range(first, first + count)
+        )
+        user_ids = self.bulk_create(User, users)
 
-    def handle(self, *args, **kwargs):
-        fake = Faker()
+        managers_count = max(1, count // 7) if count else 0
+        delivery_crew_count = max(1, count * 2 // 7) if count > managers_count else 0
+        manager_ids = user_ids[:managers_count]
+        delivery_crew_ids = user_ids[managers_count:managers_count + delivery_crew_count]
+        customer_ids = user_ids[managers_count + delivery_crew_count:]
 
         # Create groups
         manager_group, _ = Group.objects.get_or_create(name='manager')
         delivery_crew_group, _ = Group.objects.get_or_create(name='delivery_crew')
-        # customer_group, _ = Group.objects.get_or_create(name='customer')
-
-        # Create users
-        for _ in range(5):  # Managers
-            user = User.objects.create_user(
-                username=fake.unique.user_name(),
-                email=fake.unique.email(),
-                password='password123'
-            )
-            manager_group.user_set.add(user)
+        UserGroup = User.groups.through
+        memberships = [UserGroup(user_id=user_id, group_id=manager_group.pk) for user_id in manager_ids]
+        memberships += [UserGroup(user_id=user_id, group_id=delivery_crew_group.pk) for user_id in delivery_crew_ids]
+        self.bulk_create(UserGroup, memberships)
 
-        for _ in range(10):  # Delivery crew
-            user = User.objects.create_user(
-                username=fake.unique.user_name(),
-                email=fake.unique.email(),
-                password='password123'
-            )
-            delivery_crew_group.user_set.add(user)
+        return manager_ids, delivery_crew_ids, customer_ids
 
-        for _ in range(20):  # Customers
-            user = User.objects.create_user(
-                username=fake.unique.user_name(),
-                email=fake.unique.email(),
-                password='password123'
-            )
-            # customer_group.user_set.add(user)
+    def create_categories(self, count: int) -> List[int]:
+        titles = (f'{self.fake.word()} {i}' for i in range(count))
+        return self.bulk_create(Category, (Category(title=title, slug=slugify(title)) for title in titles))
 
-        # Create categories
-        categories = []
-        for _ in range(5):
-            category = Category.objects.create(
-                title=fake.unique.word()
-            )
-            categories.append(category)
-
-        # Create menu items
-        menu_items = []
-        for _ in range(50):
-            menu_item = MenuItem.objects.create(
-                title=fake.unique.word(),
-                price=Decimal(fake.random_int(min=5, max=50)),
-                featured=fake.boolean(),
-                category=random.choice(categories)
-            )
-            menu_items.append(menu_item)
-
-        # Create carts
-        customers = User.objects.filter(groups__name='customer')
-        for customer in customers:
-            for _ in range(random.randint(1, 5)):
-                Cart.objects.create(
-                    user=customer,
-                    menu_item=random.choice(menu_items),
-                    quantity=random.randint(1, 5)
-                )
+    def create_menu_items(self, count: int, category_ids: List[int]) -> List[Tuple[int, Decimal]]:
+        """ :return: list of (id, price) of menu items."""
+        prices = []
 
-        # Create orders
-        delivery_crew = User.objects.filter(groups__name='delivery_crew')
-        for customer in customers:
-            for _ in range(random.randint(1, 3)):
-                total_price = Decimal(fake.random_int(min=20, max=200))
-                order = Order.objects.create(
-                    user=customer,
-                    status=fake.boolean(),
-                    total_price=total_price,
-                    delivery_crew=random.choice(delivery_crew) if fake.boolean() else None
+        def generate():
+            for i in range(count):
+                title = f'{self.fake.word()} {i}'
+                price = Decimal(self.random.randint(5, 50))
+                prices.append(price)
+                yield MenuItem(
+                    title=title,
+                    slug=slugify(title),
+                    price=price,
+                    featured=self.random.random() < 0.5,
+                    category_id=self.random.choice(category_ids) if category_ids else None
                 )
 
-                # Create order items
-                for _ in range(random.randint(1, 5)):
-                    menu_item = random.choice(menu_items)
-                    quantity = random.randint(1, 3)
-                    OrderItem.objects.create(
-                        order=order,
-                        menu_item=menu_item,
-                        quantity=quantity,
-                        unit_price=menu_item.price
-                    )
+        menu_item_ids = self.bulk_create(MenuItem, generate())
+        return list(zip(menu_item_ids, prices))
 
-        self.stdout.write(self.style.SUCCESS('Database populated with fake data successfully!'))
+    def create_carts(self, customer_ids: List[int], menu_items: List[Tuple[int, Decimal]], max_carts: int):
+        if not menu_items:
+            return
+
+        def generate():
+            for customer_id in customer_ids:
+                carts_count = self.random.randint(0, min(max_carts, len(menu_items)))
+                for menu_item_id, _ in self.random.sample(menu_items, carts_count):
+                    yield Cart(user_id=customer_id, menu_item_id=menu_item_id, quantity=self.random.randint(1, 5))
+
+        self.bulk_create(Cart, generate())
+
+    def create_orders(self, count: int, customer_ids: List[int], delivery_crew_ids: List[int],
+                      menu_items: List[Tuple[int, Decimal]]):
+        """ creates orders with 1 to 5 order items, total price of each order is sum of its items."""
+        if not customer_ids or not menu_items:
+            return
+
+        created_orders = 0
+        while created_orders < count:
+            batch_size = min(self.batch_size, count - created_orders)
+            orders = []
+            items_of_orders = []
+            for _ in range(batch_size):
+                sampled_items = self.random.sample(menu_items, self.random.randint(1, min(5, len(menu_items))))
+                items = [(menu_item_id, price, self.random.randint(1, 3)) for menu_item_id, price in sampled_items]
+                has_delivery_crew = delivery_crew_ids and self.random.random() < 0.5
+                orders.append(Order(
+                    user_id=self.random.choice(customer_ids),
+                    status=self.random.random() < 0.5,
+                    total_price=sum(price * quantity for _, price, quantity in items),
+                    delivery_crew_id=self.random.choice(delivery_crew_ids) if has_delivery_crew else None
+                ))
+                items_of_orders.append(items)
+
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(order_id=order.pk, menu_item_id=menu_item_id, unit_price=price, quantity=quantity)
+                    for order, items in zip(orders, items_of_orders)
+                    for menu_item_id, price, quantity in items
+                ],
+                batch_size=self.batch_size
+            )
+            created_orders += batch_size
+
+        self.stdout.write(f'{created_orders} orders created.')
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def create_menu_item_search_index(apps, schema_editor):
+    # index of the historical MenuItem model with the fields which are indexed as of this migration.
+    from BookList import search
+
+    index = search.SearchIndex(apps.get_model('restaurant', 'MenuItem'), ['title', 'category__title'])
+    search.get_search_backend(schema_editor.connection.alias).rebuild(index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_order_date_time_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_menu_item_search_index, migrations.RunPython.noop),
+    ]
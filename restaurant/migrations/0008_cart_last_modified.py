@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0007_order_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,133 @@
+import time
+from typing import *
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from BookList.routers import get_current_read_database, reads_from
+from restaurant.caches import (
+    CATALOG_RESPONSE_CACHE_TIMEOUT,
+    aget_catalog_version,
+    get_catalog_version,
+    get_catalog_response_cache_key,
+    get_user_group_names,
+)
+from restaurant.permissions import RestaurantPermission
+
+
+class CatalogCacheMixin:
+    """
+        Caches serialized data of list and retrieve actions of catalog viewsets (menu items and categories).
+
+        Cached data is keyed by catalog version, path, query params and role of user,
+        so changing any menu item or category (which bumps catalog version) invalidates all of them.
+        Responses have ETag and Last-Modified headers and conditional requests are answered with 304.
+        Permissions are checked before the cache is read, as this mixin only wraps action handlers.
+    """
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, handler, request: Request, *args, **kwargs) -> Response:
+        """
+        :return: cached response if it exists, otherwise response of handler which will be cached
+                if it is successful. 304 Not Modified if client has the latest version of a successful response.
+        """
+        version, last_modified = get_catalog_version()
+        cache_key, etag = self.get_cache_key_and_etag(request, version)
+
+        if (data := cache.get(cache_key)) is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+        else:
+            with reads_from(self.get_catalog_read_database(last_modified)):
+                response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, CATALOG_RESPONSE_CACHE_TIMEOUT)
+
+        return self.get_conditional_response(request, response, etag, last_modified)
+
+    async def aget_cached_response(self, handler, request: Request, *args, **kwargs) -> Response:
+        """ async version of get_cached_response() for async views, handler is a coroutine function."""
+        version, last_modified = await aget_catalog_version()
+        cache_key, etag = self.get_cache_key_and_etag(request, version)
+
+        if (data := await cache.aget(cache_key)) is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+        else:
+            with reads_from(self.get_catalog_read_database(last_modified)):
+                response = await handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            await cache.aset(cache_key, response.data, CATALOG_RESPONSE_CACHE_TIMEOUT)
+
+        return self.get_conditional_response(request, response, etag, last_modified)
+
+    @staticmethod
+    def get_catalog_read_database(last_modified: int) -> Optional[str]:
+        """
+        :return: database which responses are read from, the primary (None) if catalog has changed within
+                DATABASE_STICKY_PRIMARY_SECONDS, as replicas may not have the change which would be cached
+                with the new version.
+        """
+        if time.time() - last_modified < settings.DATABASE_STICKY_PRIMARY_SECONDS:
+            return None
+        return get_current_read_database()
+
+    def get_cache_key_and_etag(self, request: Request, version: int) -> Tuple[str, str]:
+        cache_key = get_catalog_response_cache_key(version, *self.get_cache_key_parts(request))
+        return cache_key, quote_etag(cache_key.rsplit(':', 1)[-1])
+
+    def get_conditional_response(self, request: Request, response: Response, etag: str,
+                                 last_modified: int) -> Response:
+        """
+        :return: 304 Not Modified instead of successful response if client has the latest version,
+                so urls without a response (e.g. 404 of a detail url) are never answered with 304.
+        """
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        return self.set_cache_headers(response, etag, last_modified)
+
+    @staticmethod
+    def set_cache_headers(response: Response, etag: str, last_modified: int) -> Response:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization', ))
+        return response
+
+    def get_cache_key_parts(self, request: Request) -> tuple:
+        """ :return: parts of request which identify a cached response of catalog."""
+        query_params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        return self.get_role(request), request.get_host(), request.path, query_params
+
+    @staticmethod
+    def get_role(request: Request) -> str:
+        group_names = get_user_group_names(request.user)
+        if RestaurantPermission.is_manager(group_names):
+            return 'manager'
+        elif RestaurantPermission.is_delivery_crew(group_names):
+            return 'delivery_crew'
+        else:
+            return 'customer'
+
+    @staticmethod
+    def is_not_modified(request: Request, etag: str, last_modified: int) -> bool:
+        """ :return: True if conditional headers of request show that client has the latest response."""
+        if if_none_match := request.headers.get('If-None-Match'):
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+
+        if if_modified_since := request.headers.get('If-Modified-Since'):
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            return if_modified_since is not None and last_modified <= if_modified_since
+
+        return False
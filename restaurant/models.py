@@ -1,11 +1,23 @@
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models.functions import Least
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 
-from django.shortcuts import reverse
+from django.urls.converters import IntConverter, SlugConverter
 from decimal import Decimal
+from typing import *
+
+from BookList.urlbuilder import URLBuilder
+from restaurant.caches import bump_order_changes_version
 # Create your models here.
 
+menu_item_url = URLBuilder('restaurant:menu-item-detail', slug=SlugConverter(), pk=IntConverter())
+
+# maximum quantity of a menu item in a cart, quantities which are added to carts are clamped to it.
+MAX_CART_QUANTITY = 1000
+
 
 class Category(models.Model):
     slug = models.SlugField(null=False)
@@ -19,8 +31,7 @@ class Category(models.Model):
         super().save(force_insert, force_update, using, update_fields)
 
     def get_absolute_url(self):
-        return reverse('restaurant:menu-item-detail',
-                       kwargs={'slug': self.slug, 'pk': self.pk})
+        return menu_item_url(slug=self.slug, pk=self.pk)
 
 
 class MenuItem(models.Model):
@@ -32,8 +43,7 @@ class MenuItem(models.Model):
     picture = models.ImageField(upload_to='menu_items', null=True, blank=True)
 
     def get_absolute_url(self):
-        return reverse('restaurant:menu-item-detail',
-                       kwargs={'slug': self.slug, 'pk': self.pk})
+        return menu_item_url(slug=self.slug, pk=self.pk)
         pass
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
@@ -44,34 +54,160 @@ class MenuItem(models.Model):
         super().save(force_insert, force_update, using, update_fields)
 
 
+def clamp_cart_quantity(quantity: models.Expression) -> models.Expression:
+    """ :return: expression of quantity which is at most MAX_CART_QUANTITY, computed by the database."""
+    return Least(quantity, models.Value(MAX_CART_QUANTITY))
+
+
+class CartQuerySet(models.QuerySet):
+
+    def with_prices(self) -> 'CartQuerySet':
+        """
+        :return: carts annotated with unit_price and price which are computed by the database.
+        """
+        return self.annotate(
+            unit_price=models.F('menu_item__price'),
+            price=models.ExpressionWrapper(
+                models.F('menu_item__price') * models.F('quantity'),
+                output_field=models.DecimalField(max_digits=20, decimal_places=2)
+            ),
+        )
+
+    def total(self) -> Decimal:
+        """
+        :return: total price of carts, computed by the database in a single query.
+        """
+        total = self.aggregate(
+            total=models.Sum(models.F('menu_item__price') * models.F('quantity'),
+                             output_field=models.DecimalField(max_digits=20, decimal_places=2))
+        )['total']
+        return total if total is not None else Decimal('0')
+
+    def delete_carts(self, send_signals: Optional[bool] = None) -> int:
+        """
+        deletes carts with a single DELETE statement.
+        :param send_signals: if False, pre_delete and post_delete signals are not sent, so rows are never
+                fetched even if receivers of the signals are connected. RESTAURANT_CART_DELETE_SIGNALS if None.
+        :return: number of deleted carts.
+        """
+        if send_signals is None:
+            send_signals = settings.RESTAURANT_CART_DELETE_SIGNALS
+        if send_signals:
+            return self.delete()[0]
+        # delete() has no public way to skip signals, so the statement of its fast path is used directly.
+        # QuerySet._raw_delete() is a private API of django, it is checked against the version of requirements.txt
+        # by CartMutationTest.test_carts_are_deleted_without_signals. carts have no related objects to collect.
+        queryset = self.order_by()
+        queryset._for_write = True
+        return queryset._raw_delete(queryset.db)
+
+    def add_quantities(self, user: User, quantities: Dict[int, int]) -> int:
+        """
+        adds quantities to carts of user in a single statement (upsert), carts of menu items which are not
+        in the cart of user are created. ids which do not belong to menu items are ignored.
+        quantities of carts are clamped to MAX_CART_QUANTITY.
+        :param quantities: quantity to add by menu item id.
+        :return: number of created or updated carts.
+        """
+        if not quantities:
+            return 0
+        quantities = {menu_item_id: min(value, MAX_CART_QUANTITY) for menu_item_id, value in quantities.items()}
+        self._for_write = True
+        connection = connections[self.db]
+        if not connection.features.supports_update_conflicts_with_target:
+            return self._add_quantities_one_by_one(user, quantities)
+
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        user_id, menu_item_id, quantity, last_modified = (
+            quote_name(self.model._meta.get_field(name).column)
+            for name in ('user', 'menu_item', 'quantity', 'last_modified')
+        )
+        menu_item_table = quote_name(MenuItem._meta.db_table)
+        menu_item_pk = quote_name(MenuItem._meta.pk.column)
+        # LEAST() is the scalar MIN() in sqlite.
+        least = 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+        cases = ' '.join(['WHEN %s THEN %s'] * len(quantities))
+        placeholders = ', '.join(['%s'] * len(quantities))
+        # menu items are selected to skip ids without a menu item, as foreign keys may only be checked on commit.
+        sql = (
+            f'INSERT INTO {table} ({user_id}, {menu_item_id}, {quantity}, {last_modified}) '
+            f'SELECT %s, {menu_item_pk}, CASE {menu_item_pk} {cases} END, %s '
+            f'FROM {menu_item_table} WHERE {menu_item_pk} IN ({placeholders}) '
+            f'ON CONFLICT ({user_id}, {menu_item_id}) '
+            f'DO UPDATE SET {quantity} = {least}({table}.{quantity} + excluded.{quantity}, %s), '
+            f'{last_modified} = excluded.{last_modified}'
+        )
+        now = self.model._meta.get_field('last_modified').get_db_prep_value(timezone.now(), connection)
+        params = [user.pk, *(value for item in quantities.items() for value in item), now, *quantities,
+                  MAX_CART_QUANTITY]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def _add_quantities_one_by_one(self, user: User, quantities: Dict[int, int]) -> int:
+        """ add_quantities() for databases without upserts, with an update or insert per menu item."""
+        existing_menu_item_ids = set(MenuItem.objects.using(self.db).filter(pk__in=quantities)
+                                     .values_list('pk', flat=True))
+        with transaction.atomic(using=self.db):
+            for menu_item_id in existing_menu_item_ids:
+                carts = self.filter(user=user, menu_item_id=menu_item_id)
+                if not carts.update(quantity=clamp_cart_quantity(models.F('quantity') + quantities[menu_item_id]),
+                                    last_modified=timezone.now()):
+                    self.create(user=user, menu_item_id=menu_item_id, quantity=quantities[menu_item_id])
+        return len(existing_menu_item_ids)
+
+
 class Cart(models.Model):
     user = models.ForeignKey(to=User, on_delete=models.CASCADE)
     menu_item = models.ForeignKey(to=MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField(default=1)
+    # carts which are not changed for RESTAURANT_STALE_CART_DAYS are deleted by clear_stale_carts command.
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
+    # values annotated by CartQuerySet.with_prices()
+    _unit_price = None
+    _price = None
 
     class Meta:
         unique_together = ('user', 'menu_item')
 
     @classmethod
-    def get_total_price_for_user(cls, user: User):
+    def get_total_price_for_user(cls, user: User) -> Decimal:
         """
         :return: total price of all purchased items of user
         """
-        return sum((cart.price for cart in cls.objects.filter(user=user)))
-        pass
+        return cls.objects.filter(user=user).total()
 
     @classmethod
-    def get_total_price_for_carts(cls, carts: models.QuerySet):
-        return sum((cart.price for cart in carts))
+    def get_total_price_for_carts(cls, carts: CartQuerySet) -> Decimal:
+        """
+        :return: total price of given carts, computed by the database in a single query.
+        """
+        return carts.total()
 
     @property
     def price(self) -> Decimal:
+        if self._price is not None:
+            return self._price
         return Decimal(self.unit_price * self.quantity)
 
+    @price.setter
+    def price(self, value: Decimal):
+        self._price = value
+
     @property
     def unit_price(self) -> Decimal:
+        if self._unit_price is not None:
+            return self._unit_price
         return Decimal(self.menu_item.price)
 
+    @unit_price.setter
+    def unit_price(self, value: Decimal):
+        self._unit_price = value
+
 
 class Order(models.Model):
     user = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='orders')
@@ -80,6 +216,37 @@ class Order(models.Model):
     delivery_crew = models.ForeignKey(to=User, on_delete=models.PROTECT, related_name='assigned_orders', null=True)
     date_time = models.DateTimeField(db_index=True, auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of orders of a customer or a delivery crew member.
+            models.Index(fields=['user', '-date_time'], name='order_user_date_time_idx'),
+            models.Index(fields=['delivery_crew', '-date_time'], name='order_crew_date_time_idx'),
+        ]
+
+
+class OrderItemQuerySet(models.QuerySet):
+
+    def with_prices(self) -> 'OrderItemQuerySet':
+        """
+        :return: order items annotated with price which is computed by the database.
+        """
+        return self.annotate(
+            price=models.ExpressionWrapper(
+                models.F('unit_price') * models.F('quantity'),
+                output_field=models.DecimalField(max_digits=20, decimal_places=2)
+            ),
+        )
+
+    def total(self) -> Decimal:
+        """
+        :return: total price of order items, computed by the database in a single query.
+        """
+        total = self.aggregate(
+            total=models.Sum(models.F('unit_price') * models.F('quantity'),
+                             output_field=models.DecimalField(max_digits=20, decimal_places=2))
+        )['total']
+        return total if total is not None else Decimal('0')
+
 
 class OrderItem(models.Model):
     menu_item = models.ForeignKey(to=MenuItem, on_delete=models.CASCADE)
@@ -87,9 +254,75 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(decimal_places=2, max_digits=10)
     order = models.ForeignKey(to=Order, on_delete=models.CASCADE, related_name='order_items', db_index=True)
 
+    objects = OrderItemQuerySet.as_manager()
+
+    # value annotated by OrderItemQuerySet.with_prices()
+    _price = None
+
     class Meta:
         unique_together = ('order', 'menu_item')
 
     @property
-    def price(self):
+    def price(self) -> Decimal:
+        if self._price is not None:
+            return self._price
         return Decimal(self.unit_price * self.quantity)
+
+    @price.setter
+    def price(self, value: Decimal):
+        self._price = value
+
+
+class OrderChangeQuerySet(models.QuerySet):
+
+    def record(self, changes: Iterable[Tuple[Order, bool, Optional[int]]]) -> List['OrderChange']:
+        """
+        creates changes of orders whose status or delivery crew differ from their previous values.
+        :param changes: tuples of (updated order, previous status, previous delivery crew id).
+        :return: created changes.
+        """
+        order_changes = [
+            OrderChange(order=order, user_id=order.user_id, status=order.status,
+                        delivery_crew_id=order.delivery_crew_id, previous_delivery_crew_id=previous_delivery_crew_id)
+            for order, previous_status, previous_delivery_crew_id in changes
+            if order.status != previous_status or order.delivery_crew_id != previous_delivery_crew_id
+        ]
+        if not order_changes:
+            return []
+        order_changes = self.bulk_create(order_changes)
+        # requests which wait for changes are notified after the changes are visible to them.
+        transaction.on_commit(bump_order_changes_version, using=self.db)
+        return order_changes
+
+    def visible_to(self, user: User, group_names: List[str]) -> 'OrderChangeQuerySet':
+        """
+        :return: changes of orders which user can see, in the same way as OrderViewSet.get_queryset(),
+                delivery crew also see changes which unassign them from orders.
+        """
+        if 'manager' in group_names:
+            return self.all()
+        elif 'delivery_crew' in group_names:
+            return self.filter(models.Q(delivery_crew=user) | models.Q(previous_delivery_crew=user))
+        else:
+            return self.filter(user=user)
+
+
+class OrderChange(models.Model):
+    """ change of status or delivery crew of an order, ids of changes are cursors of the change feed."""
+    order = models.ForeignKey(to=Order, on_delete=models.CASCADE, related_name='changes')
+    # customer of order, to find changes of customers without joining orders.
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+')
+    status = models.BooleanField()
+    delivery_crew = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+', null=True)
+    previous_delivery_crew = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+', null=True)
+    date_time = models.DateTimeField(auto_now_add=True)
+
+    objects = OrderChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # changes of a customer or a delivery crew member after a cursor.
+            models.Index(fields=['user', 'id'], name='orderchange_user_id_idx'),
+            models.Index(fields=['delivery_crew', 'id'], name='orderchange_crew_id_idx'),
+            models.Index(fields=['previous_delivery_crew', 'id'], name='orderchange_prev_crew_id_idx'),
+        ]
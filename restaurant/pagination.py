@@ -0,0 +1,36 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+        Cursor (keyset) pagination which filters rows by the position of the last item of previous page
+        instead of skipping them with OFFSET, so deep pages cost the same as the first one.
+
+        `unique_ordering` is appended to the ordering as a tie-breaker, so the order of rows which
+        have the same value in the first ordering field is deterministic.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    unique_ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if self.unique_ordering in (field.lstrip('-') for field in ordering):
+            return ordering
+
+        prefix = '-' if ordering[0].startswith('-') else ''
+        return ordering + (prefix + self.unique_ordering, )
+
+
+class OrderKeysetPagination(KeysetPagination):
+    """ newest orders first, using index of Order.date_time ."""
+    ordering = '-date_time'
+
+
+class MenuItemKeysetPagination(KeysetPagination):
+    """ menu items ordered by id, or by price if it is requested by OrderingFilter of the view."""
+    ordering = 'id'
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = 'id'
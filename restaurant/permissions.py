@@ -1,6 +1,8 @@
 from rest_framework import permissions
 from django.contrib.auth.models import Group, User
 
+from restaurant.caches import get_user_group_names
+
 
 class RestaurantPermission(permissions.IsAuthenticated):
     """
@@ -10,9 +12,10 @@ class RestaurantPermission(permissions.IsAuthenticated):
         (current groups : delivery_crew, manager and customers contains ordinary users).
 
         This permission class has classmethods to check user is belonged to target group or not.
+        if user_group_names is None, group names of request user are read from group names cache.
     """
 
-    def __init__(self, user_group_names: list[str],
+    def __init__(self, user_group_names: list[str] | None,
                  manager_permitted_actions: list[str],
                  delivery_crew_permitted_actions: list[str],
                  costumer_permitted_actions: list[str],
@@ -26,12 +29,15 @@ class RestaurantPermission(permissions.IsAuthenticated):
     def has_permission(self, request, view):
         super_permission = super().has_permission(request, view)
         cls = self.__class__
+        user_group_names = self.user_group_names
+        if user_group_names is None:
+            user_group_names = get_user_group_names(request.user)
 
-        if cls.is_manager(self.user_group_names):
+        if cls.is_manager(user_group_names):
             # manager has full access to all types of actions
             return (view.action in self.manager_permitted_actions) and super_permission
 
-        elif cls.is_delivery_crew(self.user_group_names):
+        elif cls.is_delivery_crew(user_group_names):
             return (view.action in self.delivery_crew_permitted_actions) and super_permission
 
         else:
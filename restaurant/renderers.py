@@ -0,0 +1,31 @@
+import json
+from typing import *
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def format_event(data: Any, event: Optional[str] = None, event_id: Optional[Any] = None) -> str:
+    """ :return: message of server-sent events with json of data, which does not contain new lines."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, cls=JSONEncoder, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+        Renderer of server-sent events. views of event streams return streaming responses of events,
+        so this renderer is used for content negotiation and renders other responses (e.g. errors) as a message.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_event(data).encode(self.charset)
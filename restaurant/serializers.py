@@ -1,6 +1,12 @@
+from django.db import transaction
+from django.utils.functional import cached_property
+from django.utils.text import slugify
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from .models import *
+from .caches import bump_catalog_version, get_user_group_names
+from BookList import search
+from BookList.fastserializers import FastReadSerializer
 from rest_framework import serializers
 from decimal import Decimal, ROUND_DOWN
 from djoser.serializers import UserSerializer as BaseUserSerializer
@@ -76,7 +82,7 @@ class MenuItemSerializer(serializers.ModelSerializer):
 
 
 class CartSerializer(serializers.ModelSerializer):
-    menu_item_info = serializers.SerializerMethodField(read_only=True)
+    menu_item_info = MenuItemSerializer(source='menu_item', read_only=True)
     user = serializers.SlugRelatedField(slug_field='username',
                                         queryset=User.objects.all(),
                                         default=serializers.CurrentUserDefault())
@@ -97,8 +103,25 @@ class CartSerializer(serializers.ModelSerializer):
         }
         depth = 1
 
-    def get_menu_item_info(self, cart: Cart):
-        return MenuItemSerializer(cart.menu_item).data
+
+class CartItemSerializer(serializers.Serializer):
+    """
+        menu item and quantity of cart mutations, which are applied by a single upsert or update of carts.
+        menu items are not queried by validation, ids without menu items are found by the upsert.
+    """
+    menu_item = serializers.IntegerField(min_value=1, help_text='id of menu-item')
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_CART_QUANTITY)
+
+
+class CartQuantitySerializer(serializers.Serializer):
+    """ new quantity of a cart, or the number which is added to its quantity."""
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_CART_QUANTITY, required=False)
+    increment = serializers.IntegerField(min_value=1, max_value=MAX_CART_QUANTITY, required=False)
+
+    def validate(self, attrs: dict) -> dict:
+        if len(attrs) != 1:
+            raise serializers.ValidationError('either quantity or increment should be provided.')
+        return attrs
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -143,7 +166,7 @@ class OrderSerializer(serializers.ModelSerializer):
         return OrderItemSerializer(order.order_items.all(), many=True).data
 
     def validate_delivery_crew(self, delivery_crew: User):
-        if delivery_crew.groups.filter(name='delivery_crew').exists():
+        if 'delivery_crew' in get_user_group_names(delivery_crew):
             return delivery_crew
         else:
             raise serializers.ValidationError(detail='provided user id does not belong to delivery crew')
@@ -172,3 +195,123 @@ class OrderItemSerializer(serializers.ModelSerializer):
         :return:absolute url for menu item
         """
         return this_order_item.menu_item.get_absolute_url()
+
+
+class OrderChangeSerializer(serializers.ModelSerializer):
+    time_changed = serializers.DateTimeField(source='date_time', read_only=True)
+
+    class Meta:
+        model = OrderChange
+        fields = ['id', 'order', 'status', 'delivery_crew', 'time_changed']
+        read_only_fields = ['id', 'order', 'status', 'delivery_crew']
+
+
+class FastMenuItemSerializer(FastReadSerializer):
+    serializer_class = MenuItemSerializer
+
+
+class FastOrderItemSerializer(FastReadSerializer):
+    serializer_class = OrderItemSerializer
+
+
+class FastOrderSerializer(FastReadSerializer):
+    serializer_class = OrderSerializer
+
+    @cached_property
+    def order_item_serializer(self) -> FastOrderItemSerializer:
+        return FastOrderItemSerializer(context=self.context)
+
+    def get_items(self, order: Order) -> list:
+        return [self.order_item_serializer.to_representation(item) for item in order.order_items.all()]
+
+
+class MenuItemListSerializer(serializers.ListSerializer):
+    """
+        Validates many menu items in one pass and saves them with bulk_create and bulk_update.
+        Referenced categories and menu items to update are fetched with a single query each,
+        and slugs are computed here as MenuItem.save() is not called by bulk operations.
+    """
+    batch_size = 1000
+    update_fields = ('title', 'slug', 'price', 'featured', 'category')
+
+    def validate(self, attrs: list[dict]) -> list[dict]:
+        category_ids = {row['category_id'] for row in attrs if row.get('category_id') is not None}
+        existing_category_ids = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+
+        menu_item_ids = {row['id'] for row in attrs if row.get('id') is not None}
+        self.menu_items_to_update = MenuItem.objects.in_bulk(menu_item_ids)
+
+        errors = []
+        for row in attrs:
+            row_errors = {}
+            if row.get('category_id') is not None and row['category_id'] not in existing_category_ids:
+                row_errors['category_id'] = [f'Invalid pk "{row["category_id"]}" - object does not exist.']
+            if row.get('id') is not None and row['id'] not in self.menu_items_to_update:
+                row_errors['id'] = [f'Invalid pk "{row["id"]}" - object does not exist.']
+            errors.append(row_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data: list[dict]) -> list[MenuItem]:
+        """ creates rows without id and updates rows with id. """
+        new_menu_items = []
+        updated_menu_items = []
+        for row in validated_data:
+            if (menu_item_id := row.pop('id', None)) is not None:
+                menu_item = self.menu_items_to_update[menu_item_id]
+                for field_name, value in row.items():
+                    setattr(menu_item, field_name, value)
+                updated_menu_items.append(menu_item)
+            else:
+                new_menu_items.append(MenuItem(**row))
+
+        for menu_item in new_menu_items + updated_menu_items:
+            menu_item.slug = slugify(menu_item.title)
+
+        with transaction.atomic():
+            MenuItem.objects.bulk_create(new_menu_items, batch_size=self.batch_size)
+            MenuItem.objects.bulk_update(updated_menu_items, self.update_fields, batch_size=self.batch_size)
+
+            # signals of menu items are not sent by bulk operations.
+            menu_items = new_menu_items + updated_menu_items
+            search.get_search_backend().update(search.get_index(MenuItem),
+                                               MenuItem.objects.filter(pk__in=[item.pk for item in menu_items]))
+            transaction.on_commit(bump_catalog_version)
+
+        return menu_items
+
+
+class MenuItemBulkSerializer(serializers.ModelSerializer):
+    """
+        Menu item rows of bulk import, rows with id update existing menu items and other rows create new ones.
+        validation of each row does not query the database, see MenuItemListSerializer .
+    """
+    id = serializers.IntegerField(required=False, allow_null=True)
+    category_id = serializers.IntegerField(required=False, allow_null=True)
+    price = CustomDecimalField(max_digits=10, decimal_places=2, required=False)
+
+    class Meta:
+        model = MenuItem
+        fields = ['id', 'title', 'featured', 'price', 'category_id']
+        list_serializer_class = MenuItemListSerializer
+        extra_kwargs = {
+            'title': {'required': False},
+            'featured': {'required': False},
+        }
+
+    def validate(self, attrs: dict) -> dict:
+        if attrs.get('id') is None:
+            missing_fields = [field for field in ('title', 'price', 'featured') if field not in attrs]
+            if missing_fields:
+                raise serializers.ValidationError(
+                    {field: ['This field is required for new menu items.'] for field in missing_fields}
+                )
+        return attrs
+
+
+class AssignOrdersSerializer(serializers.Serializer):
+    """ parameters of batch assignment of orders to delivery crew, see restaurant.assignment.assign_orders ."""
+    limit = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    max_load = serializers.IntegerField(min_value=1, required=False, allow_null=True)
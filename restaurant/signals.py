@@ -0,0 +1,51 @@
+from django.contrib.auth.models import User, Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from restaurant.caches import invalidate_user_group_names, bump_catalog_version
+from restaurant.models import Category, MenuItem
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_names_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    invalidates cached group names when groups of users are changed by
+    `user.groups.add/remove/clear()` or `group.user_set.add/remove/clear()`.
+    """
+    if not reverse:
+        # instance is a user object.
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.__dict__.pop('group_names', None)
+            invalidate_user_group_names([instance.pk])
+
+    elif action in ('post_add', 'post_remove'):
+        # instance is a group object and pk_set contains ids of users.
+        invalidate_user_group_names(pk_set)
+
+    elif action == 'pre_clear':
+        # members of group should be found before they are removed.
+        invalidate_user_group_names(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_names_on_group_change(sender, instance: Group, **kwargs):
+    """ invalidates cached group names of all members of renamed or deleted group."""
+    if not kwargs.get('created', False):
+        invalidate_user_group_names(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_change(sender, using, **kwargs):
+    """
+    bumps catalog version when a menu item or category is saved or deleted.
+    inside a transaction, version is bumped again after commit, so responses which
+    are cached by concurrent requests before the commit are not served.
+    """
+    bump_catalog_version()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(bump_catalog_version, using=using)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from jobs.mail import get_worker_connection
+from jobs.queue import task
+from restaurant.assignment import assign_orders
+from restaurant.models import Order
+
+ASSIGN_DELIVERY_CREW_KEY = 'assign-delivery-crew'
+
+
+@task
+def send_order_confirmation(order_id: int):
+    """ emails items and total price of a checked out order to its customer, if the customer has an email."""
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None or not order.user.email:
+        return
+
+    order_items = order.order_items.select_related('menu_item').with_prices().order_by('id')
+    lines = [f'{order_item.quantity} x {order_item.menu_item.title}: {order_item.price:.2f}'
+             for order_item in order_items]
+    lines.append(f'total: {order.total_price}')
+    send_mail(subject=f'{settings.SITE_NAME.strip()} - order #{order.pk} is received',
+              message='\n'.join(lines),
+              from_email=None,
+              recipient_list=[order.user.email],
+              connection=get_worker_connection())
+
+
+@task(coalesce=True)
+def assign_delivery_crew():
+    """
+    assigns orders which are waiting for delivery crew, enqueued by checkout if RESTAURANT_AUTO_ASSIGN_ORDERS.
+    checkouts enqueue it with ASSIGN_DELIVERY_CREW_KEY, so all of their orders are assigned by one job until it starts.
+    """
+    assign_orders()
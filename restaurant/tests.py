@@ -1,3 +1,1149 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from typing import *
+
+from django.contrib.auth.models import User, Group
+from django.core import mail
+from django.conf import settings
+from django.core.cache import cache, caches
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.http import HttpResponse
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import NoReverseMatch, clear_url_caches, resolve, reverse, reverse_lazy, set_script_prefix
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from unittest import mock
+
+from BookList.authentication import CachedTokenAuthentication, get_token_cache_key
+from BookList.search import sqlite_supports_fts5
+from BookList.querybudget import QueryBudgetExceeded, QueryBudgetTestMixin, normalize_sql
+from BookList.urlbuilder import clear_url_templates, get_url_template
+from jobs.models import Job
+from jobs.worker import Worker
+from restaurant.caches import CATALOG_LAST_MODIFIED_CACHE_KEY, get_catalog_version, get_user_group_names
+from restaurant.models import (
+    MAX_CART_QUANTITY, Category, MenuItem, Cart, Order, OrderChange, OrderItem, menu_item_url,
+)
+from restaurant.serializers import FastMenuItemSerializer, FastOrderSerializer, MenuItemSerializer, OrderSerializer
+from restaurant.assignment import assign_orders
+from restaurant.tasks import assign_delivery_crew
+import restaurant.urls
+from restaurant import async_views
+from restaurant.async_views import AsyncViewSetView
+from restaurant.views import MenuItemViewSet, OrderViewSet
 
 # Create your tests here.
+
+
+def reload_restaurant_urls():
+    # resolvers of included urlconfs are kept by the root urlconf.
+    importlib.reload(restaurant.urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+    clear_url_templates()
+
+
+@contextmanager
+def async_routes(enabled: bool = True):
+    """ serves ASYNC_ROUTES of restaurant/urls.py by async views, which RESTAURANT_ASYNC_VIEWS turns off by default."""
+    try:
+        with override_settings(RESTAURANT_ASYNC_VIEWS=enabled):
+            reload_restaurant_urls()
+            yield
+    finally:
+        reload_restaurant_urls()
+
+
+class RestaurantTestCase(QueryBudgetTestMixin, APITestCase):
+    """ creates groups, sample users with tokens and a small menu."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.manager_group = Group.objects.create(name='manager')
+        self.delivery_crew_group = Group.objects.create(name='delivery_crew')
+
+        self.manager = User.objects.create_user(username='manager', password='manager pass')
+        self.manager.groups.add(self.manager_group)
+        self.crew = User.objects.create_user(username='crew', password='crew pass')
+        self.crew.groups.add(self.delivery_crew_group)
+        self.customer = User.objects.create_user(username='customer', password='customer pass')
+
+        self.category = Category.objects.create(title='Main Course')
+        self.menu_items = [
+            MenuItem.objects.create(title=f'item {i}', price=Decimal(f'{i + 1}.50'),
+                                    featured=False, category=self.category)
+            for i in range(5)
+        ]
+
+    def get_client(self, user: User) -> APIClient:
+        """ :return: api client authenticated with token of given user."""
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+
+class OrderCheckoutTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders_url = reverse_lazy('restaurant:orders-list')
+
+    def fill_cart(self, user: User, count: int):
+        for quantity, menu_item in enumerate(self.menu_items[:count], start=1):
+            Cart.objects.create(user=user, menu_item=menu_item, quantity=quantity)
+
+    def test_checkout_creates_order_items_and_clears_carts(self):
+        self.fill_cart(self.customer, 3)
+        response = self.get_client(self.customer).post(self.orders_url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(user=self.customer)
+        # 1 * 1.50 + 2 * 2.50 + 3 * 3.50
+        self.assertEqual(order.total_price, Decimal('17.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertEqual(
+            OrderItem.objects.get(order=order, menu_item=self.menu_items[2]).unit_price,
+            Decimal('3.50')
+        )
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    @override_settings(JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_checkout_enqueues_order_confirmation(self):
+        self.customer.email = 'customer@example.com'
+        self.customer.save()
+        self.fill_cart(self.customer, 2)
+        self.get_client(self.customer).post(self.orders_url)
+        order = Order.objects.get(user=self.customer)
+
+        job = Job.objects.get(name='restaurant.tasks.send_order_confirmation')
+        self.assertEqual(job.kwargs, {'order_id': order.pk})
+        self.assertEqual(mail.outbox, [])
+
+        Worker(processes=0).run(once=True)
+        message, = mail.outbox
+        self.assertEqual(message.to, ['customer@example.com'])
+        self.assertIn('2 x item 1: 5.00', message.body)
+        self.assertIn('total: 6.50', message.body)
+
+    def test_checkout_without_carts(self):
+        response = self.get_client(self.customer).post(self.orders_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_query_count_does_not_depend_on_cart_size(self):
+        client = self.get_client(self.customer)
+        # warm up the group names cache of customer.
+        client.get(self.orders_url)
+        query_counts = []
+        for cart_size in (1, 5):
+            self.fill_cart(self.customer, cart_size)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(self.orders_url)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class GroupNamesCacheTest(RestaurantTestCase):
+
+    def test_group_names_are_read_from_cache(self):
+        self.assertEqual(get_user_group_names(User.objects.get(pk=self.manager.pk)), ['manager'])
+        manager = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_group_names(manager), ['manager'])
+
+    def test_anonymous_user_has_no_groups(self):
+        from django.contrib.auth.models import AnonymousUser
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_group_names(AnonymousUser()), [])
+
+    def test_cache_is_invalidated_when_groups_change(self):
+        customer = User.objects.get(pk=self.customer.pk)
+        self.assertEqual(get_user_group_names(customer), [])
+
+        self.manager_group.user_set.add(self.customer)
+        self.assertEqual(get_user_group_names(User.objects.get(pk=self.customer.pk)), ['manager'])
+
+        self.customer.groups.remove(self.manager_group)
+        self.assertEqual(get_user_group_names(User.objects.get(pk=self.customer.pk)), [])
+
+    def test_group_manager_endpoint_invalidates_cache(self):
+        client = self.get_client(self.manager)
+        menu_items_url = reverse_lazy('restaurant:menu-items-list')
+        self.assertEqual(self.get_client(self.customer).delete(f'{menu_items_url}/{self.menu_items[0].pk}').status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        response = client.post(reverse_lazy('restaurant:group-sample_users-create-or-list', args=['manager']),
+                                data={'username': 'customer'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(get_user_group_names(User.objects.get(pk=self.customer.pk)), ['manager'])
+
+
+class CatalogCacheTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.customer)
+        self.menu_items_url = reverse_lazy('restaurant:menu-items-list')
+
+    def test_cached_response_does_not_query_catalog(self):
+        first_response = self.client.get(self.menu_items_url)
+        self.assertEqual(first_response.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            second_response = self.client.get(self.menu_items_url)
+        self.assertEqual(second_response.json(), first_response.json())
+        self.assertFalse([query for query in queries if 'restaurant_menuitem' in query['sql']])
+
+    def test_changing_menu_item_invalidates_cache(self):
+        first_response = self.client.get(self.menu_items_url)
+        self.menu_items[0].title = 'new title'
+        self.menu_items[0].save()
+
+        second_response = self.client.get(self.menu_items_url)
+        self.assertNotEqual(first_response['ETag'], second_response['ETag'])
+        self.assertIn('new title', [item['title'] for item in second_response.json()['results']])
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.menu_items_url)
+        self.assertEqual(
+            self.client.get(self.menu_items_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(
+            self.client.get(self.menu_items_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(
+            self.client.get(self.menu_items_url, HTTP_IF_NONE_MATCH='"other"').status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_conditional_requests_of_missing_items_are_not_answered_with_304(self):
+        response = self.client.get(self.menu_items_url)
+        missing_item_url = reverse('restaurant:menu-items-detail', kwargs={'pk': 1000})
+        for headers in ({'If-None-Match': '*'}, {'If-Modified-Since': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.client.get(missing_item_url, headers=headers).status_code,
+                                 status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.menu_items_url, headers={'If-None-Match': '*'}).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_permissions_are_checked_before_cache(self):
+        self.client.get(self.menu_items_url)
+        self.assertEqual(APIClient().get(self.menu_items_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PriceAnnotationTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for quantity, menu_item in enumerate(self.menu_items, start=1):
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=quantity)
+
+    def test_cart_prices_are_annotated(self):
+        carts = list(Cart.objects.filter(user=self.customer).with_prices().order_by('quantity'))
+        with self.assertNumQueries(0):
+            self.assertEqual([cart.unit_price for cart in carts][:2], [Decimal('1.50'), Decimal('2.50')])
+            self.assertEqual(carts[1].price, Decimal('5.00'))
+
+    def test_totals_are_computed_by_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Cart.get_total_price_for_user(self.customer), Decimal('62.50'))
+        self.assertEqual(Cart.objects.none().total(), Decimal('0'))
+
+        self.get_client(self.customer).post(reverse_lazy('restaurant:orders-list'))
+        order = Order.objects.get(user=self.customer)
+        self.assertEqual(order.order_items.total(), order.total_price)
+        self.assertEqual(order.order_items.with_prices().get(menu_item=self.menu_items[1]).price, Decimal('5.00'))
+
+    def test_cart_list(self):
+        response = self.get_client(self.customer).get(reverse_lazy('restaurant:cart-items'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(cart['unit_price'], cart['price']) for cart in response.json()][:2],
+                         [(1.5, 1.5), (2.5, 5.0)])
+
+
+class CartMutationTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.customer)
+        self.carts_url = reverse('restaurant:cart-items')
+
+    def get_quantities(self) -> Dict[int, int]:
+        return dict(Cart.objects.filter(user=self.customer).values_list('menu_item', 'quantity'))
+
+    def cart_item_url(self, menu_item: MenuItem) -> str:
+        return reverse('restaurant:cart-item-modify', kwargs={'menu_item_id': menu_item.pk})
+
+    def test_adding_a_menu_item_again_increments_quantity(self):
+        menu_item = self.menu_items[0]
+        response = self.client.post(self.carts_url, {'menu_item': menu_item.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['quantity'], response.data['price']), (2, Decimal('3.00')))
+
+        response = self.client.post(self.carts_url, {'menu_item': menu_item.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], 5)
+        self.assertEqual(self.get_quantities(), {menu_item.pk: 5})
+
+    def test_batch_add_is_a_single_upsert(self):
+        Cart.objects.create(user=self.customer, menu_item=self.menu_items[0], quantity=1)
+        items = [{'menu_item': menu_item.pk, 'quantity': 2} for menu_item in self.menu_items]
+        items.append({'menu_item': self.menu_items[1].pk, 'quantity': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.carts_url, items)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+
+        expected = {menu_item.pk: 2 for menu_item in self.menu_items}
+        expected.update({self.menu_items[0].pk: 3, self.menu_items[1].pk: 3})
+        self.assertEqual(self.get_quantities(), expected)
+
+    def test_missing_menu_items_are_rejected(self):
+        items = [{'menu_item': self.menu_items[0].pk, 'quantity': 1}, {'menu_item': 1000, 'quantity': 1}]
+        response = self.client.post(self.carts_url, items)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_quantities(), {})
+
+        response = self.client.post(self.carts_url, {'menu_item': self.menu_items[0].pk, 'quantity': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_quantity(self):
+        menu_item = self.menu_items[0]
+        Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+
+        response = self.client.patch(self.cart_item_url(menu_item), {'increment': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['quantity'], 3)
+        response = self.client.patch(self.cart_item_url(menu_item), {'quantity': 7})
+        self.assertEqual(response.data['quantity'], 7)
+        self.assertEqual(self.get_quantities(), {menu_item.pk: 7})
+
+        response = self.client.patch(self.cart_item_url(menu_item), {'quantity': 1, 'increment': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(self.cart_item_url(self.menu_items[1]), {'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_quantities_are_clamped(self):
+        menu_item, other_menu_item = self.menu_items[:2]
+        for _ in range(2):
+            response = self.client.post(self.carts_url, {'menu_item': menu_item.pk, 'quantity': MAX_CART_QUANTITY})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], MAX_CART_QUANTITY)
+
+        Cart.objects.create(user=self.customer, menu_item=other_menu_item, quantity=MAX_CART_QUANTITY - 1)
+        response = self.client.patch(self.cart_item_url(other_menu_item), {'increment': MAX_CART_QUANTITY})
+        self.assertEqual(response.data['quantity'], MAX_CART_QUANTITY)
+
+        # databases without upserts.
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            Cart.objects.add_quantities(self.customer, {menu_item.pk: 1, other_menu_item.pk: 2 * MAX_CART_QUANTITY})
+        self.assertEqual(self.get_quantities(), dict.fromkeys([menu_item.pk, other_menu_item.pk], MAX_CART_QUANTITY))
+
+    def test_clear_carts_with_single_delete(self):
+        for menu_item in self.menu_items:
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+        Cart.objects.create(user=self.manager, menu_item=self.menu_items[0], quantity=1)
+
+        response = self.client.delete(self.cart_item_url(self.menu_items[0]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.delete(self.cart_item_url(self.menu_items[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.carts_url)
+        self.assertEqual(response.data, {'deleted': 4})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE')]), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_carts_are_deleted_without_signals(self):
+        for menu_item in self.menu_items[:2]:
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Cart)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Cart)
+
+        self.assertEqual(Cart.objects.filter(menu_item=self.menu_items[0]).delete_carts(send_signals=False), 1)
+        receiver.assert_not_called()
+        self.assertEqual(Cart.objects.all().delete_carts(), 1)
+        receiver.assert_called_once()
+
+    @override_settings(RESTAURANT_CART_DELETE_SIGNALS=False)
+    def test_cart_delete_signals_setting_is_read_by_views(self):
+        Cart.objects.create(user=self.customer, menu_item=self.menu_items[0], quantity=1)
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Cart)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Cart)
+
+        response = self.client.delete(self.carts_url)
+        self.assertEqual(response.data, {'deleted': 1})
+        receiver.assert_not_called()
+
+    def test_clear_stale_carts_command(self):
+        for menu_item in self.menu_items:
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+        stale_time = timezone.now() - timedelta(days=31)
+        Cart.objects.filter(menu_item__in=self.menu_items[:3]).update(last_modified=stale_time)
+        self.client.patch(self.cart_item_url(self.menu_items[0]), {'increment': 1})
+
+        stdout = io.StringIO()
+        call_command('clear_stale_carts', days=30, batch_size=1, stdout=stdout)
+        self.assertIn('2 stale carts are deleted', stdout.getvalue())
+        self.assertEqual(set(self.get_quantities()),
+                         {menu_item.pk for menu_item in (self.menu_items[0], *self.menu_items[3:])})
+
+    @override_settings(RESTAURANT_CART_DELETE_SIGNALS=False)
+    def test_cart_delete_signals_setting_is_read_by_clear_stale_carts(self):
+        Cart.objects.create(user=self.customer, menu_item=self.menu_items[0], quantity=1)
+        Cart.objects.update(last_modified=timezone.now() - timedelta(days=31))
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Cart)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Cart)
+
+        call_command('clear_stale_carts', days=30, stdout=io.StringIO())
+        self.assertFalse(Cart.objects.exists())
+        receiver.assert_not_called()
+
+
+class FastReadSerializerTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i, menu_items in enumerate((self.menu_items[:2], self.menu_items[1:4])):
+            order = Order.objects.create(user=self.customer, total_price=Decimal(f'{i}.25'),
+                                         delivery_crew=self.crew if i else None, status=bool(i))
+            for menu_item in menu_items:
+                OrderItem.objects.create(order=order, menu_item=menu_item, unit_price=menu_item.price, quantity=i + 1)
+
+    def assertSameJSON(self, fast_serializer_class, serializer_class, instances):
+        expected = JSONRenderer().render(serializer_class(instances, many=True).data)
+        self.assertEqual(JSONRenderer().render(fast_serializer_class(instances, many=True).data), expected)
+        self.assertEqual(JSONRenderer().render(fast_serializer_class(instances[0]).data),
+                         JSONRenderer().render(serializer_class(instances[0]).data))
+
+    def test_menu_items_are_serialized_the_same(self):
+        self.menu_items[0].category = None
+        self.menu_items[0].save()
+        self.assertSameJSON(FastMenuItemSerializer, MenuItemSerializer, list(MenuItem.objects.order_by('pk')))
+
+    def test_orders_are_serialized_the_same(self):
+        orders = list(Order.objects.select_related('user', 'delivery_crew').order_by('pk'))
+        self.assertSameJSON(FastOrderSerializer, OrderSerializer, orders)
+
+    def test_viewsets_can_turn_off_fast_serializers(self):
+        client = self.get_client(self.manager)
+        urls = (reverse_lazy('restaurant:orders-list'), reverse_lazy('restaurant:menu-items-list'),
+                reverse_lazy('restaurant:orders-detail', kwargs={'id': Order.objects.first().pk}))
+        fast_responses = [client.get(url).content for url in urls]
+
+        cache.clear()
+        with mock.patch.object(OrderViewSet, 'fast_read_serializer_class', None), \
+                mock.patch.object(MenuItemViewSet, 'fast_read_serializer_class', None):
+            self.assertEqual([client.get(url).content for url in urls], fast_responses)
+
+
+class MenuItemURLTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_url_templates()
+
+    def reverse(self, menu_item: MenuItem) -> str:
+        return reverse('restaurant:menu-item-detail', kwargs={'slug': menu_item.slug, 'pk': menu_item.pk})
+
+    def test_urls_are_the_same_as_reverse(self):
+        with mock.patch('BookList.urlbuilder.reverse', wraps=reverse) as reverse_mock:
+            urls = [menu_item.get_absolute_url() for menu_item in self.menu_items]
+        self.assertEqual(urls, [self.reverse(menu_item) for menu_item in self.menu_items])
+        self.assertEqual(reverse_mock.call_count, 1)
+
+    def test_script_prefix_of_urls(self):
+        set_script_prefix('/api/')
+        try:
+            self.assertEqual(self.menu_items[0].get_absolute_url(), self.reverse(self.menu_items[0]))
+            self.assertTrue(self.menu_items[0].get_absolute_url().startswith('/api/'))
+        finally:
+            set_script_prefix('/')
+        self.assertEqual(self.menu_items[0].get_absolute_url(), self.reverse(self.menu_items[0]))
+
+    def test_invalid_values_are_passed_to_reverse(self):
+        with self.assertRaises(NoReverseMatch):
+            menu_item_url(slug='', pk=1)
+        with self.assertRaises(NoReverseMatch):
+            menu_item_url(slug='pizza', pk=-1)
+
+    def test_templates_are_cleared_when_urlconf_changes(self):
+        self.menu_items[0].get_absolute_url()
+        self.assertEqual(get_url_template.cache_info().currsize, 1)
+        with override_settings(FORCE_SCRIPT_NAME='/api/'):
+            self.assertEqual(get_url_template.cache_info().currsize, 0)
+
+
+class AsyncViewsTest(RestaurantTestCase):
+    """ async routes respond the same as their viewsets, which are used by patching get() to delegate."""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(async_routes())
+        for i, menu_items in enumerate((self.menu_items[:2], self.menu_items[1:4])):
+            order = Order.objects.create(user=self.customer, total_price=Decimal(f'{i}.25'),
+                                         delivery_crew=self.crew if i else None, status=bool(i))
+            for menu_item in menu_items:
+                OrderItem.objects.create(order=order, menu_item=menu_item, unit_price=menu_item.price, quantity=i + 1)
+
+    def get_headers(self, user: Optional[User]) -> dict:
+        if user is None:
+            return {}
+        token, _ = Token.objects.get_or_create(user=user)
+        return {'Authorization': f'Token {token.key}'}
+
+    def get_responses(self, url: str, user: Optional[User] = None, **headers) -> list:
+        responses = []
+        for get in (AsyncViewSetView.get, AsyncViewSetView.delegate):
+            cache.clear()
+            with mock.patch.object(AsyncViewSetView, 'get', get):
+                response = self.client.get(url, headers={**self.get_headers(user), **headers})
+            responses.append((response.status_code, response.content, response.get('WWW-Authenticate'),
+                              response.get('Content-Type'), response.get('Allow'), response.get('Vary')))
+        return responses
+
+    def assertSameResponses(self, url: str, user: Optional[User] = None, **headers):
+        async_response, sync_response = self.get_responses(url, user, **headers)
+        self.assertEqual(async_response, sync_response)
+
+    def test_responses_are_the_same_as_viewsets(self):
+        menu_items_url = reverse('restaurant:menu-items-list')
+        first_page = self.client.get(f'{menu_items_url}?page_size=2', headers=self.get_headers(self.customer)).json()
+        order = Order.objects.first()
+        urls = (
+            menu_items_url,
+            f'{menu_items_url}?page_size=2&ordering=-price',
+            first_page['next'],
+            reverse('restaurant:menu-items-detail', kwargs={'pk': self.menu_items[0].pk}),
+            reverse('restaurant:menu-items-detail', kwargs={'pk': 1000}),
+            reverse('restaurant:menu-items-detail', kwargs={'pk': 'first'}),
+            reverse('restaurant:categories-list'),
+            f'{reverse("restaurant:categories-list")}?limit=1&offset=1',
+            reverse('restaurant:orders-list'),
+        )
+        for user in (None, self.manager, self.crew, self.customer):
+            for url in urls:
+                with self.subTest(user=user, url=url):
+                    self.assertSameResponses(url, user)
+
+        order.delivery_crew = None
+        order.save()
+        self.assertSameResponses(reverse('restaurant:orders-list'), self.crew)
+
+    def test_authentication_errors(self):
+        url = reverse('restaurant:menu-items-list')
+        for authorization in ('Token', 'Token invalid', 'Token a b'):
+            with self.subTest(authorization=authorization):
+                response = self.client.get(url, headers={'Authorization': authorization})
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+                self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    async def test_json_requests_are_not_delegated(self):
+        token = await Token.objects.acreate(user=self.manager)
+        headers = {'Authorization': f'Token {token.key}'}
+        with mock.patch.object(AsyncViewSetView, 'delegate', side_effect=AssertionError):
+            response = await self.async_client.get(reverse('restaurant:orders-list'), headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.json()['results']), 2)
+            # queries which are executed in threads of the async ORM are measured.
+            self.assertIn('desc="4 queries"', response['Server-Timing'])
+
+            response = await self.async_client.get(reverse('restaurant:menu-items-list'), headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['ETag'], (await self.async_client.get(
+                reverse('restaurant:menu-items-list'), headers=headers))['ETag'])
+
+    def test_other_requests_are_delegated(self):
+        delegated_methods = []
+        delegate = AsyncViewSetView.delegate
+
+        async def record_delegate(view, request, *args, **kwargs):
+            delegated_methods.append(request.method)
+            return await delegate(view, request, *args, **kwargs)
+
+        client = self.get_client(self.manager)
+        with mock.patch.object(AsyncViewSetView, 'delegate', record_delegate):
+            response = client.get(reverse('restaurant:menu-items-list'), {'format': 'xml'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response['Content-Type'].startswith('application/xml'))
+
+            data = {'title': 'new item', 'price': '2.00', 'featured': True, 'category': self.category.pk}
+            response = client.post(reverse('restaurant:menu-items-list'), data)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(delegated_methods, ['GET', 'POST'])
+
+    def test_async_views_are_turned_off_by_default(self):
+        url = reverse('restaurant:orders-list')
+        self.assertEqual(getattr(resolve(url).func, 'view_class', None), async_views.OrderListView)
+        with async_routes(enabled=False):
+            self.assertIsNone(getattr(resolve(url).func, 'view_class', None))
+
+
+class OrderChangeFeedTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(async_routes())
+        self.other_crew = User.objects.create_user(username='other crew', password='crew pass')
+        self.other_crew.groups.add(self.delivery_crew_group)
+        self.other_customer = User.objects.create_user(username='other customer', password='customer pass')
+        self.order = Order.objects.create(user=self.customer, total_price=Decimal('1.50'))
+        self.other_order = Order.objects.create(user=self.other_customer, total_price=Decimal('2.50'),
+                                                delivery_crew=self.other_crew)
+
+    def change_order(self, order: Order, **data):
+        url = reverse('restaurant:orders-detail', kwargs={'id': order.pk})
+        response = self.get_client(self.manager).put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def get_changes(self, user: User, **params) -> dict:
+        response = self.get_client(user).get(reverse('restaurant:orders-changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_changes_of_status_and_delivery_crew_are_recorded(self):
+        self.change_order(self.order, delivery_crew=self.crew.pk)
+        self.change_order(self.order, status=True)
+        self.change_order(self.order, status=True, total_price='3.00')
+        response = self.get_client(self.crew).patch(
+            reverse('restaurant:orders-detail', kwargs={'id': self.order.pk}), {'status': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(list(self.order.changes.order_by('id').values_list('status', 'delivery_crew')),
+                         [(False, self.crew.pk), (True, self.crew.pk), (False, self.crew.pk)])
+
+    def test_changes_are_scoped_by_role(self):
+        cursor = self.get_changes(self.customer)['cursor']
+        self.change_order(self.order, delivery_crew=self.crew.pk)
+        self.change_order(self.other_order, delivery_crew=self.crew.pk)
+        self.change_order(self.other_order, status=True)
+
+        def get_changed_orders(user: User) -> list:
+            return [(change['order'], change['status']) for change in self.get_changes(user, since=cursor)['changes']]
+
+        self.assertEqual(get_changed_orders(self.manager),
+                         [(self.order.pk, False), (self.other_order.pk, False), (self.other_order.pk, True)])
+        self.assertEqual(get_changed_orders(self.crew),
+                         [(self.order.pk, False), (self.other_order.pk, False), (self.other_order.pk, True)])
+        # other crew sees that it is unassigned from the order.
+        self.assertEqual(get_changed_orders(self.other_crew), [(self.other_order.pk, False)])
+        self.assertEqual(get_changed_orders(self.customer), [(self.order.pk, False)])
+        self.assertEqual(get_changed_orders(self.other_customer),
+                         [(self.other_order.pk, False), (self.other_order.pk, True)])
+
+    def test_changes_after_cursor(self):
+        data = self.get_changes(self.customer)
+        self.assertEqual(data, {'cursor': '0', 'has_more': False, 'changes': []})
+
+        self.change_order(self.order, status=True)
+        self.change_order(self.order, status=False)
+        with mock.patch.object(OrderViewSet, 'changes_page_size', 1):
+            first_page = self.get_changes(self.customer, since=data['cursor'])
+            second_page = self.get_changes(self.customer, since=first_page['cursor'])
+        self.assertTrue(first_page['has_more'])
+        self.assertEqual([change['status'] for change in first_page['changes']], [True])
+        self.assertFalse(second_page['has_more'])
+        self.assertEqual([change['status'] for change in second_page['changes']], [False])
+        self.assertEqual(self.get_changes(self.customer, since=second_page['cursor'])['changes'], [])
+
+        response = self.get_client(self.customer).get(reverse('restaurant:orders-changes'), {'since': 'last'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_long_poll_waits_for_changes(self):
+        with mock.patch.object(OrderViewSet, 'changes_poll_interval', 0.01):
+            start = time.monotonic()
+            data = self.get_changes(self.customer, since=0, wait=0.05)
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+            self.assertEqual(data, {'cursor': '0', 'has_more': False, 'changes': []})
+
+        # the sync view does not hold a worker thread to wait.
+        with mock.patch.object(AsyncViewSetView, 'get', AsyncViewSetView.delegate):
+            start = time.monotonic()
+            self.assertEqual(self.get_changes(self.customer, since=0, wait=5), data)
+            self.assertLess(time.monotonic() - start, 5)
+
+    def test_long_poll_queries_changes_again_after_an_interval(self):
+        # the version of changes is not bumped, as transactions of tests are not committed.
+        with mock.patch.object(OrderViewSet, 'changes_poll_interval', 0.01), \
+                mock.patch.object(OrderViewSet, 'changes_requery_interval', 0.12), \
+                mock.patch.object(OrderViewSet, 'get_changes_queryset', autospec=True,
+                                  side_effect=OrderViewSet.get_changes_queryset) as get_changes_queryset:
+            self.get_changes(self.customer, since=0, wait=0.2)
+        self.assertEqual(get_changes_queryset.call_count, 2)
+
+        view, now = OrderViewSet(), time.monotonic()
+        self.assertTrue(view.should_query_changes(1, 2, now))
+        self.assertFalse(view.should_query_changes(1, 1, now))
+        self.assertTrue(view.should_query_changes(1, 1, now - view.changes_requery_interval))
+
+    async def get_events(self, url: str, **headers) -> Tuple[HttpResponse, List[str]]:
+        response = await self.async_client.get(url, headers=headers)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        return response, content.split('\n\n')
+
+    def test_stream_of_changes(self):
+        self.change_order(self.order, status=True)
+        self.change_order(self.order, status=False)
+        first_change, second_change = self.order.changes.order_by('id')
+        url = reverse('restaurant:orders-changes-stream')
+        token, _ = Token.objects.get_or_create(user=self.customer)
+        headers = {'Accept': 'text/event-stream', 'Last-Event-ID': str(first_change.id),
+                   'Authorization': f'Token {token.key}'}
+
+        with mock.patch.object(OrderViewSet, 'stream_timeout', 0):
+            async_response, async_events = async_to_sync(self.get_events)(url, **headers)
+            with mock.patch.object(AsyncViewSetView, 'get', AsyncViewSetView.delegate):
+                response = self.client.get(url, headers=headers)
+                events = b''.join(response.streaming_content).decode().split('\n\n')
+
+        self.assertEqual(events[1:], async_events[1:])
+        self.assertEqual(response['Content-Type'], async_response['Content-Type'])
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual((events[0], async_events[0]), ('retry: 30000', 'retry: 1000'))
+        event_id, event, data = events[1].split('\n')
+        self.assertEqual((event_id, event), (f'id: {second_change.id}', 'event: order-change'))
+        self.assertEqual(json.loads(data.removeprefix('data: '))['status'], False)
+        self.assertEqual(events[2:], [''])
+
+        response = self.client.get(url, headers={'Accept': 'text/event-stream'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DeliveryCrewAssignmentTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_crew = User.objects.create_user(username='other crew', password='crew pass')
+        self.other_crew.groups.add(self.delivery_crew_group)
+        # crew has one open order and other crew has only delivered orders.
+        Order.objects.create(user=self.customer, total_price=Decimal('1.50'), delivery_crew=self.crew)
+        Order.objects.create(user=self.customer, total_price=Decimal('1.50'), delivery_crew=self.other_crew,
+                             status=True)
+        self.assign_url = reverse('restaurant:orders-assign')
+
+    def create_orders(self, count: int) -> List[Order]:
+        return [Order.objects.create(user=self.customer, total_price=Decimal('1.50')) for _ in range(count)]
+
+    def test_orders_are_assigned_to_least_loaded_crew(self):
+        orders = self.create_orders(3)
+        assigned_orders = assign_orders()
+
+        self.assertEqual([order.pk for order in assigned_orders], [order.pk for order in orders])
+        crew_ids = dict(Order.objects.values_list('pk', 'delivery_crew'))
+        self.assertEqual([crew_ids[order.pk] for order in orders],
+                         [self.other_crew.pk, self.crew.pk, self.other_crew.pk])
+        self.assertEqual(OrderChange.objects.filter(previous_delivery_crew=None).count(), 3)
+
+    def test_limit_and_max_load(self):
+        self.create_orders(4)
+        self.assertEqual(len(assign_orders(limit=1)), 1)
+        self.assertEqual(len(assign_orders(max_load=2)), 2)
+        self.assertEqual(Order.objects.filter(delivery_crew=None).count(), 1)
+        self.assertEqual(assign_orders(max_load=2), [])
+
+    def test_queries_do_not_depend_on_number_of_orders(self):
+        query_counts = []
+        for count in (1, 5):
+            self.create_orders(count)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(assign_orders()), count)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_assign_endpoint(self):
+        order, = self.create_orders(1)
+        response = self.get_client(self.manager).post(self.assign_url, {'limit': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data,
+                         {'assigned': 1, 'orders': [{'id': order.pk, 'delivery_crew': self.other_crew.pk}]})
+
+        response = self.get_client(self.manager).post(self.assign_url, {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get_client(self.crew).post(self.assign_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_orders_are_assigned_after_checkout(self):
+        Cart.objects.create(user=self.customer, menu_item=self.menu_items[0], quantity=1)
+        self.get_client(self.customer).post(reverse('restaurant:orders-list'))
+        self.assertTrue(Order.objects.filter(delivery_crew=None).exists())
+
+        call_command('run_jobs', processes=0, once=True, stdout=io.StringIO())
+        self.assertFalse(Order.objects.filter(delivery_crew=None).exists())
+
+        self.create_orders(2)
+        stdout = io.StringIO()
+        call_command('assign_delivery_crew', limit=1, stdout=stdout)
+        self.assertIn('1 orders are assigned', stdout.getvalue())
+
+    def test_assignments_of_checkouts_are_coalesced(self):
+        client = self.get_client(self.customer)
+        for menu_item in self.menu_items[:2]:
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+            client.post(reverse('restaurant:orders-list'))
+        self.assertEqual(Job.objects.filter(name=assign_delivery_crew.name).count(), 1)
+
+        self.assertEqual(Worker(processes=0).run(once=True), {Job.DONE: 3})
+        self.assertFalse(Order.objects.filter(delivery_crew=None).exists())
+
+        # orders of checkouts after the job starts are assigned by another job.
+        Cart.objects.create(user=self.customer, menu_item=self.menu_items[0], quantity=1)
+        client.post(reverse('restaurant:orders-list'))
+        self.assertEqual(Job.objects.filter(name=assign_delivery_crew.name, status=Job.PENDING).count(), 1)
+
+
+class CachedTokenAuthenticationTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.customer)
+        self.orders_url = reverse('restaurant:orders-list')
+
+    def get_token_queries(self) -> List[str]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.orders_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'authtoken_token' in query['sql']]
+
+    def test_tokens_are_read_from_cache(self):
+        self.assertEqual(len(self.get_token_queries()), 1)
+        self.assertEqual(self.get_token_queries(), [])
+
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.customer.auth_token.key)
+        self.assertEqual((user.pk, user.username, token.key),
+                         (self.customer.pk, 'customer', self.customer.auth_token.key))
+        # password of cached users is loaded from the database when it is needed.
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertTrue(user.check_password('customer pass'))
+
+    def test_logout_removes_token_from_cache(self):
+        self.get_token_queries()
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(self.orders_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_users_are_removed_from_cache(self):
+        self.get_token_queries()
+        self.customer.is_active = False
+        self.customer.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get(self.orders_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def get_caches(self, **caches) -> dict:
+        return {'default': settings.CACHES['default'], **caches}
+
+    def test_tokens_are_not_cached_in_local_memory(self):
+        tokens_cache = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tokens'}
+        with self.settings(CACHES=self.get_caches(tokens=tokens_cache), AUTH_TOKEN_CACHE_ALIAS='tokens'):
+            self.assertEqual(len(self.get_token_queries()), 1)
+            self.assertEqual(len(self.get_token_queries()), 1)
+
+    def test_tokens_are_invalidated_in_the_configured_cache(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        tokens_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location.name}
+        cache_key = get_token_cache_key(self.customer.auth_token.key)
+
+        with self.settings(CACHES=self.get_caches(tokens=tokens_cache), AUTH_TOKEN_CACHE_ALIAS='tokens'):
+            self.get_token_queries()
+            self.assertIsNotNone(caches['tokens'].get(cache_key))
+            self.assertIsNone(caches['default'].get(cache_key))
+
+            self.customer.is_active = False
+            self.customer.save(update_fields=['is_active'])
+            self.assertIsNone(caches['tokens'].get(cache_key))
+            self.assertEqual(self.client.get(self.orders_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(RestaurantTestCase):
+    """ replica is a separate database in tests, which has only one category."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(async_routes())
+        Category.objects.using('replica').create(title='Replica Course')
+        self.categories_url = reverse('restaurant:categories-list')
+
+    def make_catalog_old(self):
+        get_catalog_version()
+        cache.set(CATALOG_LAST_MODIFIED_CACHE_KEY, int(time.time()) - 60, None)
+
+    def get_category_titles(self, user: User) -> List[List[str]]:
+        """ :return: titles of categories which are read by the async view and by the viewset."""
+        client = self.get_client(user)
+        titles = []
+        # limits are different, so the second response is not read from the cache.
+        for limit, get in enumerate((AsyncViewSetView.get, AsyncViewSetView.delegate), start=10):
+            with mock.patch.object(AsyncViewSetView, 'get', get):
+                response = client.get(self.categories_url, {'limit': limit})
+            titles.append([category['title'] for category in response.json()['results']])
+        return titles
+
+    def test_catalog_is_read_from_replicas(self):
+        self.make_catalog_old()
+        self.assertEqual(self.get_category_titles(self.customer), [['Replica Course']] * 2)
+
+    def test_recently_changed_catalog_is_read_from_primary(self):
+        # responses of this version of catalog are cached, so they are not read from replicas which lag behind.
+        self.assertEqual(self.get_category_titles(self.customer), [['Main Course']] * 2)
+
+    def test_reads_stick_to_primary_after_writes(self):
+        self.make_catalog_old()
+        response = self.get_client(self.customer).post(reverse('restaurant:cart-items'),
+                                                       {'menu_item': self.menu_items[0].pk, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.get_category_titles(self.customer), [['Main Course']] * 2)
+        self.assertEqual(self.get_category_titles(self.manager), [['Replica Course']] * 2)
+
+
+class KeysetPaginationTest(RestaurantTestCase):
+
+    def test_orders_are_paginated_newest_first(self):
+        orders = [Order.objects.create(user=self.customer, total_price=Decimal('10.00')) for _ in range(8)]
+        client = self.get_client(self.customer)
+
+        response = client.get(reverse_lazy('restaurant:orders-list'), {'page_size': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.json()
+        self.assertEqual([order['id'] for order in first_page['results']],
+                         [order.pk for order in reversed(orders)][:5])
+
+        second_page = client.get(first_page['next']).json()
+        self.assertEqual([order['id'] for order in second_page['results']],
+                         [order.pk for order in reversed(orders)][5:])
+        self.assertIsNone(second_page['next'])
+
+    def test_menu_items_can_be_ordered_by_price(self):
+        client = self.get_client(self.customer)
+        url = reverse_lazy('restaurant:menu-items-list')
+
+        first_page = client.get(url, {'ordering': '-price', 'page_size': 3}).json()
+        second_page = client.get(first_page['next']).json()
+        prices = [item['price'] for item in first_page['results'] + second_page['results']]
+        self.assertEqual(prices, ['5.50', '4.50', '3.50', '2.50', '1.50'])
+
+
+class MenuItemSearchTest(RestaurantTestCase):
+
+    def test_menu_items_are_searched_by_title_and_category(self):
+        MenuItem.objects.create(title='Greek Salad', price=Decimal('7.00'), featured=True)
+        client = self.get_client(self.customer)
+        url = reverse_lazy('restaurant:menu-items-list')
+
+        response = client.get(url, {'search': 'gree sal'})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Greek Salad'])
+        response = client.get(url, {'search': 'main', 'page_size': 10})
+        self.assertEqual(len(response.json()['results']), len(self.menu_items))
+
+    def test_search_results_are_ordered_by_rank(self):
+        MenuItem.objects.create(title='Soup of the day with bread and butter', price=Decimal('4.00'),
+                                featured=False, category=self.category)
+        MenuItem.objects.create(title='Soup', price=Decimal('3.00'), featured=False, category=self.category)
+
+        response = self.get_client(self.customer).get(reverse('restaurant:menu-items-list'), {'search': 'soup'})
+        self.assertEqual([item['title'] for item in response.json()['results']],
+                         ['Soup', 'Soup of the day with bread and butter'])
+
+    async def test_async_view_searches_without_warmed_backend(self):
+        await MenuItem.objects.acreate(title='Greek Salad', price=Decimal('7.00'), featured=True)
+        token = await Token.objects.acreate(user=self.customer)
+        # support of FTS5 is read by the first search of each database, with a query which is over the budget.
+        sqlite_supports_fts5.cache_clear()
+        with async_routes(), self.settings(QUERY_BUDGET_RAISE=False):
+            response = await self.async_client.get(reverse('restaurant:menu-items-list'), {'search': 'greek'},
+                                                   headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Greek Salad'])
+
+
+class MenuItemBulkTest(RestaurantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bulk_url = reverse_lazy('restaurant:menu-items-bulk')
+        self.client = self.get_client(self.manager)
+
+    def test_json_rows_are_created_and_updated(self):
+        rows = [
+            {'title': f'New Item {i}', 'price': '3.999', 'featured': False, 'category_id': self.category.pk}
+            for i in range(50)
+        ]
+        rows.append({'id': self.menu_items[0].pk, 'title': 'Renamed Item', 'price': '9.00'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.bulk_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'created': 50, 'updated': 1})
+        self.assertLess(len(queries), 20)
+
+        new_item = MenuItem.objects.get(title='New Item 7')
+        self.assertEqual((new_item.slug, new_item.price, new_item.category_id),
+                         ('new-item-7', Decimal('3.99'), self.category.pk))
+        renamed_item = MenuItem.objects.get(pk=self.menu_items[0].pk)
+        self.assertEqual((renamed_item.slug, renamed_item.price, renamed_item.featured),
+                         ('renamed-item', Decimal('9.00'), False))
+
+    def test_csv_rows(self):
+        content = (f'id,title,price,featured,category_id\n'
+                   f',Greek Salad,7.50,true,{self.category.pk}\n'
+                   f'{self.menu_items[1].pk},,1.25,,\n')
+        response = self.client.generic('POST', self.bulk_url, content, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1})
+        self.assertTrue(MenuItem.objects.filter(slug='greek-salad', featured=True).exists())
+        self.assertEqual(MenuItem.objects.get(pk=self.menu_items[1].pk).price, Decimal('1.25'))
+
+    def test_invalid_rows_are_rejected(self):
+        rows = [
+            {'title': 'Valid', 'price': '1.00', 'featured': True},
+            {'title': 'Unknown Category', 'price': '1.00', 'featured': True, 'category_id': 0},
+            {'title': 'Without Price', 'featured': True},
+        ]
+        response = self.client.post(self.bulk_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(MenuItem.objects.filter(title='Valid').exists())
+
+    def test_only_managers_can_import(self):
+        response = self.get_client(self.customer).post(self.bulk_url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryBudgetTest(RestaurantTestCase):
+
+    def test_normalized_sql_does_not_depend_on_parameters(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a'  LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'b' LIMIT 1"),
+        )
+
+    def test_request_over_budget_of_view_fails(self):
+        client = self.get_client(self.customer)
+        with mock.patch.object(OrderViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                client.get(reverse_lazy('restaurant:orders-list'))
+
+    def test_repeated_queries_are_detected_as_n_plus_one(self):
+        with self.assertRaisesRegex(AssertionError, 'N\\+1 pattern, executed 5 times'):
+            with self.assertQueryBudget():
+                for menu_item in self.menu_items:
+                    MenuItem.objects.get(pk=menu_item.pk)
+
+    def test_cart_list_queries_do_not_grow_with_carts(self):
+        for menu_item in self.menu_items:
+            Cart.objects.create(user=self.customer, menu_item=menu_item, quantity=1)
+        client = self.get_client(self.customer)
+
+        with self.assertQueryBudget(2):
+            response = client.get(reverse_lazy('restaurant:cart-items'))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]['menu_item_info']['title'], 'item 0')
+
+    def test_delivery_crew_is_validated_with_cached_group_names(self):
+        order = Order.objects.create(user=self.customer, total_price=Decimal('1.50'))
+        client = self.get_client(self.manager)
+        url = reverse_lazy('restaurant:orders-detail', kwargs={'id': order.pk})
+
+        response = client.put(url, {'delivery_crew': self.customer.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = client.put(url, {'delivery_crew': self.crew.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_crew, self.crew)
+
+
+class PopulateDBCommandTest(APITestCase):
+
+    def test_populate_db_with_scale_parameters(self):
+        call_command('populate_db', users=14, items=12, orders=30, batch_size=7, seed=1, stdout=io.StringIO())
+
+        self.assertEqual(User.objects.count(), 14)
+        self.assertEqual(User.objects.filter(groups__name='manager').count(), 2)
+        self.assertEqual(User.objects.filter(groups__name='delivery_crew').count(), 4)
+        self.assertEqual(MenuItem.objects.count(), 12)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertTrue(Cart.objects.exists())
+        for order in Order.objects.all()[:5]:
+            self.assertEqual(order.order_items.total(), order.total_price)
+        self.assertTrue(User.objects.first().check_password('password123'))
+
+    def test_populate_db_again(self):
+        for _ in range(2):
+            call_command('populate_db', users=7, items=2, orders=2, seed=1, stdout=io.StringIO())
+        self.assertEqual(User.objects.count(), 14)
+
+
+class BenchmarkCommandTest(APITestCase):
+
+    def test_in_process_benchmark_of_all_scenarios(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark', use_current_db=True, iterations=2, warmup=1, users=14, items=6, orders=10,
+                         books=5, ratings=20, output=output, stdout=io.StringIO())
+            with open(output) as file:
+                results = json.load(file)
+
+            # comparing with the same results does not find any regression.
+            call_command('benchmark', use_current_db=True, iterations=1, warmup=0, users=0, items=0, orders=0,
+                         books=0, ratings=0, scenarios=['categories-list'], compare=output, max_regression=1000,
+                         stdout=io.StringIO())
+
+        self.assertEqual(results['mode'], 'in-process')
+        self.assertIn('order-checkout', results['scenarios'])
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertEqual(summary['requests'], 2)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+
+
+class SQLiteTransactionModeTest(TransactionTestCase):
+    """ concurrent transactions of workers of the http benchmark (e.g. checkouts) on the sqlite database."""
+
+    def read_then_write(self, errors: list):
+        try:
+            with transaction.atomic():
+                count = Category.objects.count()
+                time.sleep(0.2)
+                Category.objects.create(title=f'category {count}')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_transactions_which_read_then_write_do_not_fail(self):
+        errors = []
+        threads = [threading.Thread(target=self.read_then_write, args=(errors, )) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(Category.objects.values_list('title', flat=True)), ['category 0', 'category 1'])
@@ -1,6 +1,8 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, URLPattern
 from rest_framework.routers import DefaultRouter
 from restaurant.views import *
+from restaurant import async_views
 
 app_name = 'restaurant'
 
@@ -54,4 +56,21 @@ default_router = DefaultRouter(trailing_slash=False)
 default_router.register('menu-items', MenuItemViewSet, basename='menu-items', )
 default_router.register('orders', OrderViewSet, basename='orders', )
 default_router.register('categories', CategoryViewSet, basename='categories', )
-urlpatterns += default_router.urls
+
+# read-heavy and long-poll routes of the router which are served by async views if RESTAURANT_ASYNC_VIEWS is True,
+# so they do not hold a thread under ASGI.
+# remove a route to serve it by its viewset.
+ASYNC_ROUTES = {
+    'menu-items-list': async_views.MenuItemListView,
+    'menu-items-detail': async_views.MenuItemDetailView,
+    'categories-list': async_views.CategoryListView,
+    'orders-list': async_views.OrderListView,
+    'orders-changes': async_views.OrderChangesView,
+    'orders-changes-stream': async_views.OrderChangeStreamView,
+}
+
+urlpatterns += [
+    URLPattern(url.pattern, ASYNC_ROUTES[url.name].as_view(), url.default_args, url.name)
+    if settings.RESTAURANT_ASYNC_VIEWS and url.name in ASYNC_ROUTES else url
+    for url in default_router.urls
+]
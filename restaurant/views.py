@@ -1,43 +1,54 @@
+import time
 from typing import *
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, QuerySet, Prefetch
 from django.shortcuts import get_object_or_404
-from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.http import Http404, HttpRequest, HttpResponse, StreamingHttpResponse
 
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import JSONParser
+from rest_framework_csv.parsers import CSVParser
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.viewsets import ModelViewSet, ViewSet, GenericViewSet
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.settings import api_settings
 
 
+from BookList.authentication import CachedTokenAuthentication, StatelessJWTAuthentication
+from BookList.fastserializers import FastReadSerializerMixin
+from BookList.routers import ReplicaReadMixin
+from BookList.search import FullTextSearchFilter
 from restaurant.models import *
 from restaurant.serializers import *
 from restaurant.permissions import *
 from restaurant.serializers import validate_two_decimal_places
+from restaurant.assignment import assign_orders
+from restaurant.caches import get_order_changes_version, get_user_group_names
+from restaurant.mixins import CatalogCacheMixin
+from restaurant.renderers import EventStreamRenderer, format_event
+from restaurant.tasks import ASSIGN_DELIVERY_CREW_KEY, assign_delivery_crew, send_order_confirmation
+from restaurant.pagination import OrderKeysetPagination, MenuItemKeysetPagination, UserKeysetPagination
 # Create your views here.
 
 
-def _get_user_group_names(user: User) -> List[str]:
-    """
-    :returns: List of names of all groups of given user object.
-    """
-    return [group.name for group in user.groups.all()]
-
-
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, CatalogCacheMixin, ModelViewSet):
 
     serializer_class = CategorySerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, StatelessJWTAuthentication)
+    query_budget = {'list': 4, 'retrieve': 4}
+    replica_actions = ('list', 'retrieve')
 
-    def initialize_request(self, request, *args, **kwargs):
+    def perform_authentication(self, request):
         # add list of group_names of current user to the request object.
-        request = super().initialize_request(request, *args, **kwargs)
-        request.user.group_names = _get_user_group_names(request.user)
-        return request
+        super().perform_authentication(request)
+        request.user.group_names = get_user_group_names(request.user)
 
     def get_permissions(self):
         manager_actions = ['list', 'retrieve', 'update', 'partial_update', 'destroy', 'create', 'options']
@@ -57,20 +68,53 @@ class CategoryViewSet(ModelViewSet):
             return base_query_set
 
 
-class MenuItemViewSet(ModelViewSet):
+class MenuItemViewSet(ReplicaReadMixin, CatalogCacheMixin, FastReadSerializerMixin, ModelViewSet):
     queryset = MenuItem.objects.select_related('category').all()
     serializer_class = MenuItemSerializer
-    authentication_classes = (TokenAuthentication, )
-
-    def initialize_request(self, request, *args, **kwargs):
+    fast_read_serializer_class = FastMenuItemSerializer
+    authentication_classes = (CachedTokenAuthentication, StatelessJWTAuthentication)
+    pagination_class = MenuItemKeysetPagination
+    # results of searches are ordered by their rank, which keyset cursors can not follow.
+    search_pagination_class = LimitOffsetPagination
+    filter_backends = (FullTextSearchFilter, OrderingFilter, )
+    ordering_fields = ('id', 'price')
+    # searches count their results.
+    query_budget = {'list': 4, 'retrieve': 3, 'create': 6, 'update': 6, 'partial_update': 6, 'destroy': 7}
+    replica_actions = ('list', 'retrieve')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and FullTextSearchFilter().get_search_term(self.request, self):
+            self._paginator = self.search_pagination_class()
+        return super().paginator
+
+    def perform_authentication(self, request):
 
         # add list of group_names of current user to the request object.
-        request = super().initialize_request(request, *args, **kwargs)
-        request.user.group_names = _get_user_group_names(request.user)
-        return request
+        super().perform_authentication(request)
+        request.user.group_names = get_user_group_names(request.user)
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=(JSONParser, CSVParser))
+    def bulk(self, request: Request) -> Response:
+        """
+        Creates or updates many menu items from a json list or csv rows in one request.
+        rows with id update existing menu items and other rows create new ones.
+        :return: Response 200 with number of created and updated menu items, or 400 with errors of rows.
+        """
+        rows = request.data
+        if isinstance(rows, list) and request.content_type.startswith(CSVParser.media_type):
+            # empty csv cells are considered as not provided fields.
+            rows = [{key: value for key, value in row.items() if value != ''} for row in rows]
+
+        serializer = MenuItemBulkSerializer(data=rows, many=True)
+        serializer.is_valid(raise_exception=True)
+        updated_count = sum(1 for row in serializer.validated_data if row.get('id') is not None)
+        serializer.save()
+        data = {'created': len(serializer.validated_data) - updated_count, 'updated': updated_count}
+        return Response(data, status=status.HTTP_200_OK)
 
     def get_permissions(self):
-        manager_actions = ['list', 'retrieve', 'update', 'partial_update', 'destroy', 'create', 'options']
+        manager_actions = ['list', 'retrieve', 'update', 'partial_update', 'destroy', 'create', 'options', 'bulk']
         costumer_actions = ['list', 'retrieve',]
         delivery_crew_actions = ['list', 'retrieve',]
         restaurant_permission = RestaurantPermission(self.request.user.group_names,
@@ -83,8 +127,9 @@ class MenuItemViewSet(ModelViewSet):
 class GroupManegerViewSet(ViewSet):
 
     # permission_classes = [IsManager,]
-    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    pagination_class = UserKeysetPagination
     serializer_class = UserSerializer
+    query_budget = {'list': 3, 'create': 5, 'destroy': 4}
 
     def list(self, request: Request, group_name: str) -> Response:
         """
@@ -129,8 +174,8 @@ class GroupManegerViewSet(ViewSet):
         return raw_group_name.replace('-', '_')
 
     def get_paginated_response(self, query_set: QuerySet, request: Request) -> Response:
-        paginator: PageNumberPagination = self.pagination_class()
-        paginated_qs = paginator.paginate_queryset(query_set, request)
+        paginator: BasePagination = self.pagination_class()
+        paginated_qs = paginator.paginate_queryset(query_set, request, view=self)
         serializer = self.serializer_class(paginated_qs, many=True)
         return paginator.get_paginated_response(serializer.data)
 
@@ -138,70 +183,113 @@ class GroupManegerViewSet(ViewSet):
 class CartViewSet(ViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 2, 'add': 5, 'change_cart_quantity': 3, 'destroy': 2, 'clear_carts': 2}
 
     def list(self, request: Request) -> Response:
         serializer = self.serializer_class(self.get_list_queryset(), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def add(self, request: Request) -> Response:
-        print(f'{request.data["quantity"]=}', type(request.data['quantity']))
-        new_cart = self.serializer_class(data=request.data, context={'request': request})
-        new_cart.is_valid(raise_exception=True)
-        new_cart.save()
-        return Response(new_cart.data, status=status.HTTP_201_CREATED)
+        """
+        Adds quantity of a menu item, or of each menu item of a list, to the cart of user.
+        quantities of menu items which are already in the cart are increased, all of them with a single upsert.
+        :return: Response 201 with the changed carts, or 400 if a menu item does not exist.
+        """
+        many = isinstance(request.data, list)
+        serializer = CartItemSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data if many else [serializer.validated_data]
+
+        quantities = {}
+        for item in items:
+            quantities[item['menu_item']] = quantities.get(item['menu_item'], 0) + item['quantity']
+        with transaction.atomic():
+            if Cart.objects.add_quantities(request.user, quantities) != len(quantities):
+                # carts of other menu items are rolled back.
+                raise ValidationError({'menu_item': 'menu item does not exist.'})
+
+        carts = self.get_list_queryset().filter(menu_item__in=quantities).order_by('id')
+        data = self.serializer_class(carts, many=True).data
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
 
     def destroy(self, request: Request, menu_item_id) -> Response:
-        get_object_or_404(Cart, menu_item=menu_item_id, user=request.user).delete()
+        if not self.get_carts_of_user().filter(menu_item=menu_item_id).delete_carts():
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def clear_carts(self, request: Request) -> Response:
-        carts = self.get_carts_of_user()
-        for cart in carts.all():
-            cart.delete()
-        return Response(status=status.HTTP_200_OK)
+        """
+        Deletes all carts of user with a single statement.
+        :return: Response 200 with number of deleted carts.
+        """
+        deleted = self.get_carts_of_user().all().delete_carts()
+        return Response(data={'deleted': deleted}, status=status.HTTP_200_OK)
 
     def change_cart_quantity(self, request: Request, menu_item_id) -> Response:
-        cart_item = get_object_or_404(Cart, menu_item=menu_item_id, user=request.user)
-        data_to_update = {'quantity': request.data['quantity']}
-        serializer = self.serializer_class(
-            cart_item,
-            partial=True,
-            data=data_to_update,
-            context={'request': request}
-        )
+        """
+        Sets `quantity` of the cart of a menu item, or adds `increment` to it (up to MAX_CART_QUANTITY),
+        with a single update.
+        :return: Response 200 with the changed cart, or 404 if the menu item is not in the cart.
+        """
+        serializer = CartQuantitySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if 'increment' in serializer.validated_data:
+            quantity = clamp_cart_quantity(F('quantity') + serializer.validated_data['increment'])
+        else:
+            quantity = serializer.validated_data['quantity']
 
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        carts = self.get_carts_of_user().filter(menu_item=menu_item_id)
+        if not carts.update(quantity=quantity, last_modified=timezone.now()):
+            raise Http404
+        cart_item = self.get_list_queryset().get(menu_item=menu_item_id)
+        return Response(data=self.serializer_class(cart_item).data, status=status.HTTP_200_OK)
 
     def get_carts_of_user(self) -> QuerySet:
         return self.request.user.cart_set
 
     def get_list_queryset(self):
         carts = self.get_carts_of_user()
-        return carts.prefetch_related('menu_item__category').all()
+        return carts.select_related('menu_item').with_prices()
 
 
-class OrderViewSet(GenericViewSet):
+class OrderViewSet(FastReadSerializerMixin, GenericViewSet):
     serializer_class = OrderSerializer
+    fast_read_serializer_class = FastOrderSerializer
     lookup_url_kwarg = 'id'
-
-    def initialize_request(self, request, *args, **kwargs):
+    pagination_class = OrderKeysetPagination
+    query_budget = {'list': 4, 'retrieve': 4, 'create': 11, 'update': 10, 'partial_update': 7, 'destroy': 6,
+                    'assign': 8, 'changes': 10, 'stream': 3}
+
+    # change feed of orders (changes and stream actions), which is served in real time by the async views
+    # (RESTAURANT_ASYNC_VIEWS). long-polls of the async view query changes again every changes_requery_interval
+    # seconds, and clients of its streams reconnect after stream_retry milliseconds.
+    changes_page_size = 100
+    changes_poll_interval = 1.0
+    changes_requery_interval = 5.0
+    changes_max_wait = 30
+    stream_timeout = 30
+    stream_heartbeat_interval = 15
+    stream_retry = 1000
+    # streams of this view are closed right away, so their clients reconnect as rarely as streams of the async view.
+    sync_stream_retry = stream_timeout * 1000
+
+    def perform_authentication(self, request):
         """
-        :return: request with user that group_names wich is contained names of user groups is attached to user object.
+        attaches group_names which contains names of user groups to the user of request, after it is authenticated
+        in initial(), so authentication errors are handled by handle_exception().
         """
-        request = request = super().initialize_request(request, *args, **kwargs)
-        request.user.group_names = _get_user_group_names(request.user)
-        return request
+        super().perform_authentication(request)
+        request.user.group_names = get_user_group_names(request.user)
 
     def list(self, request: Request) -> Response:
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request: Request, id: int) -> Response:
         order = self.get_object()
-        serializer = self.serializer_class(order, context=self.get_serializer_context())
+        serializer = self.get_serializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def partial_update(self, request: Request, id: int):
@@ -214,7 +302,7 @@ class OrderViewSet(GenericViewSet):
                                            context=self.get_serializer_context())
 
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.save_with_change(serializer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request: Request, id: int) -> Response:
@@ -225,9 +313,127 @@ class OrderViewSet(GenericViewSet):
                                            partial=True,
                                            context=self.get_serializer_context())
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.save_with_change(serializer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def save_with_change(serializer: OrderSerializer) -> Order:
+        """ saves order of serializer and records the change of its status or delivery crew in one transaction."""
+        order = serializer.instance
+        previous_status, previous_delivery_crew_id = order.status, order.delivery_crew_id
+        with transaction.atomic():
+            order = serializer.save()
+            OrderChange.objects.record([(order, previous_status, previous_delivery_crew_id)])
+        return order
+
+    @action(detail=False, methods=['post'])
+    def assign(self, request: Request) -> Response:
+        """
+        Assigns undelivered orders without delivery crew to the least loaded delivery crew members in one batch.
+        optional `limit` is the maximum number of assigned orders and `max_load` the maximum number of open
+        orders of a delivery crew member.
+        :return: Response 200 with number of assigned orders and their delivery crew.
+        """
+        serializer = AssignOrdersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders = assign_orders(**serializer.validated_data)
+        data = {
+            'assigned': len(orders),
+            'orders': [{'id': order.pk, 'delivery_crew': order.delivery_crew_id} for order in orders],
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request: Request) -> Response:
+        """
+        Changes of status and delivery crew of orders of user after `since` cursor, oldest first.
+        without `since` only the current cursor is returned, which is passed as `since` of the next request.
+        `wait` (seconds) is only honored by the async view, which waits for the first change (long-poll) without
+        a thread. this view answers right away, so waiting clients do not hold worker threads.
+        """
+        since, wait = self.get_changes_params(request)
+        if since is None:
+            return Response(self.get_changes_data(self.get_latest_cursor(), []))
+        return Response(self.get_changes_data(since, list(self.get_changes_queryset(since))))
+
+    @action(detail=False, methods=['get'], url_path='changes/stream', url_name='changes-stream',
+            renderer_classes=(EventStreamRenderer, ))
+    def stream(self, request: Request) -> StreamingHttpResponse:
+        """
+        Server-sent events of changes after `Last-Event-ID` header (of reconnecting clients) or `since` cursor.
+        the async view keeps the stream open for stream_timeout seconds, this view closes it after the changes
+        which are available and clients reconnect after sync_stream_retry milliseconds to continue it.
+        """
+        since = self.get_stream_cursor(request)
+        if since is None:
+            since = self.get_latest_cursor()
+        return self.get_stream_response(self.get_events(since))
+
+    def get_events(self, since: int) -> Iterator[str]:
+        yield f'retry: {self.sync_stream_retry}\n\n'
+        yield from self.get_change_events(list(self.get_changes_queryset(since)))
+
+    def should_query_changes(self, version: int, new_version: int, queried_at: float) -> bool:
+        """
+        :return: True if changes of waiting requests should be queried again, when their version is bumped or
+                changes_requery_interval seconds after the last query, as a bump may be missed (e.g. by a process
+                which dies after its commit, or by processes which do not share the cache).
+        """
+        return new_version != version or time.monotonic() - queried_at >= self.changes_requery_interval
+
+    def get_changes_params(self, request: Request) -> Tuple[Optional[int], float]:
+        """ :return: `since` cursor (None if it is not provided) and `wait` seconds of request."""
+        since = self.parse_cursor(request.query_params.get('since'))
+        try:
+            wait = min(max(float(request.query_params.get('wait', 0)), 0), self.changes_max_wait)
+        except ValueError:
+            raise ValidationError({'wait': 'wait should be a number of seconds.'})
+        return since, wait
+
+    @staticmethod
+    def parse_cursor(cursor: Optional[str]) -> Optional[int]:
+        if cursor is None:
+            return None
+        if not cursor.isdigit():
+            raise ValidationError({'since': 'cursor should be a non-negative integer.'})
+        return int(cursor)
+
+    def get_stream_cursor(self, request: Request) -> Optional[int]:
+        return self.parse_cursor(request.headers.get('Last-Event-ID') or request.query_params.get('since'))
+
+    @staticmethod
+    def get_latest_cursor() -> int:
+        return OrderChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    @staticmethod
+    async def aget_latest_cursor() -> int:
+        return await OrderChange.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+    def get_changes_queryset(self, since: int) -> QuerySet:
+        """ :return: first changes after since cursor which user can see, and one more to find out if there are more."""
+        changes = OrderChange.objects.visible_to(self.request.user, self.request.user.group_names)
+        return changes.filter(id__gt=since).order_by('id')[:self.changes_page_size + 1]
+
+    def get_changes_data(self, since: int, changes: List[OrderChange]) -> dict:
+        page = changes[:self.changes_page_size]
+        return {
+            'cursor': str(page[-1].id if page else since),
+            'has_more': len(changes) > len(page),
+            'changes': OrderChangeSerializer(page, many=True).data,
+        }
+
+    @staticmethod
+    def get_change_events(changes: List[OrderChange]) -> List[str]:
+        return [format_event(data, 'order-change', data['id'])
+                for data in OrderChangeSerializer(changes, many=True).data]
+
+    def get_stream_response(self, events: Union[Iterator[str], AsyncIterator[str]]) -> StreamingHttpResponse:
+        response = StreamingHttpResponse(events, content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        # proxies like nginx should not buffer events.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
     def destroy(self, request: Request, id: int):
         order = self.get_object()
         order.delete()
@@ -236,7 +442,10 @@ class OrderViewSet(GenericViewSet):
     def get_object(self):
         user = self.request.user
         order_id = self.kwargs.get(self.lookup_url_kwarg)
-        queryset = Order.objects.select_related('user', 'delivery_crew').prefetch_related('order_items__menu_item')
+        queryset = (Order.objects
+                    .select_related('user', 'delivery_crew')
+                    .prefetch_related(self.get_order_items_prefetch())
+                    )
         if RestaurantPermission.is_manager(user.group_names):
             return get_object_or_404(queryset, pk=order_id)
         elif RestaurantPermission.is_delivery_crew(user.group_names):
@@ -247,14 +456,26 @@ class OrderViewSet(GenericViewSet):
             return order
 
     def create(self, request: Request) -> Response:
-        carts: QuerySet = self.request.user.cart_set.all()
-
-        if not carts.exists():
-            return Response(status=status.HTTP_404_NOT_FOUND, data={'message': 'No carts exists.'})
-
-        new_order_obj = self._create_new_order(carts)
-        self._create_order_items(carts, new_order_obj)
-        self._delete_all_carts(carts)
+        """
+        Checks out carts of authenticated user inside a single transaction.
+        number of queries is fixed regardless of the number of carts, the order confirmation and assignment of
+        delivery crew are background jobs.
+        """
+        with transaction.atomic():
+            carts: QuerySet = self.request.user.cart_set.all()
+            cart_items = list(carts.select_related('menu_item').select_for_update(of=('self', )))
+
+            if not cart_items:
+                return Response(status=status.HTTP_404_NOT_FOUND, data={'message': 'No carts exists.'})
+
+            new_order_obj = self._create_new_order(carts)
+            self._create_order_items(cart_items, new_order_obj)
+            self._delete_all_carts(carts)
+            # the confirmation is sent by workers after the order is committed.
+            send_order_confirmation.enqueue(order_id=new_order_obj.pk,
+                                            idempotency_key=f'order-confirmation:{new_order_obj.pk}')
+            if settings.RESTAURANT_AUTO_ASSIGN_ORDERS:
+                assign_delivery_crew.enqueue(idempotency_key=ASSIGN_DELIVERY_CREW_KEY)
         # updated_order_serializer = self._update_order_again(new_order_obj)
         return Response(status=status.HTTP_201_CREATED)
 
@@ -272,18 +493,22 @@ class OrderViewSet(GenericViewSet):
     def _get_total_price_of(self, carts: QuerySet) -> Decimal:
         return Cart.get_total_price_for_carts(carts)
 
-    def _create_order_items(self, carts: QuerySet, order: Order):
-        """ create order items based on the cart items of authenticated user related to order."""
-        for cart in carts:
-            obj = OrderItem.objects.create(order=order,
-                                           menu_item=cart.menu_item,
-                                           quantity=cart.quantity,
-                                           unit_price=cart.unit_price)
-
-    def _delete_all_carts(self, carts: QuerySet):
-        """ delete all carts of authenticated user."""
-        for cart in carts:
-            cart.delete()
+    def _create_order_items(self, carts: Iterable[Cart], order: Order) -> List[OrderItem]:
+        """ create order items based on the cart items of authenticated user related to order.
+        carts should be fetched with their menu_item to avoid a query per cart.
+        """
+        order_items = [
+            OrderItem(order=order,
+                      menu_item=cart.menu_item,
+                      quantity=cart.quantity,
+                      unit_price=cart.menu_item.price)
+            for cart in carts
+        ]
+        return OrderItem.objects.bulk_create(order_items)
+
+    def _delete_all_carts(self, carts: CartQuerySet) -> int:
+        """ delete all carts of authenticated user with a single query."""
+        return carts.delete_carts()
 
     def _update_order_again(self, order: Order) -> OrderSerializer:
         """ to assign the value of total_price for the order"""
@@ -295,9 +520,10 @@ class OrderViewSet(GenericViewSet):
         """
         :return: related permissions for specified actions
         """
-        manager_actions = ['destroy', 'list', 'retrieve', 'update', 'create', 'partial_update']
-        delivery_crew_actions = ['partial_update', 'list']
-        costumer_actions = ['create', 'retrieve', 'list']
+        manager_actions = ['destroy', 'list', 'retrieve', 'update', 'create', 'partial_update', 'assign', 'changes',
+                           'stream']
+        delivery_crew_actions = ['partial_update', 'list', 'changes', 'stream']
+        costumer_actions = ['create', 'retrieve', 'list', 'changes', 'stream']
         group_names_of_user = self.request.user.group_names
         restaurant_permission = RestaurantPermission(group_names_of_user,
                                                      manager_actions,
@@ -306,6 +532,11 @@ class OrderViewSet(GenericViewSet):
 
         return [restaurant_permission, ]
 
+    @staticmethod
+    def get_order_items_prefetch() -> Prefetch:
+        """ :return: prefetch of order items with their menu item and price annotated by the database."""
+        return Prefetch('order_items', queryset=OrderItem.objects.select_related('menu_item').with_prices())
+
     def get_queryset(self):
         """
         :returns: if user is delivery crew, assigned_orders.
@@ -316,15 +547,15 @@ class OrderViewSet(GenericViewSet):
         if RestaurantPermission.is_manager(user.group_names):
             return (Order.objects.all()
                     .select_related('user', 'delivery_crew')
-                    .prefetch_related('order_items__menu_item')
+                    .prefetch_related(self.get_order_items_prefetch())
                     )
         elif RestaurantPermission.is_delivery_crew(user.group_names):
             return (user.assigned_orders.all()
                     .select_related('user', 'delivery_crew')
-                    .prefetch_related('order_items__menu_item')
+                    .prefetch_related(self.get_order_items_prefetch())
                     )
         else:
             return (user.orders.all()
                     .select_related('user', 'delivery_crew')
-                    .prefetch_related('order_items__menu_item')
+                    .prefetch_related(self.get_order_items_prefetch())
                     )